@@ -1,16 +1,25 @@
 import os
 import sys
+import json
+import time
+import socket
 import logging
+import threading
 import uuid
+import hashlib
+import hmac
+import tempfile
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session
+from flask import Flask, Request, Response, g, has_request_context, render_template, request, jsonify, flash, redirect, url_for, session, stream_with_context
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from sqlalchemy.orm import DeclarativeBase
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
-from sqlalchemy import or_
+from sqlalchemy import and_, func, or_, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
 import stripe
 
 # Force UTF-8 encoding
@@ -90,13 +99,40 @@ else:
 
 # File upload configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-UPLOAD_FOLDER = 'uploads'
+# Przesłane pliki trzymamy w pamięci; na dysk (plik tymczasowy) trafiają dopiero powyżej tego rozmiaru
+UPLOAD_SPOOL_MAX_SIZE = int(os.environ.get('UPLOAD_SPOOL_MAX_SIZE', 4 * 1024 * 1024))
+# Cache tekstu z PDF po SHA-256 pliku (0 = wyłączony); wpisy nieużywane dłużej niż TTL są usuwane
+PDF_TEXT_CACHE_ENABLED = os.environ.get('PDF_TEXT_CACHE_ENABLED', '1') != '0'
+PDF_TEXT_CACHE_TTL_DAYS = int(os.environ.get('PDF_TEXT_CACHE_TTL_DAYS', 30))
 ALLOWED_EXTENSIONS = {'pdf'}
+# Okno "aktywności z ostatnich dni" na profilu - tyle dni dziennych liczników trzyma UserStatistics
+USER_ACTIVITY_DAYS = 30
+
+# Kolejka zadań LLM
+# Liczba wątków wykonujących zadania w procesie web (0 = tylko osobny worker.py)
+LLM_JOB_EMBEDDED_WORKERS = int(os.environ.get('LLM_JOB_EMBEDDED_WORKERS', 2))
+LLM_JOB_POLL_INTERVAL = float(os.environ.get('LLM_JOB_POLL_INTERVAL', 1.0))  # sekundy
+LLM_JOB_STALE_AFTER = int(os.environ.get('LLM_JOB_STALE_AFTER', 300))  # sekundy
+LLM_JOB_MAX_ATTEMPTS = int(os.environ.get('LLM_JOB_MAX_ATTEMPTS', 2))
+# Jak długo (od utworzenia) zadanie może czekać w kolejce na limit zapytań, zanim skończy się błędem
+LLM_JOB_RETRY_BUDGET = float(os.environ.get('LLM_JOB_RETRY_BUDGET', 600))  # sekundy
+# Strumieniowanie: adres z POST /<zadanie>/stream trzeba odebrać w tym czasie, inaczej kredyt wraca
+LLM_STREAM_TOKEN_TTL = int(os.environ.get('LLM_STREAM_TOKEN_TTL', 60))  # sekundy
+# Ile zadań pełnego pakietu może się wykonywać równolegle (na jeden pakiet)
+FULL_PACKAGE_MAX_WORKERS = int(os.environ.get('FULL_PACKAGE_MAX_WORKERS', 5))
+# Łączny czas oczekiwania na ponowienia jednego zadania składowego (limit zapytań, błędy)
+FULL_PACKAGE_RETRY_BUDGET = float(os.environ.get('FULL_PACKAGE_RETRY_BUDGET', 180))
+
+# Token wymagany przez /metrics (nagłówek Authorization: Bearer); pusty = endpoint wyłączony
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
 
 # Stripe configuration
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+# Alternatywny adres API Stripe (np. lokalny scripts/mock_stripe.py w testach obciążeniowych)
+if os.environ.get('STRIPE_API_BASE'):
+    stripe.api_base = os.environ['STRIPE_API_BASE']
 
 # Cennik
 PRICING = {
@@ -114,12 +150,44 @@ PRICING = {
     }
 }
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+class SpooledUploadRequest(Request):
+    """Request z buforowaniem uploadów w pamięci do UPLOAD_SPOOL_MAX_SIZE"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_SIZE, mode='rb+')
+
+
+app.request_class = SpooledUploadRequest
 
 # Initialize the app with the extension
 db.init_app(app)
 
+# Migracje schematu (Flask-Migrate/Alembic, katalog migrations/)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Rewizja odpowiadająca schematowi baz utworzonych wcześniej przez db.create_all()
+BASELINE_REVISION = '0001_baseline'
+# Migracje przy starcie aplikacji (0 = tylko `flask --app app db upgrade` przy wdrożeniu)
+DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', '1') != '0'
+migrate = Migrate(app, db, directory=MIGRATIONS_DIR)
+
+# Liczba zapytań SQL w nagłówku odpowiedzi X-DB-Query-Count (testy obciążeniowe)
+if os.environ.get('SQL_QUERY_COUNT_HEADER') == '1':
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_request_queries(conn, cursor, statement, parameters, context,
+                              executemany):
+        # Zapytania workerów zadań (poza kontekstem żądania) nie są liczone
+        if has_request_context():
+            g.db_query_count = g.get('db_query_count', 0) + 1
+
+    @app.after_request
+    def add_query_count_header(response):
+        response.headers['X-DB-Query-Count'] = str(g.get('db_query_count', 0))
+        return response
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -129,6 +197,117 @@ login_manager.login_view = 'auth.login'  # type: ignore
 
 
 # Models
+def invalidate_user_entitlements(user_id):
+    """Unieważnia uprawnienia użytkownika w tym żądaniu i w cache wszystkich workerów"""
+    from utils.entitlement_cache import invalidate_entitlements
+
+    if has_request_context():
+        g.get('entitlements', {}).pop(user_id, None)
+    invalidate_entitlements(user_id)
+
+
+def refund_optimization_credit(user_id, payment_id):
+    """Zwraca kredyt zarezerwowany dla zadania, które nie dało wyniku"""
+    if SinglePayment.refund_credit(payment_id):
+        invalidate_user_entitlements(user_id)
+        logger.info(f"↩️ Zwrócono kredyt optymalizacji (płatność {payment_id}) użytkownikowi {user_id}")
+
+
+class Entitlements:
+    """
+    Migawka uprawnień użytkownika: aktywna subskrypcja i pozostałe
+    optymalizacje z jednorazowych płatności, wczytane jednym zapytaniem
+    """
+
+    def __init__(self, subscription_end=None, plan_type=None, credits=0, premium_until=None):
+        self.subscription_end = subscription_end
+        self.plan_type = plan_type
+        self.credits = credits or 0
+        self.premium_until = premium_until
+
+    @classmethod
+    def load(cls, user):
+        now = datetime.utcnow()
+        credits = db.session.query(
+            func.coalesce(func.sum(SinglePayment.cv_optimizations_limit - SinglePayment.cv_optimizations_used), 0)
+        ).filter(
+            SinglePayment.user_id == user.id,
+            SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit
+        ).scalar_subquery()
+
+        row = db.session.query(
+            Subscription.current_period_end, Subscription.plan_type, credits
+        ).select_from(User).outerjoin(
+            Subscription,
+            and_(Subscription.user_id == User.id,
+                 Subscription.status == 'active',
+                 Subscription.current_period_end > now)
+        ).filter(User.id == user.id).order_by(Subscription.current_period_end.desc()).first()
+        if row is None:
+            # Użytkownik usunięty w trakcie sesji - bez uprawnień
+            return cls(premium_until=user.premium_until)
+
+        subscription_end, plan_type, credits_left = row
+        return cls(subscription_end, plan_type, credits_left, user.premium_until)
+
+    @classmethod
+    def get(cls, user):
+        """Z cache współdzielonego przez workery albo z bazy (i zapis do cache)"""
+        from utils.entitlement_cache import get_cached_entitlements, store_entitlements
+
+        value, generation = get_cached_entitlements(user.id)
+        if value is not None:
+            return cls.from_cache(value, user)
+        entitlements = cls.load(user)
+        store_entitlements(user.id, entitlements.to_cache(), generation)
+        return entitlements
+
+    def to_cache(self):
+        return json.dumps({
+            'subscription_end': self.subscription_end.isoformat() if self.subscription_end else None,
+            'plan_type': self.plan_type,
+            'credits': self.credits
+        })
+
+    @classmethod
+    def from_cache(cls, value, user):
+        data = json.loads(value)
+        subscription_end = data.get('subscription_end')
+        # premium_until jest kolumną User - zawsze aktualna wartość z wczytanego użytkownika
+        return cls(datetime.fromisoformat(subscription_end) if subscription_end else None,
+                   data.get('plan_type'), data.get('credits'), user.premium_until)
+
+    def has_subscription(self):
+        # Koniec okresu sprawdzany przy odczycie - wygaśnięcie nie wymaga unieważnienia cache
+        return bool(self.subscription_end and datetime.utcnow() < self.subscription_end)
+
+    def is_premium(self):
+        if self.has_subscription():
+            return True
+        return bool(self.premium_until and datetime.utcnow() < self.premium_until)
+
+    def can_optimize_cv(self):
+        return self.is_premium() or self.credits > 0
+
+    def payment_status(self):
+        if self.has_subscription():
+            return {
+                'type': 'subscription',
+                'status': 'active',
+                'expires': self.subscription_end,
+                'plan': self.plan_type
+            }
+
+        if self.credits > 0:
+            return {
+                'type': 'single',
+                'status': 'active',
+                'optimizations_left': self.credits
+            }
+
+        return {'type': 'free', 'status': 'inactive'}
+
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -145,104 +324,73 @@ class User(UserMixin, db.Model):
     # Relacje dla statystyk
     cv_uploads = db.relationship('CVUpload', backref='user', lazy=True)
 
+    def get_entitlements(self):
+        """Uprawnienia użytkownika - z cache workerów albo jednym zapytaniem, zapamiętane do końca żądania"""
+        if not has_request_context():
+            return Entitlements.get(self)
+        cache = g.setdefault('entitlements', {})
+        if self.id not in cache:
+            cache[self.id] = Entitlements.get(self)
+        return cache[self.id]
+
+    def invalidate_entitlements(self):
+        """Po zmianie subskrypcji albo kredytów - następny odczyt wczyta je ponownie"""
+        invalidate_user_entitlements(self.id)
+
     def is_premium_active(self):
         if self.is_developer():
             return True
-        
-        # Sprawdź aktywną subskrypcję
-        active_subscription = Subscription.query.filter_by(
-            user_id=self.id, 
-            status='active'
-        ).first()
-        
-        if active_subscription and active_subscription.is_active():
-            return True
-            
-        return self.premium_until and datetime.utcnow() < self.premium_until
+        return self.get_entitlements().is_premium()
 
     def can_optimize_cv(self):
         """Sprawdza czy użytkownik może optymalizować CV"""
         if self.is_developer():
             return True
-            
-        # Sprawdź aktywną subskrypcję (pełny pakiet)
-        if self.is_premium_active():
-            return True
-            
-        # Sprawdź jednorazowe płatności
-        single_payment = SinglePayment.query.filter_by(user_id=self.id).filter(
-            SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit
-        ).first()
-        
-        return single_payment is not None
+        return self.get_entitlements().can_optimize_cv()
 
     def can_use_full_features(self):
         """Sprawdza czy użytkownik ma dostęp do pełnych funkcji (list motywacyjny, pytania, analiza)"""
         if self.is_developer():
             return True
-            
+
         # Tylko subskrybenci mają dostęp do pełnych funkcji
         return self.is_premium_active()
 
-    def use_cv_optimization(self):
-        """Używa jedną optymalizację CV z jednorazowej płatności"""
-        single_payment = SinglePayment.query.filter_by(user_id=self.id).filter(
-            SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit
-        ).first()
-        
-        if single_payment:
-            return single_payment.use_optimization()
-        return False
+    def reserve_cv_optimization(self):
+        """
+        Rezerwuje optymalizację CV z jednorazowej płatności przed wywołaniem AI
+
+        Returns:
+            int: ID SinglePayment (do zwrotu przy niepowodzeniu) albo None,
+                jeśli nie ma wolnych kredytów
+        """
+        if not self.get_entitlements().credits:
+            return None
+
+        payment_id = SinglePayment.reserve_credit(self.id)
+        self.invalidate_entitlements()
+        return payment_id
 
     def get_payment_status(self):
         """Zwraca status płatności użytkownika"""
         if self.is_developer():
             return {'type': 'developer', 'status': 'active'}
-            
-        # Sprawdź subskrypcję
-        subscription = Subscription.query.filter_by(
-            user_id=self.id, 
-            status='active'
-        ).first()
-        
-        if subscription and subscription.is_active():
-            return {
-                'type': 'subscription',
-                'status': 'active',
-                'expires': subscription.current_period_end,
-                'plan': subscription.plan_type
-            }
-            
-        # Sprawdź jednorazowe płatności
-        single_payment = SinglePayment.query.filter_by(user_id=self.id).filter(
-            SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit
-        ).first()
-        
-        if single_payment:
-            return {
-                'type': 'single',
-                'status': 'active',
-                'optimizations_left': single_payment.cv_optimizations_limit - single_payment.cv_optimizations_used
-            }
-            
-        return {'type': 'free', 'status': 'inactive'}
+        return self.get_entitlements().payment_status()
 
     def is_developer(self):
         return self.username == 'developer'
 
     def get_cv_count(self):
-        """Zwraca liczbę przesłanych CV"""
-        return CVUpload.query.filter_by(user_id=self.id).count()
+        """Zwraca liczbę przesłanych CV (licznik w UserStatistics)"""
+        return self.get_statistics().cv_count or 0
 
     def get_optimized_cv_count(self):
         """Zwraca liczbę zoptymalizowanych CV"""
-        return CVUpload.query.filter_by(user_id=self.id).filter(
-            CVUpload.optimized_cv.isnot(None)).count()
+        return self.get_statistics().optimized_count or 0
 
     def get_analyzed_cv_count(self):
         """Zwraca liczbę przeanalizowanych CV"""
-        return CVUpload.query.filter_by(user_id=self.id).filter(
-            CVUpload.cv_analysis.isnot(None)).count()
+        return self.get_statistics().analyzed_count or 0
 
     def get_success_rate(self):
         """Oblicza wskaźnik sukcesu optymalizacji"""
@@ -256,22 +404,26 @@ class User(UserMixin, db.Model):
         """Zwraca wiek konta w dniach"""
         return (datetime.utcnow() - self.created_at).days
 
-    def get_recent_activity(self, days=30):
-        """Zwraca aktywność z ostatnich dni"""
-        from sqlalchemy import func
+    def get_recent_activity(self, days=USER_ACTIVITY_DAYS):
+        """Zwraca liczbę CV przesłanych w ostatnich dniach (dzienne liczniki w UserStatistics)"""
+        if days <= USER_ACTIVITY_DAYS:
+            return self.get_statistics().get_recent_uploads(days)
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         return CVUpload.query.filter(CVUpload.user_id == self.id,
                                      CVUpload.created_at
                                      >= cutoff_date).count()
 
     def get_statistics(self):
-        """Zwraca statystyki użytkownika"""
-        stats = UserStatistics.query.filter_by(user_id=self.id).first()
-        if not stats:
-            stats = UserStatistics()
-            stats.user_id = self.id
-            db.session.add(stats)
-            db.session.commit()
+        """Zwraca statystyki użytkownika - jeden odczyt po user_id, zapamiętany do końca żądania"""
+        cache = g.setdefault('user_statistics', {}) if has_request_context() else {}
+        stats = cache.get(self.id)
+        if stats is None:
+            stats = UserStatistics.query.filter_by(user_id=self.id).first()
+            if not stats:
+                # Wiersz powstaje przy rejestracji (albo w migracji) - odczyt niczego nie zapisuje
+                logger.warning(f"⚠️ Brak wiersza statystyk użytkownika {self.id}")
+                stats = UserStatistics.create_for(self.id)
+            cache[self.id] = stats
         return stats
 
     def __repr__(self):
@@ -279,6 +431,9 @@ class User(UserMixin, db.Model):
 
 
 class CVUpload(db.Model):
+    # Profil i statystyki: CV użytkownika w kolejności dodania / z ostatnich dni
+    __table_args__ = (db.Index('ix_cv_upload_user_id_created_at', 'user_id', 'created_at'), )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
@@ -291,33 +446,216 @@ class CVUpload(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     optimized_at = db.Column(db.DateTime, nullable=True)
     analyzed_at = db.Column(db.DateTime, nullable=True)
+    file_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 przesłanego PDF
+    sections_json = db.Column(db.Text, nullable=True)  # JSON: sekcja -> treść (utils/cv_sections.py)
+    # Tekst dla promptów: bez powtarzanych nagłówków/stopek, numerów stron i klauzuli RODO
+    # (original_text zostaje w całości do wyświetlania)
+    prompt_text = db.Column(db.Text, nullable=True)
+
+    def get_prompt_text(self):
+        return self.prompt_text or self.original_text
+
+    def get_sections(self):
+        if self.sections_json:
+            return json.loads(self.sections_json)
+        # CV sprzed segmentacji - dzielimy w locie
+        from utils.cv_sections import segment_cv
+        return segment_cv(self.get_prompt_text())
+
+    def text_for_task(self, task_type):
+        """Tekst CV dla promptu zadania - tylko potrzebne sekcje albo całe CV"""
+        from utils.cv_sections import text_for_task
+        return text_for_task(task_type, self.get_sections(), self.get_prompt_text())
 
     def __repr__(self):
         return f'<CVUpload {self.filename}>'
 
 
+class ExtractedTextCache(db.Model):
+    """Tekst wyodrębniony z PDF, po SHA-256 zawartości pliku"""
+    content_hash = db.Column(db.String(64), primary_key=True)
+    text = db.Column(db.Text, nullable=False)
+    prompt_text = db.Column(db.Text, nullable=True)
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<ExtractedTextCache {self.content_hash[:12]}>'
+
+
+def activity_window_start():
+    """Początek okna aktywności (pełne dni UTC) dla dziennych liczników przesłanych CV"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=USER_ACTIVITY_DAYS)
+
+
 class UserStatistics(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     total_logins = db.Column(db.Integer, default=0)
     total_time_spent = db.Column(db.Integer, default=0)  # w minutach
     preferred_job_categories = db.Column(db.Text)  # JSON string
     avg_optimization_time = db.Column(db.Float, default=0.0)  # w minutach
+    # Liczniki utrzymywane przyrostowo w tej samej transakcji co zmiana CVUpload
+    # (bump_user_statistics), naprawiane przez reconcile_user_statistics
+    cv_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    optimized_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    analyzed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Przesłane CV z ostatnich USER_ACTIVITY_DAYS dni: JSON {"RRRR-MM-DD": liczba}
+    daily_uploads = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime,
                            default=datetime.utcnow,
                            onupdate=datetime.utcnow)
 
+    COUNTERS = ('cv_count', 'optimized_count', 'analyzed_count')
+
+    @staticmethod
+    def counts_query():
+        """Rzeczywiste wartości liczników policzone z cv_upload, pogrupowane po user_id"""
+        return db.session.query(
+            CVUpload.user_id.label('user_id'),
+            func.count(CVUpload.id).label('cv_count'),
+            func.count(CVUpload.optimized_cv).label('optimized_count'),
+            func.count(CVUpload.cv_analysis).label('analyzed_count')).group_by(CVUpload.user_id)
+
+    @staticmethod
+    def daily_uploads_query():
+        """Przesłane CV z okna aktywności policzone z cv_upload, pogrupowane po user_id i dniu"""
+        day = func.date(CVUpload.created_at)
+        return db.session.query(CVUpload.user_id, day, func.count(CVUpload.id)).filter(
+            CVUpload.created_at >= activity_window_start()).group_by(CVUpload.user_id, day)
+
+    @classmethod
+    def create_for(cls, user_id):
+        """Nowy wiersz statystyk z licznikami policzonymi z cv_upload (nie dodaje go do sesji)"""
+        stats = cls(user_id=user_id, total_logins=0, total_time_spent=0, avg_optimization_time=0.0)
+        stats.recount()
+        return stats
+
+    def recount(self):
+        """Przelicza liczniki z cv_upload (nowy wiersz statystyk albo naprawa rozjazdu)"""
+        row = self.counts_query().filter(CVUpload.user_id == self.user_id).first()
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(row, name) if row else 0)
+        daily = self.daily_uploads_query().filter(CVUpload.user_id == self.user_id).all()
+        self.set_daily_uploads({str(day): count for _, day, count in daily})
+
+    def get_daily_uploads(self):
+        """Dzienne liczniki przesłanych CV z okna aktywności"""
+        cutoff = activity_window_start().date().isoformat()
+        try:
+            daily = json.loads(self.daily_uploads or '{}')
+        except ValueError:
+            return {}
+        return {day: count for day, count in daily.items() if day >= cutoff}
+
+    def set_daily_uploads(self, daily):
+        self.daily_uploads = json.dumps(dict(sorted(daily.items())))
+
+    def record_upload(self, count=1):
+        """Dolicza przesłane CV do dzisiejszego licznika (dni spoza okna są usuwane)"""
+        daily = self.get_daily_uploads()
+        today = datetime.utcnow().date().isoformat()
+        daily[today] = daily.get(today, 0) + count
+        self.set_daily_uploads(daily)
+
+    def get_recent_uploads(self, days=USER_ACTIVITY_DAYS):
+        """Liczba CV przesłanych w ostatnich `days` dniach (z dokładnością do dnia)"""
+        cutoff = (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+        return sum(count for day, count in self.get_daily_uploads().items() if day >= cutoff)
+
     def __repr__(self):
         return f'<UserStatistics User:{self.user_id}>'
 
 
+def bump_user_statistics(user_id, **deltas):
+    """
+    Zwiększa liczniki statystyk użytkownika w bieżącej transakcji
+
+    Atomowe UPDATE licznik = licznik + n - równoległe żądania w różnych
+    workerach nie gubią przyrostów. Commit należy do wywołującego, razem ze
+    zmianą CVUpload, której dotyczą liczniki.
+
+    Args:
+        user_id (int): ID użytkownika
+        **deltas: Przyrosty liczników, np. cv_count=1
+    """
+    values = {getattr(UserStatistics, name): getattr(UserStatistics, name) + delta
+              for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    values[UserStatistics.updated_at] = datetime.utcnow()
+    updated = UserStatistics.query.filter_by(user_id=user_id).update(
+        values, synchronize_session=False)
+    if not updated:
+        # Brak wiersza statystyk - liczniki policzone od zera już uwzględniają zmianę
+        db.session.flush()
+        db.session.add(UserStatistics.create_for(user_id))
+    elif deltas.get('cv_count'):
+        # UPDATE powyżej zablokował wiersz - odczyt i zapis dziennych liczników nie zgubi
+        # przesłań z innych workerów
+        stats = UserStatistics.query.filter_by(user_id=user_id).populate_existing().first()
+        stats.record_upload(deltas['cv_count'])
+    if has_request_context():
+        # Zapamiętany obiekt statystyk ma nieaktualne liczniki - odśwież przy następnym odczycie
+        cached = g.get('user_statistics', {}).get(user_id)
+        if cached is not None and cached in db.session:
+            db.session.expire(cached)
+
+
+def reconcile_user_statistics():
+    """
+    Naprawia rozjazd liczników UserStatistics z tabelą cv_upload
+
+    Returns:
+        int: Liczba poprawionych wierszy statystyk
+    """
+    missing = User.query.outerjoin(UserStatistics, UserStatistics.user_id == User.id).filter(
+        UserStatistics.id.is_(None)).with_entities(User.id).all()
+    for user_id, in missing:
+        logger.warning(f"⚠️ Brak wiersza statystyk użytkownika {user_id} - tworzę")
+        db.session.add(UserStatistics.create_for(user_id))
+    db.session.flush()
+
+    daily_uploads = {}
+    for user_id, day, count in UserStatistics.daily_uploads_query():
+        daily_uploads.setdefault(user_id, {})[str(day)] = count
+    counts = UserStatistics.counts_query().subquery()
+    rows = db.session.query(UserStatistics, counts.c.cv_count, counts.c.optimized_count,
+                            counts.c.analyzed_count).outerjoin(
+                                counts, counts.c.user_id == UserStatistics.user_id).all()
+    fixed = len(missing)
+    for stats, *actual in rows:
+        actual = [value or 0 for value in actual]
+        stored = [getattr(stats, name) for name in UserStatistics.COUNTERS]
+        actual_daily = daily_uploads.get(stats.user_id, {})
+        if stored != actual or stats.get_daily_uploads() != actual_daily:
+            logger.warning(f"⚠️ Rozjazd statystyk użytkownika {stats.user_id}: "
+                           f"{stored} -> {actual}")
+            for name, value in zip(UserStatistics.COUNTERS, actual):
+                setattr(stats, name, value)
+            stats.set_daily_uploads(actual_daily)
+            fixed += 1
+    db.session.commit()
+    return fixed
+
+
+@app.cli.command('reconcile-user-stats')
+def reconcile_user_stats_command():
+    """Naprawia liczniki statystyk użytkowników (uruchamiać okresowo, np. z crona)"""
+    fixed = reconcile_user_statistics()
+    print(f"Poprawiono statystyki: {fixed}")
+
+
 class CoverLetter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cv_upload_id = db.Column(db.Integer,
                              db.ForeignKey('cv_upload.id'),
-                             nullable=False)
+                             nullable=False,
+                             index=True)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
     job_description = db.Column(db.Text, nullable=True)
@@ -335,7 +673,8 @@ class InterviewQuestions(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cv_upload_id = db.Column(db.Integer,
                              db.ForeignKey('cv_upload.id'),
-                             nullable=False)
+                             nullable=False,
+                             index=True)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
     job_description = db.Column(db.Text, nullable=True)
@@ -352,7 +691,8 @@ class SkillsGapAnalysis(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cv_upload_id = db.Column(db.Integer,
                              db.ForeignKey('cv_upload.id'),
-                             nullable=False)
+                             nullable=False,
+                             index=True)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
     job_description = db.Column(db.Text, nullable=True)
@@ -384,6 +724,9 @@ class StripePayment(db.Model):
 
 
 class Subscription(db.Model):
+    # Sprawdzanie uprawnień: aktywna subskrypcja użytkownika (Entitlements.load)
+    __table_args__ = (db.Index('ix_subscription_user_id_status', 'user_id', 'status'), )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     stripe_subscription_id = db.Column(db.String(200), unique=True, nullable=False)
@@ -410,6 +753,11 @@ class Subscription(db.Model):
 
 
 class SinglePayment(db.Model):
+    # Indeks częściowy - tylko płatności z wolnymi kredytami (Entitlements.load, reserve_credit)
+    __table_args__ = (db.Index('ix_single_payment_user_id_available', 'user_id',
+                               postgresql_where=db.text('cv_optimizations_used < cv_optimizations_limit'),
+                               sqlite_where=db.text('cv_optimizations_used < cv_optimizations_limit')), )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     payment_id = db.Column(db.Integer, db.ForeignKey('stripe_payment.id'), nullable=False)
@@ -425,17 +773,111 @@ class SinglePayment(db.Model):
     def can_optimize_cv(self):
         return self.cv_optimizations_used < self.cv_optimizations_limit
 
-    def use_optimization(self):
-        if self.can_optimize_cv():
-            self.cv_optimizations_used += 1
+    @classmethod
+    def reserve_credit(cls, user_id):
+        """
+        Rezerwuje jedną optymalizację z jednorazowych płatności użytkownika
+
+        Rezerwacja to warunkowy UPDATE (used < limit), więc dwa równoległe
+        zapytania - także w różnych procesach - nie dostaną tego samego kredytu.
+
+        Returns:
+            int: ID płatności, z której pobrano kredyt, albo None
+        """
+        candidates = db.session.query(cls.id).filter(
+            cls.user_id == user_id,
+            cls.cv_optimizations_used < cls.cv_optimizations_limit
+        ).order_by(cls.created_at, cls.id).limit(5).all()
+        for (payment_id, ) in candidates:
+            reserved = cls.query.filter(
+                cls.id == payment_id,
+                cls.cv_optimizations_used < cls.cv_optimizations_limit
+            ).update({'cv_optimizations_used': cls.cv_optimizations_used + 1},
+                     synchronize_session=False)
             db.session.commit()
-            return True
-        return False
+            if reserved:
+                return payment_id
+        return None
+
+    @classmethod
+    def refund_credit(cls, payment_id):
+        """Zwraca zarezerwowany kredyt (zadanie AI się nie powiodło)"""
+        refunded = cls.query.filter(
+            cls.id == payment_id,
+            cls.cv_optimizations_used > 0
+        ).update({'cv_optimizations_used': cls.cv_optimizations_used - 1},
+                 synchronize_session=False)
+        db.session.commit()
+        return bool(refunded)
 
     def __repr__(self):
         return f'<SinglePayment {self.cv_optimizations_used}/{self.cv_optimizations_limit}>'
 
 
+class LLMJob(db.Model):
+    # Indeksy częściowe kolejki - claim_llm_job co LLM_JOB_POLL_INTERVAL szuka najstarszych 'queued'
+    # i porzuconych 'running'
+    __table_args__ = (db.Index('ix_llm_job_queued_created_at', 'created_at',
+                               postgresql_where=db.text("status = 'queued'"),
+                               sqlite_where=db.text("status = 'queued'")),
+                      db.Index('ix_llm_job_running_started_at', 'started_at',
+                               postgresql_where=db.text("status = 'running'"),
+                               sqlite_where=db.text("status = 'running'")),
+                      # Strumienie nieodebrane i przerwane (expire_llm_streams)
+                      db.Index('ix_llm_job_reserved_created_at', 'created_at',
+                               postgresql_where=db.text("status = 'reserved'"),
+                               sqlite_where=db.text("status = 'reserved'")),
+                      db.Index('ix_llm_job_streaming_started_at', 'started_at',
+                               postgresql_where=db.text("status = 'streaming'"),
+                               sqlite_where=db.text("status = 'streaming'")),
+                      # Wyszukiwanie duplikatu w enqueue_llm_job
+                      db.Index('ix_llm_job_cv_upload_id_task_type', 'cv_upload_id', 'task_type'))
+
+    id = db.Column(db.String(36), primary_key=True)  # uuid4
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    cv_upload_id = db.Column(db.Integer, db.ForeignKey('cv_upload.id'), nullable=False)
+    task_type = db.Column(db.String(50), nullable=False)  # optimize_cv, analyze_cv, cover_letter, interview_questions, skills_gap
+    status = db.Column(db.String(20), nullable=False, default='queued')  # waiting, queued, running, reserved, streaming, completed, failed
+    parent_id = db.Column(db.String(36), db.ForeignKey('llm_job.id'), nullable=True, index=True)  # zadanie pełnego pakietu
+    params = db.Column(db.Text, nullable=True)  # JSON z parametrami zadania
+    # Kredyt jednorazowej płatności zarezerwowany przed wywołaniem AI (zwracany przy niepowodzeniu)
+    credit_payment_id = db.Column(db.Integer, db.ForeignKey('single_payment.id'), nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON z odpowiedzią dla frontendu
+    attempts = db.Column(db.Integer, default=0)
+    worker_id = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    available_at = db.Column(db.DateTime, nullable=True)  # odłożone przez limit zapytań - nie przejmować wcześniej
+
+    # Zadania składowe pełnego pakietu
+    children = db.relationship('LLMJob',
+                               backref=db.backref('parent', remote_side=[id]),
+                               lazy=True)
+
+    def get_params(self):
+        return json.loads(self.params) if self.params else {}
+
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'task_type': self.task_type,
+            'status': self.status,
+            'result': self.get_result(),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.task_type == 'full_package':
+            data['tasks'] = [child.to_dict() for child in self.children]
+        return data
+
+    def __repr__(self):
+        return f'<LLMJob {self.task_type}: {self.status}>'
+
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -452,6 +894,51 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def extract_cv_document(pdf_bytes):
+    """
+    Zwraca tekst CV z cache po SHA-256 pliku albo wyodrębnia go w piaskownicy
+
+    Args:
+        pdf_bytes (bytes): Zawartość przesłanego PDF
+
+    Returns:
+        tuple: (słownik z 'text' i 'prompt_text' albo None, skrót SHA-256 pliku)
+
+    Raises:
+        PDFRejected: Plik odrzucony przed ekstrakcją (nie PDF, uszkodzony,
+            zaszyfrowany, bez tekstu)
+        PDFExtractionError: Plik przekroczył limity piaskownicy
+    """
+    from utils.pdf_sandbox import extract_document_sandboxed
+
+    content_hash = hashlib.sha256(pdf_bytes).hexdigest()
+    if not PDF_TEXT_CACHE_ENABLED:
+        return extract_document_sandboxed(pdf_bytes), content_hash
+
+    cached = db.session.get(ExtractedTextCache, content_hash)
+    if cached:
+        # Zmiany licznika zapisze commit wywołującego razem z CVUpload
+        cached.hit_count = (cached.hit_count or 0) + 1
+        cached.last_used_at = datetime.utcnow()
+        logger.info(f"♻️ Tekst PDF z cache ({content_hash[:12]})")
+        return {'text': cached.text, 'prompt_text': cached.prompt_text or cached.text}, content_hash
+
+    document = extract_document_sandboxed(pdf_bytes)
+    if document:
+        try:
+            # Savepoint - równoległy upload tego samego pliku mógł już dodać wpis
+            with db.session.begin_nested():
+                db.session.add(ExtractedTextCache(content_hash=content_hash,
+                                                  text=document['text'],
+                                                  prompt_text=document['prompt_text']))
+        except IntegrityError:
+            pass
+        ExtractedTextCache.query.filter(
+            ExtractedTextCache.last_used_at < datetime.utcnow() - timedelta(days=PDF_TEXT_CACHE_TTL_DAYS)
+        ).delete(synchronize_session=False)
+    return document, content_hash
+
+
 # Routes
 @app.route('/')
 def index():
@@ -532,15 +1019,21 @@ def upload_cv():
 
         if file and file.filename and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
 
-            # Extract text from PDF
-            from utils.pdf_extraction import extract_text_from_pdf
-            cv_text = extract_text_from_pdf(file_path)
+            # Extract text from PDF straight from the upload buffer (no copy in uploads/),
+            # in a sandboxed process with CPU/memory/time limits - unless this file was seen before
+            from utils.pdf_sandbox import PDFExtractionError
+            try:
+                document, file_hash = extract_cv_document(file.read())
+            except PDFExtractionError as e:
+                logger.warning(f"⛔ Odrzucono PDF {filename} użytkownika {current_user.id}: {e.reason}")
+                return jsonify({
+                    'success': False,
+                    'error': e.reason,
+                    'message': str(e)
+                }), 503 if e.reason == 'busy' else 422
 
-            if not cv_text:
-                os.remove(file_path)
+            if not document:
                 return jsonify({
                     'success':
                     False,
@@ -570,15 +1063,18 @@ def upload_cv():
             new_cv_upload.user_id = current_user.id
             new_cv_upload.session_id = session_id
             new_cv_upload.filename = ensure_utf8(filename)
-            new_cv_upload.original_text = ensure_utf8(cv_text)
+            new_cv_upload.original_text = ensure_utf8(document['text'])
+            new_cv_upload.prompt_text = ensure_utf8(document['prompt_text'])
             new_cv_upload.job_title = ensure_utf8(job_title)
             new_cv_upload.job_description = ensure_utf8(job_description)
+            new_cv_upload.file_hash = file_hash
+            from utils.cv_sections import segment_cv
+            new_cv_upload.sections_json = json.dumps(segment_cv(new_cv_upload.prompt_text),
+                                                     ensure_ascii=False)
             db.session.add(new_cv_upload)
+            bump_user_statistics(current_user.id, cv_count=1)
             db.session.commit()
 
-            # Clean up uploaded file
-            os.remove(file_path)
-
             return jsonify({
                 'success': True,
                 'session_id': session_id,
@@ -605,7 +1101,7 @@ def upload_cv():
 @app.route('/generate-cover-letter', methods=['POST'])
 @login_required
 def generate_cover_letter_route():
-    """Generuje list motywacyjny na podstawie przesłanego CV"""
+    """Zleca wygenerowanie listu motywacyjnego na podstawie przesłanego CV"""
     try:
         data = request.get_json()
         session_id = data.get('session_id')
@@ -639,68 +1135,25 @@ def generate_cover_letter_route():
                 'message': 'Nie znaleziono przesłanego CV'
             })
 
-        # Sprawdź czy użytkownik ma dostęp premium
-        is_premium = current_user.is_premium_active()
-
-        # Generuj list motywacyjny
-        from utils.openrouter_api import generate_cover_letter
-        result = generate_cover_letter(cv_text=cv_upload.original_text,
-                                       job_title=job_title,
-                                       job_description=job_description,
-                                       company_name=company_name,
-                                       is_premium=is_premium)
-
-        if not result or not result.get('success'):
-            return jsonify({
-                'success':
-                False,
-                'message':
-                'Nie udało się wygenerować listu motywacyjnego'
-            })
-
-        # Zapisz list motywacyjny w bazie danych
-        cover_letter_session_id = str(uuid.uuid4())
-        new_cover_letter = CoverLetter()
-        new_cover_letter.user_id = current_user.id
-        new_cover_letter.cv_upload_id = cv_upload.id
-        new_cover_letter.session_id = cover_letter_session_id
-        new_cover_letter.job_title = job_title
-        new_cover_letter.job_description = job_description
-        new_cover_letter.company_name = company_name
-        new_cover_letter.cover_letter_content = result['cover_letter']
-        new_cover_letter.generated_at = datetime.utcnow()
-
-        db.session.add(new_cover_letter)
-        db.session.commit()
-
-        return jsonify({
-            'success':
-            True,
-            'cover_letter':
-            result['cover_letter'],
-            'cover_letter_session_id':
-            cover_letter_session_id,
-            'message':
-            'List motywacyjny został wygenerowany pomyślnie'
+        job = enqueue_llm_job(current_user.id, cv_upload.id, 'cover_letter', {
+            'job_title': job_title,
+            'job_description': job_description,
+            'company_name': company_name
         })
+        return llm_job_accepted_response(job)
 
     except Exception as e:
         logger.error(f"Error in generate_cover_letter_route: {str(e)}")
-        error_message = "Wystąpił błąd podczas generowania listu motywacyjnego"
-        if any(keyword in str(e).lower() for keyword in ["timeout", "timed out", "worker timeout"]):
-            error_message = "Zapytanie trwa zbyt długo - spróbuj ponownie. Jeśli problem się powtarza, skróć opis stanowiska."
-        elif "connection" in str(e).lower():
-            error_message = "Błąd połączenia z API - sprawdź połączenie internetowe"
         return jsonify({
             'success': False,
-            'message': error_message
+            'message': 'Wystąpił błąd podczas generowania listu motywacyjnego'
         })
 
 
 @app.route('/generate-interview-questions', methods=['POST'])
 @login_required
 def generate_interview_questions_route():
-    """Generuje pytania na rozmowę kwalifikacyjną na podstawie CV"""
+    """Zleca wygenerowanie pytań na rozmowę kwalifikacyjną na podstawie CV"""
     try:
         data = request.get_json()
         session_id = data.get('session_id')
@@ -733,62 +1186,25 @@ def generate_interview_questions_route():
                 'message': 'Nie znaleziono przesłanego CV'
             })
 
-        # Sprawdź czy użytkownik ma dostęp premium
-        is_premium = current_user.is_premium_active()
-
-        # Generuj pytania na rozmowę
-        from utils.openrouter_api import generate_interview_questions
-        result = generate_interview_questions(cv_text=cv_upload.original_text,
-                                            job_title=job_title,
-                                            job_description=job_description,
-                                            is_premium=is_premium)
-
-        if not result or not result.get('success'):
-            return jsonify({
-                'success':
-                False,
-                'message':
-                'Nie udało się wygenerować pytań na rozmowę'
-            })
-
-        # Zapisz pytania w bazie danych
-        questions_session_id = str(uuid.uuid4())
-        new_questions = InterviewQuestions()
-        new_questions.user_id = current_user.id
-        new_questions.cv_upload_id = cv_upload.id
-        new_questions.session_id = questions_session_id
-        new_questions.job_title = job_title
-        new_questions.job_description = job_description
-        new_questions.questions_content = result['questions']
-        new_questions.generated_at = datetime.utcnow()
-
-        db.session.add(new_questions)
-        db.session.commit()
-
-        return jsonify({
-            'success': True,
-            'questions': result['questions'],
-            'questions_session_id': questions_session_id,
-            'message': 'Pytania na rozmowę zostały wygenerowane pomyślnie'
-        })
+        job = enqueue_llm_job(current_user.id, cv_upload.id,
+                              'interview_questions', {
+                                  'job_title': job_title,
+                                  'job_description': job_description
+                              })
+        return llm_job_accepted_response(job)
 
     except Exception as e:
         logger.error(f"Error in generate_interview_questions_route: {str(e)}")
-        error_message = "Wystąpił błąd podczas generowania pytań na rozmowę"
-        if any(keyword in str(e).lower() for keyword in ["timeout", "timed out", "worker timeout"]):
-            error_message = "Zapytanie trwa zbyt długo - spróbuj ponownie. Jeśli problem się powtarza, skróć opis stanowiska."
-        elif "connection" in str(e).lower():
-            error_message = "Błąd połączenia z API - sprawdź połączenie internetowe"
         return jsonify({
             'success': False,
-            'message': error_message
+            'message': 'Wystąpił błąd podczas generowania pytań na rozmowę'
         })
 
 
 @app.route('/analyze-skills-gap', methods=['POST'])
 @login_required
 def analyze_skills_gap_route():
-    """Analizuje luki kompetencyjne między CV a wymaganiami stanowiska"""
+    """Zleca analizę luk kompetencyjnych między CV a wymaganiami stanowiska"""
     try:
         data = request.get_json()
         session_id = data.get('session_id')
@@ -821,55 +1237,17 @@ def analyze_skills_gap_route():
                 'message': 'Nie znaleziono przesłanego CV'
             })
 
-        # Sprawdź czy użytkownik ma dostęp premium
-        is_premium = current_user.is_premium_active()
-
-        # Analizuj luki kompetencyjne
-        from utils.openrouter_api import analyze_skills_gap
-        result = analyze_skills_gap(cv_text=cv_upload.original_text,
-                                  job_title=job_title,
-                                  job_description=job_description,
-                                  is_premium=is_premium)
-
-        if not result or not result.get('success'):
-            return jsonify({
-                'success':
-                False,
-                'message':
-                'Nie udało się przeanalizować luk kompetencyjnych'
-            })
-
-        # Zapisz analizę w bazie danych
-        analysis_session_id = str(uuid.uuid4())
-        new_analysis = SkillsGapAnalysis()
-        new_analysis.user_id = current_user.id
-        new_analysis.cv_upload_id = cv_upload.id
-        new_analysis.session_id = analysis_session_id
-        new_analysis.job_title = job_title
-        new_analysis.job_description = job_description
-        new_analysis.analysis_content = result['analysis']
-        new_analysis.analyzed_at = datetime.utcnow()
-
-        db.session.add(new_analysis)
-        db.session.commit()
-
-        return jsonify({
-            'success': True,
-            'analysis': result['analysis'],
-            'analysis_session_id': analysis_session_id,
-            'message': 'Analiza luk kompetencyjnych została ukończona pomyślnie'
+        job = enqueue_llm_job(current_user.id, cv_upload.id, 'skills_gap', {
+            'job_title': job_title,
+            'job_description': job_description
         })
+        return llm_job_accepted_response(job)
 
     except Exception as e:
         logger.error(f"Error in analyze_skills_gap_route: {str(e)}")
-        error_message = "Wystąpił błąd podczas analizy luk kompetencyjnych"
-        if any(keyword in str(e).lower() for keyword in ["timeout", "timed out", "worker timeout"]):
-            error_message = "Zapytanie trwa zbyt długo - spróbuj ponownie. Jeśli problem się powtarza, skróć opis stanowiska."
-        elif "connection" in str(e).lower():
-            error_message = "Błąd połączenia z API - sprawdź połączenie internetowe"
         return jsonify({
             'success': False,
-            'message': error_message
+            'message': 'Wystąpił błąd podczas analizy luk kompetencyjnych'
         })
 
 
@@ -906,53 +1284,19 @@ def optimize_cv_route():
                     'message': 'Wykorzystałeś już dostępne optymalizacje CV.'
                 })
 
-        cv_text = cv_upload.original_text
-        job_title = cv_upload.job_title
-        job_description = cv_upload.job_description
-
-        # Check if user has premium access
-        is_premium = current_user.is_premium_active()
-
-        # Call OpenRouter API to optimize CV
-        from utils.openrouter_api import optimize_cv
-        optimized_cv = optimize_cv(cv_text,
-                                   job_title,
-                                   job_description,
-                                   is_premium=is_premium)
-
-        if not optimized_cv:
-            return jsonify({
-                'success':
-                False,
-                'message':
-                'Nie udało się zoptymalizować CV. Spróbuj ponownie.'
-            })
-
-        # Użyj optymalizacji (dla jednorazowych płatności)
-        if not current_user.is_premium_active():
-            current_user.use_cv_optimization()
-
-        # Store optimized CV in the database
-        cv_upload.optimized_cv = optimized_cv
-        cv_upload.optimized_at = datetime.utcnow()
-        db.session.commit()
+        credit_payment_id, credit_error = reserve_llm_task_credit(current_user, 'optimize_cv')
+        if credit_error:
+            return jsonify(credit_error)
 
-        return jsonify({
-            'success': True,
-            'optimized_cv': optimized_cv,
-            'message': 'CV zostało pomyślnie zoptymalizowane'
-        })
+        job = enqueue_llm_job(current_user.id, cv_upload.id, 'optimize_cv',
+                              credit_payment_id=credit_payment_id)
+        return llm_job_accepted_response(job)
 
     except Exception as e:
         logger.error(f"Error in optimize_cv_route: {str(e)}")
-        error_message = "Wystąpił błąd podczas optymalizacji CV"
-        if any(keyword in str(e).lower() for keyword in ["timeout", "timed out", "worker timeout"]):
-            error_message = "Zapytanie trwa zbyt długo - spróbuj ponownie. Jeśli problem się powtarza, skróć tekst CV."
-        elif "connection" in str(e).lower():
-            error_message = "Błąd połączenia z API - sprawdź połączenie internetowe"
         return jsonify({
             'success': False,
-            'message': error_message
+            'message': 'Wystąpił błąd podczas optymalizacji CV'
         })
 
 
@@ -974,52 +1318,957 @@ def analyze_cv_route():
                 'Sesja wygasła. Proszę przesłać CV ponownie.'
             })
 
-        cv_text = cv_upload.original_text
-        job_title = cv_upload.job_title
-        job_description = cv_upload.job_description
+        job = enqueue_llm_job(current_user.id, cv_upload.id, 'analyze_cv')
+        return llm_job_accepted_response(job)
+
+    except Exception as e:
+        logger.error(f"Error in analyze_cv_route: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Wystąpił błąd podczas analizy CV'
+        })
 
-        # Check if user has premium access
-        is_premium = current_user.is_premium_active()
 
-        # Call OpenRouter API to analyze CV
-        from utils.openrouter_api import analyze_cv_with_score
-        cv_analysis = analyze_cv_with_score(cv_text,
-                                            job_title,
-                                            job_description,
-                                            is_premium=is_premium)
+@app.route('/full-package', methods=['POST'])
+@login_required
+def full_package_route():
+    """Zleca wszystkie dostępne dla użytkownika analizy CV naraz"""
+    try:
+        data = request.get_json()
+        session_id = data.get('session_id')
+        company_name = data.get('company_name', '').strip()
 
-        if not cv_analysis:
+        cv_upload = CVUpload.query.filter_by(session_id=session_id,
+                                             user_id=current_user.id).first()
+        if not cv_upload:
             return jsonify({
-                'success':
-                False,
-                'message':
-                'Nie udało się przeanalizować CV. Spróbuj ponownie.'
+                'success': False,
+                'message': 'Sesja wygasła. Proszę przesłać CV ponownie.'
             })
 
-        # Store analysis in the database
-        cv_upload.cv_analysis = cv_analysis
-        cv_upload.analyzed_at = datetime.utcnow()
+        task_types = [
+            task_type for task_type in FULL_PACKAGE_TASKS
+            if not llm_task_access_error(current_user, task_type)
+        ]
+
+        credit_payment_id = None
+        if 'optimize_cv' in task_types:
+            credit_payment_id, credit_error = reserve_llm_task_credit(current_user, 'optimize_cv')
+            if credit_error:
+                task_types.remove('optimize_cv')
+
+        job = enqueue_full_package_job(current_user.id, cv_upload, task_types,
+                                       company_name, credit_payment_id)
+        return llm_job_accepted_response(job)
+
+    except Exception as e:
+        logger.error(f"Error in full_package_route: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Wystąpił błąd podczas zlecania pełnego pakietu'
+        })
+
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Zwraca status zadania LLM (do odpytywania przez frontend)"""
+    job = LLMJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Nie znaleziono zadania'
+        }), 404
+
+    # Zadania mogły zostać osierocone po restarcie procesu - upewnij się,
+    # że ktoś je wykonuje
+    if job.status in ('queued', 'running'):
+        ensure_llm_job_workers()
+
+    response = job.to_dict()
+    response['success'] = True
+    return jsonify(response)
+
+
+@app.route('/metrics')
+def metrics():
+    """Metryki wywołań LLM w formacie Prometheus (tylko z METRICS_TOKEN)"""
+    # Bez skonfigurowanego tokenu endpoint nie istnieje - wolumeny, koszty
+    # i błędy modeli nie mogą być publiczne
+    if not METRICS_TOKEN:
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    if not hmac.compare_digest(request.headers.get('Authorization', ''),
+                               f'Bearer {METRICS_TOKEN}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    from utils.llm_metrics import render_prometheus
+    return Response(render_prometheus(),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/optimize-cv/stream', defaults={'task_type': 'optimize_cv'}, methods=['POST'])
+@app.route('/analyze-cv/stream', defaults={'task_type': 'analyze_cv'}, methods=['POST'])
+@app.route('/generate-cover-letter/stream',
+           defaults={'task_type': 'cover_letter'}, methods=['POST'])
+@app.route('/generate-interview-questions/stream',
+           defaults={'task_type': 'interview_questions'}, methods=['POST'])
+@app.route('/analyze-skills-gap/stream', defaults={'task_type': 'skills_gap'}, methods=['POST'])
+@login_required
+def start_llm_stream(task_type):
+    """
+    Rezerwuje strumień odpowiedzi AI (i kredyt) i zwraca adres do odebrania go
+
+    Zmiana stanu tylko w POST - GET ze zwróconym adresem jednorazowo przejmuje
+    przygotowane zadanie, więc prefetch albo ponowne połączenie EventSource
+    nie zużywają kolejnego kredytu.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        cv_upload = CVUpload.query.filter_by(
+            session_id=data.get('session_id'),
+            user_id=current_user.id).first()
+        if not cv_upload:
+            return jsonify({
+                'success': False,
+                'message': 'Sesja wygasła. Proszę przesłać CV ponownie.'
+            })
+
+        access_error = llm_task_access_error(current_user, task_type)
+        if access_error:
+            return jsonify(access_error)
+
+        params = {}
+        if task_type not in ('optimize_cv', 'analyze_cv'):
+            params = {
+                'job_title': (data.get('job_title') or cv_upload.job_title).strip(),
+                'job_description': (data.get('job_description') or cv_upload.job_description or '').strip(),
+                'company_name': (data.get('company_name') or '').strip()
+            }
+
+        # Kredyt rezerwowany przed wywołaniem AI - równoległe zapytania nie zużyją jednego kredytu
+        credit_payment_id, credit_error = reserve_llm_task_credit(current_user, task_type)
+        if credit_error:
+            return jsonify(credit_error)
+
+        job = LLMJob()
+        job.id = str(uuid.uuid4())
+        job.user_id = current_user.id
+        job.cv_upload_id = cv_upload.id
+        job.task_type = task_type
+        job.params = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        job.credit_payment_id = credit_payment_id
+        job.status = 'reserved'
+        db.session.add(job)
         db.session.commit()
 
         return jsonify({
             'success': True,
-            'cv_analysis': cv_analysis,
-            'message': 'CV zostało pomyślnie przeanalizowane'
+            'job_id': job.id,
+            'stream_url': url_for('stream_llm_task', task_type=task_type, token=job.id)
         })
 
     except Exception as e:
-        logger.error(f"Error in analyze_cv_route: {str(e)}")
-        error_message = "Wystąpił błąd podczas analizy CV"
-        if any(keyword in str(e).lower() for keyword in ["timeout", "timed out", "worker timeout"]):
-            error_message = "Zapytanie trwa zbyt długo - spróbuj ponownie. Jeśli problem się powtarza, skróć tekst CV."
-        elif "connection" in str(e).lower():
-            error_message = "Błąd połączenia z API - sprawdź połączenie internetowe"
+        db.session.rollback()
+        logger.error(f"Error in start_llm_stream ({task_type}): {str(e)}")
         return jsonify({
             'success': False,
-            'message': error_message
+            'message': LLM_JOB_HANDLERS[task_type][1]
         })
 
 
+@app.route('/optimize-cv/stream', defaults={'task_type': 'optimize_cv'})
+@app.route('/analyze-cv/stream', defaults={'task_type': 'analyze_cv'})
+@app.route('/generate-cover-letter/stream',
+           defaults={'task_type': 'cover_letter'})
+@app.route('/generate-interview-questions/stream',
+           defaults={'task_type': 'interview_questions'})
+@app.route('/analyze-skills-gap/stream', defaults={'task_type': 'skills_gap'})
+@login_required
+def stream_llm_task(task_type):
+    """Strumieniuje odpowiedź AI do przeglądarki (Server-Sent Events) dla zadania z start_llm_stream"""
+    job_id = request.args.get('token')
+    # Jednorazowe przejęcie (warunkowy UPDATE jak w claim_llm_job) - ponowne połączenie dostaje błąd
+    claimed = job_id and LLMJob.query.filter(
+        LLMJob.id == job_id, LLMJob.user_id == current_user.id,
+        LLMJob.task_type == task_type, LLMJob.status == 'reserved',
+        LLMJob.created_at >= datetime.utcnow() - timedelta(seconds=LLM_STREAM_TOKEN_TTL)).update(
+            {
+                'status': 'streaming',
+                'worker_id': f"{socket.gethostname()}:{os.getpid()}:stream",
+                'started_at': datetime.utcnow(),
+                'attempts': LLMJob.attempts + 1
+            },
+            synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return sse_response([
+            sse_event('error', {
+                'success': False,
+                'message': 'Ten strumień wygasł albo został już odebrany. Spróbuj ponownie.'
+            })
+        ])
+
+    job = db.session.get(LLMJob, job_id)
+    cv_upload = CVUpload.query.get(job.cv_upload_id)
+    params = job.get_params()
+    job_title = params.get('job_title', cv_upload.job_title)
+    job_description = params.get('job_description', cv_upload.job_description or '')
+
+    from utils.openrouter_api import build_task_prompt, stream_openrouter_request
+    prompt = build_task_prompt(task_type, cv_upload.text_for_task(task_type), job_title,
+                               job_description, params.get('company_name', ''))
+    is_premium = current_user.is_premium_active()
+    user_id, cv_upload_id = current_user.id, cv_upload.id
+    _, error_message, shorten_hint = LLM_JOB_HANDLERS[task_type]
+
+    # Zwolnij połączenie z puli na czas strumieniowania
+    db.session.commit()
+
+    def finish(result):
+        # Zadanie mogło zostać zamknięte jako porzucone (expire_llm_streams)
+        streaming_job = LLMJob.query.filter_by(id=job_id, status='streaming').first()
+        if streaming_job:
+            finish_llm_job(streaming_job, result)
+
+    def generate():
+        result = None
+        try:
+            parts = []
+            for delta in stream_openrouter_request(prompt,
+                                                   is_premium=is_premium,
+                                                   task_type=task_type):
+                parts.append(delta)
+                yield sse_event('delta', {'text': delta})
+
+            content = ''.join(parts)
+            if not content:
+                result = {'success': False, 'message': error_message}
+                yield sse_event('error', result)
+                return
+
+            # Sesja z zapytania jest już zamknięta - wczytaj obiekty ponownie
+            result = LLM_RESULT_SAVERS[task_type](
+                CVUpload.query.get(cv_upload_id), User.query.get(user_id),
+                params, content)
+            yield sse_event('done', result)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error in stream_llm_task ({task_type}): {str(e)}")
+            result = {
+                'success': False,
+                'message': llm_error_message(e, error_message, shorten_hint)
+            }
+            yield sse_event('error', result)
+        finally:
+            # Błąd, pusta odpowiedź albo zamknięte połączenie - zadanie nieudane, kredyt wraca
+            finish(result or {
+                'success': False,
+                'message': 'Połączenie zostało przerwane przed zakończeniem odpowiedzi.'
+            })
+
+    return sse_response(stream_with_context(generate()))
+
+
+def sse_event(event, data):
+    """Formatuje pojedynczy event Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    return Response(events,
+                    mimetype='text/event-stream',
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+
+def llm_task_access_error(user, task_type):
+    """Zwraca odpowiedź z błędem, jeśli użytkownik nie ma dostępu do zadania"""
+    if task_type == 'optimize_cv':
+        if user.can_optimize_cv():
+            return None
+        if user.get_payment_status()['type'] == 'free':
+            return {
+                'success': False,
+                'message': 'Aby optymalizować CV, musisz wykupić jednorazową optymalizację (19 zł) lub pełny pakiet (49 zł/msc).',
+                'redirect_to_pricing': True
+            }
+        return {
+            'success': False,
+            'message': 'Wykorzystałeś już dostępne optymalizacje CV.'
+        }
+
+    if task_type == 'analyze_cv' or user.can_use_full_features():
+        return None
+
+    feature_names = {
+        'cover_letter': 'List motywacyjny jest dostępny',
+        'interview_questions': 'Pytania na rozmowę są dostępne',
+        'skills_gap': 'Analiza luk kompetencyjnych jest dostępna'
+    }
+    return {
+        'success': False,
+        'message': f'{feature_names[task_type]} tylko w pełnym pakiecie miesięcznym za 49 zł/msc.',
+        'redirect_to_pricing': True
+    }
+
+
+def reserve_llm_task_credit(user, task_type):
+    """
+    Rezerwuje kredyt jednorazowej płatności przed wywołaniem AI
+
+    Subskrybenci i zadania inne niż optymalizacja CV nie zużywają kredytów.
+
+    Returns:
+        tuple: (ID SinglePayment albo None, gdy kredyt nie jest potrzebny;
+            odpowiedź z błędem albo None)
+    """
+    if task_type != 'optimize_cv' or user.is_premium_active():
+        return None, None
+    payment_id = user.reserve_cv_optimization()
+    if payment_id is None:
+        return None, {
+            'success': False,
+            'message': 'Wykorzystałeś już dostępne optymalizacje CV.'
+        }
+    return payment_id, None
+
+
+# Kolejka zadań LLM
+def enqueue_llm_job(user_id, cv_upload_id, task_type, params=None, credit_payment_id=None):
+    """
+    Dodaje zadanie LLM do kolejki w bazie danych
+
+    Jeśli identyczne zadanie (ten sam użytkownik, CV, typ i parametry) czeka
+    już w kolejce lub jest wykonywane, zwraca istniejące zamiast tworzyć nowe
+    (kredyt zarezerwowany dla duplikatu jest wtedy zwracany).
+
+    Returns:
+        LLMJob: Zadanie w kolejce
+    """
+    params_json = json.dumps(params or {}, sort_keys=True, ensure_ascii=False)
+
+    existing_job = LLMJob.query.filter(
+        LLMJob.user_id == user_id, LLMJob.cv_upload_id == cv_upload_id,
+        LLMJob.task_type == task_type, LLMJob.params == params_json,
+        LLMJob.parent_id.is_(None),
+        LLMJob.status.in_(['queued', 'running'])).first()
+    if existing_job:
+        if credit_payment_id:
+            refund_optimization_credit(user_id, credit_payment_id)
+        return existing_job
+
+    job = LLMJob()
+    job.id = str(uuid.uuid4())
+    job.user_id = user_id
+    job.cv_upload_id = cv_upload_id
+    job.task_type = task_type
+    job.params = params_json
+    job.credit_payment_id = credit_payment_id
+    job.status = 'queued'
+    db.session.add(job)
+    db.session.commit()
+
+    logger.info(f"Zadanie LLM {job.id} ({task_type}) dodane do kolejki")
+    ensure_llm_job_workers()
+    _llm_job_wakeup.set()
+    return job
+
+
+def enqueue_full_package_job(user_id, cv_upload, task_types, company_name='', credit_payment_id=None):
+    """
+    Dodaje do kolejki zadanie pełnego pakietu wraz z zadaniami składowymi
+
+    Zadania składowe mają status 'waiting' i parent_id - nie są przejmowane
+    przez zwykłych workerów, tylko uruchamiane równolegle (i ponawiane)
+    przez zadanie nadrzędne.
+    Zarezerwowany kredyt trafia do zadania optymalizacji CV.
+    """
+    existing_job = LLMJob.query.filter(
+        LLMJob.user_id == user_id, LLMJob.cv_upload_id == cv_upload.id,
+        LLMJob.task_type == 'full_package',
+        LLMJob.status.in_(['queued', 'running'])).first()
+    if existing_job:
+        if credit_payment_id:
+            refund_optimization_credit(user_id, credit_payment_id)
+        return existing_job
+
+    parent = LLMJob()
+    parent.id = str(uuid.uuid4())
+    parent.user_id = user_id
+    parent.cv_upload_id = cv_upload.id
+    parent.task_type = 'full_package'
+    parent.params = json.dumps({'tasks': task_types}, ensure_ascii=False)
+    parent.status = 'queued'
+    db.session.add(parent)
+
+    params_json = json.dumps(
+        {
+            'job_title': cv_upload.job_title,
+            'job_description': cv_upload.job_description or '',
+            'company_name': company_name
+        },
+        sort_keys=True,
+        ensure_ascii=False)
+    for task_type in task_types:
+        child = LLMJob()
+        child.id = str(uuid.uuid4())
+        child.user_id = user_id
+        child.cv_upload_id = cv_upload.id
+        child.task_type = task_type
+        child.params = params_json
+        if task_type == 'optimize_cv':
+            child.credit_payment_id = credit_payment_id
+        child.status = 'waiting'
+        child.parent_id = parent.id
+        db.session.add(child)
+
+    db.session.commit()
+
+    logger.info(f"Pełny pakiet {parent.id} ({', '.join(task_types)}) dodany do kolejki")
+    ensure_llm_job_workers()
+    _llm_job_wakeup.set()
+    return parent
+
+
+def llm_job_accepted_response(job):
+    """Odpowiedź 202 z identyfikatorem zadania do odpytywania"""
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.id),
+        'message': 'Zadanie zostało przyjęte do realizacji'
+    }), 202
+
+
+def _save_optimize_cv_result(cv_upload, user, params, optimized_cv):
+    # Kredyt jednorazowej płatności został zarezerwowany przed wywołaniem AI (reserve_llm_task_credit)
+    first_result = cv_upload.optimized_cv is None
+    cv_upload.optimized_cv = optimized_cv
+    cv_upload.optimized_at = datetime.utcnow()
+    if first_result:
+        bump_user_statistics(cv_upload.user_id, optimized_count=1)
+    db.session.commit()
+
+    return {
+        'success': True,
+        'optimized_cv': optimized_cv,
+        'message': 'CV zostało pomyślnie zoptymalizowane'
+    }
+
+
+def _save_analyze_cv_result(cv_upload, user, params, cv_analysis):
+    first_result = cv_upload.cv_analysis is None
+    cv_upload.cv_analysis = cv_analysis
+    cv_upload.analyzed_at = datetime.utcnow()
+    if first_result:
+        bump_user_statistics(cv_upload.user_id, analyzed_count=1)
+    db.session.commit()
+
+    return {
+        'success': True,
+        'cv_analysis': cv_analysis,
+        'message': 'CV zostało pomyślnie przeanalizowane'
+    }
+
+
+def _save_cover_letter_result(cv_upload, user, params, cover_letter_content):
+    cover_letter_session_id = str(uuid.uuid4())
+    new_cover_letter = CoverLetter()
+    new_cover_letter.user_id = user.id
+    new_cover_letter.cv_upload_id = cv_upload.id
+    new_cover_letter.session_id = cover_letter_session_id
+    new_cover_letter.job_title = params['job_title']
+    new_cover_letter.job_description = params['job_description']
+    new_cover_letter.company_name = params['company_name']
+    new_cover_letter.cover_letter_content = cover_letter_content
+    new_cover_letter.generated_at = datetime.utcnow()
+
+    db.session.add(new_cover_letter)
+    db.session.commit()
+
+    return {
+        'success': True,
+        'cover_letter': cover_letter_content,
+        'cover_letter_session_id': cover_letter_session_id,
+        'message': 'List motywacyjny został wygenerowany pomyślnie'
+    }
+
+
+def _save_interview_questions_result(cv_upload, user, params, questions_content):
+    questions_session_id = str(uuid.uuid4())
+    new_questions = InterviewQuestions()
+    new_questions.user_id = user.id
+    new_questions.cv_upload_id = cv_upload.id
+    new_questions.session_id = questions_session_id
+    new_questions.job_title = params['job_title']
+    new_questions.job_description = params['job_description']
+    new_questions.questions_content = questions_content
+    new_questions.generated_at = datetime.utcnow()
+
+    db.session.add(new_questions)
+    db.session.commit()
+
+    return {
+        'success': True,
+        'questions': questions_content,
+        'questions_session_id': questions_session_id,
+        'message': 'Pytania na rozmowę zostały wygenerowane pomyślnie'
+    }
+
+
+def _save_skills_gap_result(cv_upload, user, params, analysis_content):
+    analysis_session_id = str(uuid.uuid4())
+    new_analysis = SkillsGapAnalysis()
+    new_analysis.user_id = user.id
+    new_analysis.cv_upload_id = cv_upload.id
+    new_analysis.session_id = analysis_session_id
+    new_analysis.job_title = params['job_title']
+    new_analysis.job_description = params['job_description']
+    new_analysis.analysis_content = analysis_content
+    new_analysis.analyzed_at = datetime.utcnow()
+
+    db.session.add(new_analysis)
+    db.session.commit()
+
+    return {
+        'success': True,
+        'analysis': analysis_content,
+        'analysis_session_id': analysis_session_id,
+        'message': 'Analiza luk kompetencyjnych została ukończona pomyślnie'
+    }
+
+
+def _run_optimize_cv_job(job, cv_upload, user, params):
+    from utils.openrouter_api import optimize_cv
+    optimized_cv = optimize_cv(cv_upload.text_for_task('optimize_cv'),
+                               cv_upload.job_title,
+                               cv_upload.job_description,
+                               is_premium=user.is_premium_active())
+
+    if not optimized_cv:
+        return {
+            'success': False,
+            'message': 'Nie udało się zoptymalizować CV. Spróbuj ponownie.'
+        }
+    return _save_optimize_cv_result(cv_upload, user, params, optimized_cv)
+
+
+def _run_analyze_cv_job(job, cv_upload, user, params):
+    from utils.openrouter_api import analyze_cv_with_score
+    cv_analysis = analyze_cv_with_score(cv_upload.text_for_task('analyze_cv'),
+                                        cv_upload.job_title,
+                                        cv_upload.job_description,
+                                        is_premium=user.is_premium_active())
+
+    if not cv_analysis:
+        return {
+            'success': False,
+            'message': 'Nie udało się przeanalizować CV. Spróbuj ponownie.'
+        }
+    return _save_analyze_cv_result(cv_upload, user, params, cv_analysis)
+
+
+def _run_cover_letter_job(job, cv_upload, user, params):
+    from utils.openrouter_api import generate_cover_letter
+    result = generate_cover_letter(cv_text=cv_upload.text_for_task('cover_letter'),
+                                   job_title=params['job_title'],
+                                   job_description=params['job_description'],
+                                   company_name=params['company_name'],
+                                   is_premium=user.is_premium_active())
+
+    if not result or not result.get('success'):
+        return {
+            'success': False,
+            'message': 'Nie udało się wygenerować listu motywacyjnego'
+        }
+    return _save_cover_letter_result(cv_upload, user, params,
+                                     result['cover_letter'])
+
+
+def _run_interview_questions_job(job, cv_upload, user, params):
+    from utils.openrouter_api import generate_interview_questions
+    result = generate_interview_questions(
+        cv_text=cv_upload.text_for_task('interview_questions'),
+        job_title=params['job_title'],
+        job_description=params['job_description'],
+        is_premium=user.is_premium_active())
+
+    if not result or not result.get('success'):
+        return {
+            'success': False,
+            'message': 'Nie udało się wygenerować pytań na rozmowę'
+        }
+    return _save_interview_questions_result(cv_upload, user, params,
+                                            result['questions'])
+
+
+def _run_skills_gap_job(job, cv_upload, user, params):
+    from utils.openrouter_api import analyze_skills_gap
+    result = analyze_skills_gap(cv_text=cv_upload.text_for_task('skills_gap'),
+                                job_title=params['job_title'],
+                                job_description=params['job_description'],
+                                is_premium=user.is_premium_active())
+
+    if not result or not result.get('success'):
+        return {
+            'success': False,
+            'message': 'Nie udało się przeanalizować luk kompetencyjnych'
+        }
+    return _save_skills_gap_result(cv_upload, user, params, result['analysis'])
+
+
+def _run_full_package_task(job_id, worker_id):
+    """
+    Wykonuje jedno zadanie składowe pełnego pakietu (w wątku puli)
+
+    Ponowienia zostają w wątku pakietu: run_llm_job odkłada zadanie składowe
+    do 'waiting' (nie 'queued'), a tutaj czekamy z wykładniczym opóźnieniem
+    albo tyle, ile każe limit zapytań - do wyczerpania FULL_PACKAGE_RETRY_BUDGET.
+    """
+    from utils.rate_limiter import RateLimitExceeded
+    from utils.retry_policy import RetryPolicy
+
+    policy = RetryPolicy(max_retry_after=FULL_PACKAGE_RETRY_BUDGET)
+    waited, retry = 0.0, 0
+    with app.app_context():
+        while True:
+            retry += 1
+            started = LLMJob.query.filter(
+                LLMJob.id == job_id, LLMJob.status == 'waiting').update(
+                    {
+                        'status': 'running',
+                        'worker_id': worker_id,
+                        'started_at': datetime.utcnow(),
+                        'attempts': LLMJob.attempts + 1
+                    },
+                    synchronize_session=False)
+            db.session.commit()
+            if not started:
+                return
+            retry_after = run_llm_job(job_id)
+            if retry_after is None:
+                return
+            delay = policy.compute_delay(retry, retry_after or None)
+            if delay is None or waited + delay > FULL_PACKAGE_RETRY_BUDGET:
+                job = db.session.get(LLMJob, job_id)
+                error_message = LLM_JOB_HANDLERS[job.task_type][1]
+                finish_llm_job(job, {
+                    'success': False,
+                    'message': str(RateLimitExceeded(retry_after)) if retry_after else error_message
+                })
+                return
+            waited += delay
+            time.sleep(delay)
+
+
+def _run_full_package_job(job, cv_upload, user, params):
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    children = [(child.id, child.task_type) for child in job.children]
+    if not children:
+        return {
+            'success': False,
+            'message': 'Brak dostępnych analiz w Twoim pakiecie.'
+        }
+
+    # Pakiet przejęty ponownie (poprzedni worker padł) - jego zadania składowe
+    # w toku nie mają już wykonawcy
+    LLMJob.query.filter_by(parent_id=job.id, status='running').update(
+        {'status': 'waiting'}, synchronize_session=False)
+    db.session.commit()
+
+    # Wszystkie analizy startują naraz - czas pakietu to czas najwolniejszej
+    max_workers = min(FULL_PACKAGE_MAX_WORKERS, len(children))
+    with ThreadPoolExecutor(max_workers=max_workers,
+                            thread_name_prefix='full-package') as executor:
+        pending = {executor.submit(_run_full_package_task, child_id, job.worker_id)
+                   for child_id, _ in children}
+        while pending:
+            _, pending = wait(pending, timeout=LLM_JOB_STALE_AFTER / 3)
+            # Znak życia - bez niego claim_llm_job uznałby długi pakiet za porzucony
+            LLMJob.query.filter_by(id=job.id, status='running').update(
+                {'started_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+
+    db.session.expire_all()
+    statuses = {
+        child.task_type: child.status
+        for child in LLMJob.query.filter_by(parent_id=job.id).all()
+    }
+    completed = [task for task, status in statuses.items() if status == 'completed']
+
+    return {
+        'success': bool(completed),
+        'tasks': statuses,
+        'message': f'Ukończono {len(completed)} z {len(statuses)} analiz'
+    }
+
+
+# Kolejność zadań pełnego pakietu
+FULL_PACKAGE_TASKS = ['optimize_cv', 'analyze_cv', 'cover_letter',
+                      'interview_questions', 'skills_gap']
+
+# Typ zadania -> (funkcja wykonująca, komunikat błędu, co skrócić przy timeoucie)
+LLM_JOB_HANDLERS = {
+    'optimize_cv': (_run_optimize_cv_job,
+                    'Wystąpił błąd podczas optymalizacji CV', 'tekst CV'),
+    'analyze_cv': (_run_analyze_cv_job, 'Wystąpił błąd podczas analizy CV',
+                   'tekst CV'),
+    'cover_letter': (_run_cover_letter_job,
+                     'Wystąpił błąd podczas generowania listu motywacyjnego',
+                     'opis stanowiska'),
+    'interview_questions':
+    (_run_interview_questions_job,
+     'Wystąpił błąd podczas generowania pytań na rozmowę', 'opis stanowiska'),
+    'skills_gap': (_run_skills_gap_job,
+                   'Wystąpił błąd podczas analizy luk kompetencyjnych',
+                   'opis stanowiska'),
+    'full_package': (_run_full_package_job,
+                     'Wystąpił błąd podczas realizacji pełnego pakietu',
+                     'opis stanowiska')
+}
+
+# Typ zadania -> funkcja zapisująca gotowy tekst (używane przy strumieniowaniu)
+LLM_RESULT_SAVERS = {
+    'optimize_cv': _save_optimize_cv_result,
+    'analyze_cv': _save_analyze_cv_result,
+    'cover_letter': _save_cover_letter_result,
+    'interview_questions': _save_interview_questions_result,
+    'skills_gap': _save_skills_gap_result
+}
+
+
+def llm_error_message(error, default_message, shorten_hint):
+    """Zamienia wyjątek z wywołania LLM na komunikat dla użytkownika"""
+    from utils.rate_limiter import RateLimitExceeded
+    if isinstance(error, RateLimitExceeded):
+        return str(error)
+    if any(keyword in str(error).lower()
+           for keyword in ["timeout", "timed out", "worker timeout"]):
+        return f"Zapytanie trwa zbyt długo - spróbuj ponownie. Jeśli problem się powtarza, skróć {shorten_hint}."
+    elif "connection" in str(error).lower():
+        return "Błąd połączenia z API - sprawdź połączenie internetowe"
+    return default_message
+
+
+def claim_llm_job(worker_id):
+    """
+    Przejmuje najstarsze oczekujące zadanie
+
+    Przejęcie to warunkowy UPDATE (status='queued'), więc dwa workery -
+    także w różnych procesach - nigdy nie wykonają tego samego zadania.
+
+    Returns:
+        str: ID przejętego zadania albo None
+    """
+    # Zadania 'running' bez postępu przez LLM_JOB_STALE_AFTER należały do
+    # workera, który padł - wracają do kolejki. Zadaniami składowymi pakietu
+    # zarządza wyłącznie zadanie nadrzędne
+    # Zadanie, które wyczerpało LLM_JOB_MAX_ATTEMPTS, zamiast wracać do kolejki kończy się
+    # błędem - inaczej zadanie zabijające workera (OOM, segfault) krążyłoby bez końca
+    stale_before = datetime.utcnow() - timedelta(seconds=LLM_JOB_STALE_AFTER)
+    stale = (LLMJob.status == 'running', LLMJob.parent_id.is_(None),
+             LLMJob.started_at < stale_before)
+    LLMJob.query.filter(*stale, LLMJob.attempts < LLM_JOB_MAX_ATTEMPTS).update(
+        {'status': 'queued'}, synchronize_session=False)
+    db.session.commit()
+    for job_id, started_at in LLMJob.query.with_entities(LLMJob.id, LLMJob.started_at).filter(*stale).all():
+        fail_abandoned_llm_job(job_id, started_at)
+    expire_llm_streams()
+
+    # Zadanie odłożone przez limit zapytań czeka do available_at - bez tego
+    # worker przejmowałby je od razu z powrotem, w pętli bez przerwy
+    now = datetime.utcnow()
+    candidates = LLMJob.query.with_entities(LLMJob.id).filter(
+        LLMJob.status == 'queued', LLMJob.parent_id.is_(None),
+        or_(LLMJob.available_at.is_(None), LLMJob.available_at <= now)).order_by(
+            LLMJob.created_at).limit(5).all()
+    for (job_id, ) in candidates:
+        claimed = LLMJob.query.filter_by(id=job_id, status='queued').update(
+            {
+                'status': 'running',
+                'worker_id': worker_id,
+                'started_at': datetime.utcnow(),
+                'attempts': LLMJob.attempts + 1
+            },
+            synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def expire_llm_streams():
+    """Zamyka strumienie nieodebrane w LLM_STREAM_TOKEN_TTL i przerwane (proces padł) - kredyt wraca"""
+    now = datetime.utcnow()
+    reserved = LLMJob.query.with_entities(LLMJob.id, LLMJob.started_at).filter(
+        LLMJob.status == 'reserved',
+        LLMJob.created_at < now - timedelta(seconds=LLM_STREAM_TOKEN_TTL)).all()
+    streaming = LLMJob.query.with_entities(LLMJob.id, LLMJob.started_at).filter(
+        LLMJob.status == 'streaming',
+        LLMJob.started_at < now - timedelta(seconds=LLM_JOB_STALE_AFTER)).all()
+    for status, jobs in (('reserved', reserved), ('streaming', streaming)):
+        for job_id, started_at in jobs:
+            fail_abandoned_llm_job(job_id, started_at, status)
+
+
+def fail_abandoned_llm_job(job_id, started_at, status='running'):
+    """
+    Kończy błędem porzucone zadanie (limit prób, nieodebrany albo przerwany strumień)
+
+    Warunkowy UPDATE (status i started_at bez zmian) - tylko jeden worker
+    zamyka zadanie i zwraca zarezerwowane kredyty. Nieukończone zadania
+    składowe pakietu są zamykane razem z nim.
+    """
+    result = json.dumps({
+        'success': False,
+        'message': 'Przetwarzanie zadania zostało przerwane. Spróbuj ponownie.'
+    }, ensure_ascii=False)
+    closed = LLMJob.query.filter_by(id=job_id, status=status, started_at=started_at).update(
+        {'status': 'failed', 'result': result, 'finished_at': datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    if not closed:
+        return
+    logger.warning(f"⚠️ Zadanie LLM {job_id} ({status}) porzucone - zakończone błędem")
+
+    jobs = LLMJob.query.filter(
+        or_(LLMJob.id == job_id,
+            and_(LLMJob.parent_id == job_id,
+                 LLMJob.status.notin_(['completed', 'failed'])))).all()
+    refunds = []
+    for job in jobs:
+        if job.id != job_id:
+            job.status, job.result, job.finished_at = 'failed', result, datetime.utcnow()
+        if job.credit_payment_id:
+            # Zwrot tylko raz - kolumna czyszczona razem ze zmianą statusu
+            refunds.append((job.user_id, job.credit_payment_id))
+            job.credit_payment_id = None
+    db.session.commit()
+    for user_id, credit_payment_id in refunds:
+        refund_optimization_credit(user_id, credit_payment_id)
+
+
+def run_llm_job(job_id):
+    """
+    Wykonuje przejęte zadanie i zapisuje wynik
+
+    Zadanie do ponowienia wraca do 'queued', a zadanie składowe pakietu do
+    'waiting' - ponawia je wtedy wątek pakietu (_run_full_package_task).
+    Zadanie odłożone przez limit zapytań dostaje available_at i czeka na nie
+    w kolejce najwyżej LLM_JOB_RETRY_BUDGET od utworzenia.
+
+    Returns:
+        float: None, gdy zadanie się zakończyło; przy odłożeniu do ponowienia
+            czas z limitu zapytań w sekundach (0, jeśli brak)
+    """
+    from utils.rate_limiter import RateLimitExceeded
+    job = LLMJob.query.get(job_id)
+    if not job:
+        return None
+
+    retry_status = 'waiting' if job.parent_id else 'queued'
+    handler, error_message, shorten_hint = LLM_JOB_HANDLERS[job.task_type]
+    try:
+        cv_upload = CVUpload.query.get(job.cv_upload_id)
+        user = User.query.get(job.user_id)
+        result = handler(job, cv_upload, user, job.get_params())
+    except RateLimitExceeded as e:
+        # Limit zapytań to nie błąd zadania - wraca do kolejki bez zużycia próby,
+        # ale nie wcześniej niż za retry_after i tylko w ramach LLM_JOB_RETRY_BUDGET
+        db.session.rollback()
+        now = datetime.utcnow()
+        waited = (now - job.created_at).total_seconds()
+        if job.parent_id or waited + e.retry_after <= LLM_JOB_RETRY_BUDGET:
+            logger.info(f"Zadanie LLM {job_id} czeka na limit zapytań ({e.retry_after:.0f} s)")
+            job.status = retry_status
+            job.attempts = max(job.attempts - 1, 0)
+            job.available_at = now + timedelta(seconds=e.retry_after)
+            db.session.commit()
+            return e.retry_after
+        result = {'success': False, 'message': str(e)}
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in LLM job {job_id} ({job.task_type}): {str(e)}")
+        if job.attempts < LLM_JOB_MAX_ATTEMPTS and "timeout" not in str(
+                e).lower():
+            job.status = retry_status
+            db.session.commit()
+            return 0.0
+        result = {
+            'success': False,
+            'message': llm_error_message(e, error_message, shorten_hint)
+        }
+
+    finish_llm_job(job, result)
+    return None
+
+
+def finish_llm_job(job, result):
+    """Zapisuje wynik i końcowy status zadania; nieudane zadanie zwraca zarezerwowany kredyt"""
+    job.result = json.dumps(result, ensure_ascii=False)
+    job.status = 'completed' if result.get('success') else 'failed'
+    job.finished_at = datetime.utcnow()
+    credit_payment_id = job.credit_payment_id
+    if job.status == 'failed':
+        # Zwrot tylko raz - kolumna czyszczona razem ze zmianą statusu
+        job.credit_payment_id = None
+    db.session.commit()
+    logger.info(f"Zadanie LLM {job.id} ({job.task_type}) zakończone: {job.status}")
+    if job.status == 'failed' and credit_payment_id:
+        refund_optimization_credit(job.user_id, credit_payment_id)
+
+
+_llm_job_wakeup = threading.Event()
+_llm_job_workers = []
+_llm_job_workers_lock = threading.Lock()
+
+
+def llm_job_worker_loop(worker_id, stop_event=None):
+    """Pętla workera: przejmuje i wykonuje zadania aż do zatrzymania"""
+    logger.info(f"Worker zadań LLM {worker_id} uruchomiony")
+    while stop_event is None or not stop_event.is_set():
+        job_id = None
+        try:
+            with app.app_context():
+                job_id = claim_llm_job(worker_id)
+                if job_id:
+                    run_llm_job(job_id)
+        except Exception as e:
+            logger.error(f"Błąd workera zadań LLM {worker_id}: {str(e)}")
+
+        if not job_id:
+            _llm_job_wakeup.wait(LLM_JOB_POLL_INTERVAL)
+            _llm_job_wakeup.clear()
+
+
+def start_llm_job_workers(count, stop_event=None):
+    """Uruchamia `count` wątków workera w bieżącym procesie"""
+    threads = []
+    for i in range(count):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}"
+        thread = threading.Thread(target=llm_job_worker_loop,
+                                  args=(worker_id, stop_event),
+                                  name=f"llm-job-worker-{i}",
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def ensure_llm_job_workers():
+    """Leniwie uruchamia wbudowane workery w procesie web (jeśli włączone)"""
+    if LLM_JOB_EMBEDDED_WORKERS <= 0:
+        return
+    with _llm_job_workers_lock:
+        if any(thread.is_alive() for thread in _llm_job_workers):
+            return
+        _llm_job_workers[:] = start_llm_job_workers(LLM_JOB_EMBEDDED_WORKERS)
+
+
 @app.route('/result/<session_id>')
 @login_required
 def result(session_id):
@@ -1229,7 +2478,7 @@ def payment_success():
             checkout_session = stripe.checkout.Session.retrieve(session_id)
             
             if checkout_session.payment_status == 'paid':
-                payment_type = checkout_session.metadata.get('payment_type')
+                payment_type = getattr(checkout_session.metadata, 'payment_type', None)
                 
                 # Zapisz płatność w bazie danych
                 if payment_type == 'single_cv':
@@ -1307,6 +2556,7 @@ def process_single_payment(checkout_session):
         
         db.session.add(single_payment)
         db.session.commit()
+        current_user.invalidate_entitlements()
         
         logger.info(f"Single payment processed for user {current_user.id}")
         
@@ -1324,7 +2574,8 @@ def process_subscription_payment(checkout_session):
         # Zapisz płatność
         payment = StripePayment()
         payment.user_id = current_user.id
-        payment.stripe_payment_intent_id = checkout_session.payment_intent
+        # Sesje w trybie subskrypcji nie mają payment_intent - zapisujemy ID sesji
+        payment.stripe_payment_intent_id = checkout_session.payment_intent or checkout_session.id
         payment.stripe_session_id = checkout_session.id
         payment.amount = checkout_session.amount_total
         payment.currency = checkout_session.currency.upper()
@@ -1348,6 +2599,7 @@ def process_subscription_payment(checkout_session):
         
         db.session.add(subscription)
         db.session.commit()
+        current_user.invalidate_entitlements()
         
         logger.info(f"Subscription processed for user {current_user.id}")
         
@@ -1358,8 +2610,8 @@ def process_subscription_payment(checkout_session):
 
 def handle_checkout_session_completed(session):
     """Obsługuje zakończoną sesję checkout"""
-    user_id = session['metadata'].get('user_id')
-    payment_type = session['metadata'].get('payment_type')
+    user_id = getattr(session['metadata'], 'user_id', None)
+    payment_type = getattr(session['metadata'], 'payment_type', None)
     
     if user_id and payment_type:
         user = User.query.get(int(user_id))
@@ -1386,6 +2638,7 @@ def handle_subscription_payment_succeeded(invoice):
         subscription_obj.current_period_end = datetime.fromtimestamp(stripe_subscription.current_period_end)
         subscription_obj.status = stripe_subscription.status
         db.session.commit()
+        invalidate_user_entitlements(subscription_obj.user_id)
 
 
 def handle_subscription_deleted(subscription):
@@ -1397,6 +2650,7 @@ def handle_subscription_deleted(subscription):
     if subscription_obj:
         subscription_obj.status = 'canceled'
         db.session.commit()
+        invalidate_user_entitlements(subscription_obj.user_id)
 
 
 # Error handlers
@@ -1449,6 +2703,8 @@ def login():
 
             # Aktualizuj statystyki logowania
             user_stats = user.get_statistics()
+            if user_stats not in db.session:
+                db.session.add(user_stats)
             user_stats.total_logins += 1
             user_stats.updated_at = datetime.utcnow()
 
@@ -1511,6 +2767,8 @@ def register():
         user.password_hash = generate_password_hash(password)
 
         db.session.add(user)
+        db.session.flush()
+        db.session.add(UserStatistics.create_for(user.id))
         db.session.commit()
 
         flash('Rejestracja przebiegła pomyślnie! Możesz się teraz zalogować.',
@@ -1523,11 +2781,35 @@ def register():
 # Register blueprint
 app.register_blueprint(auth)
 
+def upgrade_database():
+    """
+    Doprowadza schemat bazy do najnowszej migracji
+
+    Baza utworzona przez db.create_all() sprzed migracji (bez tabeli
+    alembic_version) przechodzi przez idempotentną rewizję bazową - dostaje
+    brakujące tabele, kolumny i indeksy schematu 0001 - a dopiero potem
+    kolejne migracje. Blokada pliku chroni przed równoległymi migracjami z
+    kilku workerów gunicorna na tej samej maszynie.
+    """
+    import fcntl
+    from flask_migrate import upgrade
+    from utils.sqlite_store import state_path
+
+    with open(state_path('migrate.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        tables = set(sa_inspect(db.engine).get_table_names())
+        if tables and 'alembic_version' not in tables:
+            logger.info("🛠️ Baza sprzed migracji - uzupełniam schemat do rewizji bazowej")
+            upgrade(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+        upgrade(directory=MIGRATIONS_DIR)
+
+
 # Create database tables with error handling
 try:
     with app.app_context():
-        db.create_all()
-        logger.info("Database tables created successfully")
+        if DB_AUTO_MIGRATE:
+            upgrade_database()
+            logger.info("Database schema is up to date")
 
         # Create developer account if it doesn't exist
         developer = User.query.filter_by(username='developer').first()
@@ -1542,6 +2824,8 @@ try:
             developer.created_at = datetime.utcnow()
 
             db.session.add(developer)
+            db.session.flush()
+            db.session.add(UserStatistics.create_for(developer.id))
             db.session.commit()
 
             logger.info(
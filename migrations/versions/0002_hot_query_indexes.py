@@ -0,0 +1,55 @@
+"""hot query indexes
+
+Indeksy pod zapytania wykonywane przy każdym żądaniu: profil i statystyki
+(cv_upload po user_id i created_at), strona wyniku (wygenerowane treści po
+cv_upload_id), uprawnienia (subscription, single_payment) i kolejka zadań LLM.
+
+Revision ID: 0002_hot_query_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-17 07:34:03.491248
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_hot_query_indexes'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+# (nazwa, tabela, kolumny, warunek indeksu częściowego)
+INDEXES = [
+    ('ix_cv_upload_user_id_created_at', 'cv_upload', ['user_id', 'created_at'], None),
+    ('ix_cover_letter_cv_upload_id', 'cover_letter', ['cv_upload_id'], None),
+    ('ix_interview_questions_cv_upload_id', 'interview_questions', ['cv_upload_id'], None),
+    ('ix_skills_gap_analysis_cv_upload_id', 'skills_gap_analysis', ['cv_upload_id'], None),
+    ('ix_subscription_user_id_status', 'subscription', ['user_id', 'status'], None),
+    ('ix_single_payment_user_id_available', 'single_payment', ['user_id'],
+     'cv_optimizations_used < cv_optimizations_limit'),
+    ('ix_user_statistics_user_id', 'user_statistics', ['user_id'], None),
+    ('ix_llm_job_queued_created_at', 'llm_job', ['created_at'], "status = 'queued'"),
+    ('ix_llm_job_running_started_at', 'llm_job', ['started_at'], "status = 'running'"),
+    ('ix_llm_job_parent_id', 'llm_job', ['parent_id'], None),
+    ('ix_llm_job_cv_upload_id_task_type', 'llm_job', ['cv_upload_id', 'task_type'], None),
+]
+
+
+def upgrade():
+    # CONCURRENTLY na Postgresie nie blokuje zapisów do dużych tabel, ale nie
+    # działa w transakcji. IF NOT EXISTS - bazy sprzed migracji mogły dostać
+    # część tabel (z indeksami z modeli) przez db.create_all()
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            condition = sa.text(where) if where else None
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=True,
+                            postgresql_where=condition, sqlite_where=condition)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True,
+                          postgresql_concurrently=True)
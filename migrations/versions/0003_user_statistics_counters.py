@@ -0,0 +1,56 @@
+"""user statistics counters
+
+Liczniki CV w user_statistics (przesłane, zoptymalizowane, przeanalizowane) -
+profil i dashboard czytają jeden wiersz zamiast liczyć cv_upload przy każdym
+wyświetleniu. Istniejące wiersze dostają wartości policzone z cv_upload.
+
+Revision ID: 0003_user_statistics_counters
+Revises: 0002_hot_query_indexes
+Create Date: 2026-10-17 07:38:20.023880
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_user_statistics_counters'
+down_revision = '0002_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+# licznik -> warunek na cv_upload
+COUNTERS = {
+    'cv_count': None,
+    'optimized_count': 'optimized_cv IS NOT NULL',
+    'analyzed_count': 'cv_analysis IS NOT NULL',
+}
+
+
+def upgrade():
+    # Bazy uruchomione ze starym startem (create_all + ensure_schema_columns
+    # na modelach) mogą już mieć te kolumny - bez NOT NULL i domyślnej wartości
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('user_statistics')}
+    with op.batch_alter_table('user_statistics', schema=None) as batch_op:
+        for name in COUNTERS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+
+    assignments = ', '.join(
+        f"{name} = (SELECT COUNT(*) FROM cv_upload WHERE cv_upload.user_id = user_statistics.user_id"
+        f"{' AND cv_upload.' + condition if condition else ''})"
+        for name, condition in COUNTERS.items())
+    op.execute(f"UPDATE user_statistics SET {assignments}")
+
+    repaired = [name for name in COUNTERS if name in existing]
+    if repaired:
+        with op.batch_alter_table('user_statistics', schema=None) as batch_op:
+            for name in repaired:
+                batch_op.alter_column(name, existing_type=sa.Integer(), nullable=False,
+                                      server_default='0')
+
+
+def downgrade():
+    with op.batch_alter_table('user_statistics', schema=None) as batch_op:
+        for name in reversed(list(COUNTERS)):
+            batch_op.drop_column(name)
@@ -0,0 +1,63 @@
+"""user activity buckets
+
+Dzienne liczniki przesłanych CV z ostatnich 30 dni w user_statistics
+(daily_uploads) - "aktywność z ostatnich dni" na profilu bez zapytania do
+cv_upload. Użytkownicy bez wiersza statystyk dostają go tutaj, z licznikami
+policzonymi z cv_upload (wcześniej tworzył go pierwszy odczyt profilu).
+
+Revision ID: 0004_user_activity_buckets
+Revises: 0003_user_statistics_counters
+Create Date: 2026-10-17 09:12:41.118302
+
+"""
+import json
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_user_activity_buckets'
+down_revision = '0003_user_statistics_counters'
+branch_labels = None
+depends_on = None
+
+# Musi odpowiadać USER_ACTIVITY_DAYS w app.py
+ACTIVITY_DAYS = 30
+
+
+def upgrade():
+    with op.batch_alter_table('user_statistics', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('daily_uploads', sa.Text(), nullable=True))
+
+    op.execute("""
+        INSERT INTO user_statistics (user_id, total_logins, total_time_spent, avg_optimization_time,
+                                     cv_count, optimized_count, analyzed_count, created_at, updated_at)
+        SELECT u.id, 0, 0, 0.0,
+               (SELECT COUNT(*) FROM cv_upload c WHERE c.user_id = u.id),
+               (SELECT COUNT(*) FROM cv_upload c WHERE c.user_id = u.id AND c.optimized_cv IS NOT NULL),
+               (SELECT COUNT(*) FROM cv_upload c WHERE c.user_id = u.id AND c.cv_analysis IS NOT NULL),
+               CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM "user" u
+        WHERE NOT EXISTS (SELECT 1 FROM user_statistics s WHERE s.user_id = u.id)
+    """)
+
+    connection = op.get_bind()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = connection.execute(sa.text("""
+        SELECT user_id, date(created_at), COUNT(*) FROM cv_upload
+        WHERE created_at >= :cutoff
+        GROUP BY user_id, date(created_at)
+    """), {'cutoff': today - timedelta(days=ACTIVITY_DAYS)}).fetchall()
+    daily_uploads = {}
+    for user_id, day, count in rows:
+        daily_uploads.setdefault(user_id, {})[str(day)] = count
+    for user_id, daily in daily_uploads.items():
+        connection.execute(sa.text("UPDATE user_statistics SET daily_uploads = :daily WHERE user_id = :user_id"),
+                           {'daily': json.dumps(dict(sorted(daily.items()))), 'user_id': user_id})
+
+
+def downgrade():
+    with op.batch_alter_table('user_statistics', schema=None) as batch_op:
+        batch_op.drop_column('daily_uploads')
@@ -0,0 +1,42 @@
+"""llm stream indexes
+
+Indeksy częściowe na zadaniach strumieniowanych ('reserved' po POST
+/<zadanie>/stream, 'streaming' w trakcie GET) - expire_llm_streams szuka
+nieodebranych i przerwanych przy każdym przejęciu zadania przez workera.
+
+Revision ID: 0005_llm_stream_indexes
+Revises: 0004_user_activity_buckets
+Create Date: 2026-10-17 10:02:17.532904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_llm_stream_indexes'
+down_revision = '0004_user_activity_buckets'
+branch_labels = None
+depends_on = None
+
+# (nazwa, kolumna, warunek indeksu częściowego)
+INDEXES = [
+    ('ix_llm_job_reserved_created_at', 'created_at', "status = 'reserved'"),
+    ('ix_llm_job_streaming_started_at', 'started_at', "status = 'streaming'"),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, column, where in INDEXES:
+            condition = sa.text(where)
+            op.create_index(name, 'llm_job', [column], unique=False, if_not_exists=True,
+                            postgresql_concurrently=True,
+                            postgresql_where=condition, sqlite_where=condition)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='llm_job', if_exists=True,
+                          postgresql_concurrently=True)
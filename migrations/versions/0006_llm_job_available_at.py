@@ -0,0 +1,29 @@
+"""llm job available at
+
+llm_job.available_at - zadanie odłożone przez limit zapytań nie jest
+przejmowane przez workery przed upływem retry_after.
+
+Revision ID: 0006_llm_job_available_at
+Revises: 0005_llm_stream_indexes
+Create Date: 2026-10-17 11:24:08.610275
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_llm_job_available_at'
+down_revision = '0005_llm_stream_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('llm_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('llm_job', schema=None) as batch_op:
+        batch_op.drop_column('available_at')
@@ -0,0 +1,217 @@
+"""
+Benchmarki ekstrakcji tekstu z PDF
+
+--mode pages (domyślnie): dla każdej liczby stron generuje PDF z gęstym
+tekstem i mierzy medianę czasu ekstrakcji: w procesie, w jednym procesie
+piaskownicy oraz po podziale stron między procesy puli. Na końcu podaje
+próg opłacalności (najmniejszą liczbę stron, od której wersja równoległa
+jest szybsza) - to wartość dla PDF_PARALLEL_MIN_PAGES.
+
+--mode backends: uruchamia każdy zainstalowany backend (pdftotext, pypdf,
+PyPDF2, pdfminer.six) na korpusie PDF (--corpus katalog, domyślnie
+wygenerowane próbki) i raportuje czas, odsetek porażek i jakość tekstu
+(text_quality). Proponuje kolejność dla PDF_EXTRACTION_BACKENDS.
+
+Przykład:
+    python scripts/benchmark_pdf_extraction.py --workers 4 --pages 1,2,4,8,16,32
+    python scripts/benchmark_pdf_extraction.py --mode backends --corpus ~/cv-probki
+"""
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import statistics
+from io import BytesIO
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPTS_DIR))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from loadtest import SAMPLE_CVS, build_sample_pdf  # noqa: E402
+from utils.pdf_extraction import BACKENDS, extract_text_from_pdf, join_page_texts, text_quality  # noqa: E402
+from utils.pdf_sandbox import PDFSandboxPool, _extract_parallel  # noqa: E402
+
+
+def page_lines(density):
+    """Linie jednej strony: przykładowe CV powtórzone `density` razy"""
+    lines = [line for _, cv_lines in SAMPLE_CVS for line in cv_lines if line]
+    return (lines * density)[:55 * density]
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+        if not result:
+            raise RuntimeError("Ekstrakcja nie zwróciła tekstu")
+    return statistics.median(timings) * 1000
+
+
+def run_benchmark(page_counts, workers, repeat, density):
+    pool = PDFSandboxPool(workers=workers, max_tasks=10**6)
+    lines = page_lines(density)
+    rows = []
+    try:
+        # Rozgrzewka: uruchomienie wszystkich procesów puli poza pomiarem
+        warmup = build_sample_pdf(lines, pages=workers)
+        _extract_parallel(pool, warmup, workers)
+
+        for pages in page_counts:
+            data = build_sample_pdf(lines, pages=pages)
+            rows.append({
+                'pages': pages,
+                'size_kb': round(len(data) / 1024, 1),
+                'in_process_ms': measure(lambda: extract_text_from_pdf(data), repeat),
+                'sandbox_serial_ms': measure(lambda: pool.run('extract_text', data), repeat),
+                'sandbox_parallel_ms': measure(lambda: _extract_parallel(pool, data, pages), repeat),
+            })
+    finally:
+        pool.shutdown()
+    return rows
+
+
+def crossover(rows):
+    """Najmniejsza liczba stron, od której równolegle jest szybciej dla wszystkich większych"""
+    threshold = None
+    for row in reversed(rows):
+        if row['sandbox_parallel_ms'] < row['sandbox_serial_ms']:
+            threshold = row['pages']
+        else:
+            break
+    return threshold
+
+
+def print_report(rows, workers):
+    print(f"\nProcesy puli: {workers}")
+    header = f"{'stron':>6} {'KB':>8} {'w procesie':>12} {'szeregowo':>11} {'równolegle':>12} {'przyspieszenie':>15}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        speedup = row['sandbox_serial_ms'] / row['sandbox_parallel_ms']
+        print(f"{row['pages']:>6} {row['size_kb']:>8} {row['in_process_ms']:>10.1f}ms "
+              f"{row['sandbox_serial_ms']:>9.1f}ms {row['sandbox_parallel_ms']:>10.1f}ms {speedup:>14.2f}x")
+    threshold = crossover(rows)
+    if threshold:
+        print(f"\nPróg opłacalności: {threshold} stron (PDF_PARALLEL_MIN_PAGES={threshold})")
+    else:
+        print("\nWersja równoległa nie wygrała dla największych dokumentów - zostaw ekstrakcję szeregową")
+
+
+def load_corpus(directory=None):
+    """Lista (nazwa, bajty PDF) z katalogu albo wygenerowane próbki CV"""
+    if directory:
+        paths = sorted(glob.glob(os.path.join(os.path.expanduser(directory), '**', '*.pdf'), recursive=True))
+        corpus = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                corpus.append((os.path.relpath(path, directory), f.read()))
+        return corpus
+    return [(f"{title} ({pages} str.)", build_sample_pdf(lines, pages=pages))
+            for title, lines in SAMPLE_CVS for pages in (1, 3, 12)]
+
+
+def _backend_text(backend, data):
+    page_texts = backend.extract_pages(BytesIO(data))
+    return join_page_texts(page_texts) if page_texts else None
+
+
+def run_backend_benchmark(corpus, repeat):
+    rows = []
+    for name, backend in BACKENDS.items():
+        if not backend.is_available():
+            rows.append({'backend': name, 'available': False})
+            continue
+        timings, qualities, failures = [], [], 0
+        # Rozgrzewka (import modułu) poza pomiarem
+        try:
+            _backend_text(backend, corpus[0][1])
+        except Exception:
+            pass
+        for _, data in corpus:
+            try:
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    text = _backend_text(backend, data)
+                    samples.append(time.perf_counter() - started)
+                timings.append(statistics.median(samples) * 1000)
+            except Exception:
+                text = None
+            quality = text_quality(text)
+            qualities.append(quality)
+            if not text:
+                failures += 1
+        rows.append({
+            'backend': name,
+            'available': True,
+            'median_ms': statistics.median(timings) if timings else None,
+            'failure_rate': failures / len(corpus),
+            'mean_quality': round(statistics.mean(qualities), 3),
+        })
+    return rows
+
+
+def recommended_order(rows):
+    """Najszybsze z niskim odsetkiem porażek najpierw, zawodne na koniec (jako ostatnia deska ratunku)"""
+    available = [row for row in rows if row['available'] and row['median_ms'] is not None]
+    available.sort(key=lambda row: (row['failure_rate'] > 0.2, row['mean_quality'] < 0.8, row['median_ms']))
+    return [row['backend'] for row in available]
+
+
+def print_backend_report(rows, corpus_size):
+    print(f"\nKorpus: {corpus_size} plików PDF")
+    header = f"{'backend':<10} {'mediana':>10} {'porażki':>9} {'jakość':>8}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        if not row['available']:
+            print(f"{row['backend']:<10} {'niezainstalowany':>29}")
+            continue
+        median = f"{row['median_ms']:.1f}ms" if row['median_ms'] is not None else '-'
+        print(f"{row['backend']:<10} {median:>10} {row['failure_rate']:>8.0%} {row['mean_quality']:>8.3f}")
+    order = recommended_order(rows)
+    if order:
+        print(f"\nProponowana kolejność: PDF_EXTRACTION_BACKENDS={','.join(order)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ekstrakcji tekstu z PDF")
+    parser.add_argument('--mode', choices=('pages', 'backends'), default='pages')
+    parser.add_argument('--corpus', help="Katalog z plikami PDF (tryb backends)")
+    parser.add_argument('--pages', default='1,2,4,6,8,12,16,24,32',
+                        help="Liczby stron po przecinku")
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 2))
+    parser.add_argument('--repeat', type=int, default=5, help="Powtórzeń na pomiar (mediana)")
+    parser.add_argument('--density', type=int, default=1,
+                        help="Mnożnik ilości tekstu na stronie")
+    parser.add_argument('--json', help="Zapisz wyniki do pliku JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.mode == 'backends':
+        corpus = load_corpus(args.corpus)
+        if not corpus:
+            print(f"Brak plików PDF w {args.corpus}")
+            return 1
+        rows = run_backend_benchmark(corpus, args.repeat)
+        print_backend_report(rows, len(corpus))
+        result = {'corpus_size': len(corpus), 'recommended_order': recommended_order(rows), 'rows': rows}
+    else:
+        page_counts = [int(value) for value in args.pages.split(',') if value.strip()]
+        rows = run_benchmark(page_counts, args.workers, args.repeat, args.density)
+        print_report(rows, args.workers)
+        result = {'workers': args.workers, 'crossover_pages': crossover(rows), 'rows': rows}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
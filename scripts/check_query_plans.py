@@ -0,0 +1,161 @@
+"""
+Kontrola planów zapytań na gorących ścieżkach (CI)
+
+Wykonuje funkcje aplikacji używane przy każdym żądaniu (profil, strona
+wyniku, uprawnienia, kolejka zadań LLM) na pustych danych, przechwytuje
+wysłane zapytania SQL i sprawdza ich plany:
+
+- SQLite: EXPLAIN QUERY PLAN - "SCAN <tabela>" bez indeksu to pełny skan,
+- PostgreSQL: EXPLAIN z enable_seqscan=off - Seq Scan zostaje w planie
+  tylko wtedy, gdy żaden indeks nie pasuje do zapytania.
+
+Kończy się kodem 1, jeśli któreś zapytanie czyta całą tabelę. Baza musi
+mieć aktualny schemat (flask --app app db upgrade albo DB_AUTO_MIGRATE=1).
+
+Przykład:
+    DATABASE_URL=postgresql://... python scripts/check_query_plans.py
+"""
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import (CoverLetter, CVUpload, Entitlements, InterviewQuestions, LLMJob,  # noqa: E402
+                 SinglePayment, SkillsGapAnalysis, User, UserStatistics, app,
+                 claim_llm_job, db, expire_llm_streams)
+
+# Tabele, które rosną z ruchem - pełny skan na nich to błąd
+LARGE_TABLES = ('user', 'cv_upload', 'cover_letter', 'interview_questions', 'skills_gap_analysis',
+                'subscription', 'single_payment', 'stripe_payment', 'user_statistics', 'llm_job')
+
+
+def hot_queries(user, cv_upload_id):
+    """Nazwa -> funkcja wykonująca zapytania gorącej ścieżki"""
+    return {
+        'profil: statystyki': lambda: UserStatistics.query.filter_by(user_id=user.id).first(),
+        'profil: aktywność z 30 dni': user.get_recent_activity,
+        'wynik: CV z sesji': lambda: CVUpload.query.filter_by(session_id='plan-check', user_id=user.id).first(),
+        'wynik: listy motywacyjne': lambda: CoverLetter.query.filter_by(cv_upload_id=cv_upload_id).all(),
+        'wynik: pytania na rozmowę': lambda: InterviewQuestions.query.filter_by(cv_upload_id=cv_upload_id).all(),
+        'wynik: luki kompetencyjne': lambda: SkillsGapAnalysis.query.filter_by(cv_upload_id=cv_upload_id).all(),
+        'uprawnienia': lambda: Entitlements.load(user),
+        'rezerwacja kredytu': lambda: SinglePayment.reserve_credit(user.id),
+        'kolejka: przejęcie zadania': lambda: claim_llm_job('query-plan-check'),
+        'kolejka: duplikat zadania': lambda: LLMJob.query.filter(
+            LLMJob.user_id == user.id, LLMJob.cv_upload_id == cv_upload_id,
+            LLMJob.task_type == 'optimize_cv', LLMJob.params == '{}',
+            LLMJob.status.in_(['queued', 'running'])).first(),
+        'kolejka: zadania pakietu': lambda: LLMJob.query.filter_by(parent_id='plan-check').all(),
+        'strumień: wygasłe rezerwacje': expire_llm_streams,
+    }
+
+
+def capture_statements(fn):
+    """Zapytania SQL (tekst, parametry) wysłane podczas wykonania `fn`"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+        db.session.rollback()
+    return statements
+
+
+def _sqlite_full_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    details = [row[-1] for row in rows]
+    scans = []
+    for detail in details:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and 'INDEX' not in words:
+            scans.append(words[1])
+    return scans, details
+
+
+def _postgres_full_scans(connection, statement, parameters):
+    connection.exec_driver_sql("SET enable_seqscan = off")
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans, details = [], []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        relation = node.get('Relation Name')
+        details.append(f"{node['Node Type']}{' on ' + relation if relation else ''}")
+        if node['Node Type'] == 'Seq Scan':
+            scans.append(relation)
+        nodes.extend(node.get('Plans', []))
+    return scans, details
+
+
+def check_plans(queries):
+    """
+    Sprawdza plany wszystkich zapytań
+
+    Returns:
+        list: Słowniki z nazwą, zapytaniem, planem i listą tabel czytanych w całości
+    """
+    dialect = db.engine.dialect.name
+    explain = _postgres_full_scans if dialect == 'postgresql' else _sqlite_full_scans
+    results = []
+    for name, fn in queries.items():
+        for statement, parameters in capture_statements(fn):
+            with db.engine.connect() as connection:
+                scans, details = explain(connection, statement, parameters)
+                connection.rollback()
+            results.append({
+                'name': name,
+                'statement': ' '.join(statement.split()),
+                'plan': details,
+                'full_scans': [table for table in scans if table in LARGE_TABLES],
+            })
+    return results
+
+
+def print_report(results, dialect):
+    failures = 0
+    for result in results:
+        status = 'OK' if not result['full_scans'] else f"PEŁNY SKAN: {', '.join(result['full_scans'])}"
+        print(f"{result['name']:<30} {status}")
+        if result['full_scans']:
+            failures += 1
+            print(f"    {result['statement'][:200]}")
+            for line in result['plan']:
+                print(f"    - {line}")
+    print(f"\nZapytań: {len(results)}, z pełnym skanem: {failures} ({dialect})")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Kontrola planów zapytań na gorących ścieżkach")
+    parser.add_argument('--json', help="Zapisz wyniki do pliku JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with app.app_context():
+        # Użytkownik spoza bazy - zapytania mają tylko wygenerować SQL z realnymi parametrami
+        user = User(id=0, username='query-plan-check', created_at=datetime.utcnow())
+        results = check_plans(hot_queries(user, cv_upload_id=0))
+        dialect = db.engine.dialect.name
+    failures = print_report(results, dialect)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
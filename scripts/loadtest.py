@@ -0,0 +1,467 @@
+"""
+Test obciążeniowy ścieżki użytkownika: rejestracja -> logowanie -> pakiet
+-> upload CV -> optymalizacja/analiza -> list, pytania, analiza luk
+
+Każdy wirtualny użytkownik ma własną sesję HTTP i wykonuje pełną ścieżkę
+w pętli. Trasy AI zwracają 202 z ID zadania - mierzymy zarówno przyjęcie
+zadania, jak i czas do jego zakończenia (odpytywanie /jobs/<id>).
+
+Z --spawn skrypt sam uruchamia aplikację (gunicorn, tymczasowa baza SQLite)
+z lokalnym mockiem OpenRouter i Stripe. Raport: przepustowość, p50/p95/p99
+per trasa, odsetek błędów i średnia liczba zapytań SQL (X-DB-Query-Count).
+
+Przykład:
+    python scripts/loadtest.py --spawn --users 10 --iterations 3 --llm-profile realistic
+    python scripts/loadtest.py --spawn --json wynik.json --baseline poprzedni.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPTS_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+
+import mock_openrouter  # noqa: E402
+import mock_stripe  # noqa: E402
+
+JOB_TERMINAL_STATUSES = ('completed', 'failed')
+
+SAMPLE_CVS = [
+    ("Senior Python Developer", [
+        "JAN KOWALSKI", "Senior Python Developer", "jan.kowalski@example.com | +48 600 000 000", "",
+        "DOŚWIADCZENIE ZAWODOWE",
+        "2020 - obecnie: Senior Python Developer, TechCorp Sp. z o.o., Warszawa",
+        "- Rozwój API w Flask i Django dla 2 mln użytkowników",
+        "- Skrócenie czasu odpowiedzi o 45% dzięki cache i profilowaniu SQL",
+        "2016 - 2020: Python Developer, SoftHouse S.A., Kraków",
+        "- Integracje płatności i systemów zewnętrznych", "",
+        "UMIEJĘTNOŚCI", "Python, Flask, Django, PostgreSQL, Redis, Docker, Kubernetes, AWS", "",
+        "WYKSZTAŁCENIE", "Politechnika Warszawska - Informatyka (mgr inż.)", "",
+        "ZAINTERESOWANIA", "Góry, rower, szachy", "",
+        "Wyrażam zgodę na przetwarzanie moich danych osobowych dla potrzeb rekrutacji.",
+    ]),
+    ("Specjalista ds. marketingu", [
+        "ANNA NOWAK", "Specjalista ds. marketingu internetowego", "anna.nowak@example.com", "",
+        "DOŚWIADCZENIE",
+        "2019 - obecnie: Specjalista ds. marketingu, Sklep24 Sp. z o.o.",
+        "- Prowadzenie kampanii Google Ads i Meta Ads z budżetem 50 tys. zł/msc",
+        "- Wzrost konwersji o 30% dzięki testom A/B stron docelowych",
+        "2017 - 2019: Młodszy specjalista ds. social media, Agencja Kreatywna", "",
+        "UMIEJĘTNOŚCI", "Google Analytics 4, Google Ads, SEO, copywriting, Canva", "",
+        "JĘZYKI", "Angielski - C1, Niemiecki - B1",
+    ]),
+]
+
+JOB_DESCRIPTION = ("Szukamy osoby z doświadczeniem w pracy zespołowej, "
+                   "nastawionej na wyniki i rozwój. Mile widziana znajomość "
+                   "narzędzi analitycznych i pracy w metodyce Agile.")
+
+
+def _pdf_text(text):
+    """Tekst dla fontu Helvetica (WinAnsi) - bez polskich znaków, z escapowaniem"""
+    text = text.replace('ł', 'l').replace('Ł', 'L')
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_sample_pdf(lines, pages=1):
+    """
+    Buduje minimalny PDF z podanymi liniami tekstu na każdej stronie
+
+    Args:
+        lines (list): Linie tekstu jednej strony
+        pages (int): Liczba stron (każda z tą samą treścią i numerem strony)
+
+    Returns:
+        bytes: Zawartość pliku PDF (czytelna dla PyPDF2)
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # drzewo stron - uzupełniane po dodaniu stron
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for page_number in range(1, pages + 1):
+        content = ["BT", "/F1 11 Tf", "14 TL", "50 800 Td"]
+        for line in lines:
+            content.append(f"({_pdf_text(line)}) Tj T*")
+        if pages > 1:
+            content.append(f"(Strona {page_number} / {pages}) Tj T*")
+        content.append("ET")
+        stream = '\n'.join(content).encode('latin-1')
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>".encode())
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode()
+    return bytes(pdf)
+
+
+class Recorder:
+    """Zbiera czasy odpowiedzi, błędy i liczbę zapytań SQL per trasa"""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def add(self, route, seconds, ok, queries=None, error=None):
+        with self.lock:
+            self.samples.setdefault(route, []).append((seconds, ok, queries, error))
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+class VirtualUser:
+
+    def __init__(self, base_url, index, run_id, recorder, args):
+        self.base_url = base_url.rstrip('/')
+        self.index = index
+        self.recorder = recorder
+        self.args = args
+        self.http = requests.Session()
+        self.username = f"load_{run_id}_{index}"
+        self.password = "loadtest123"
+
+    def call(self, route, method, path, expect_json=True, **kwargs):
+        """Wysyła zapytanie, mierzy czas i zapisuje wynik pod nazwą `route`"""
+        started = time.perf_counter()
+        error = None
+        body = None
+        try:
+            response = self.http.request(method, self.base_url + path,
+                                         timeout=self.args.timeout,
+                                         allow_redirects=False, **kwargs)
+            elapsed = time.perf_counter() - started
+            queries = response.headers.get('X-DB-Query-Count')
+            queries = int(queries) if queries is not None else None
+            ok = response.status_code < 400
+            if expect_json and ok:
+                body = response.json()
+                # Trasy zwracają błędy biznesowe jako 200 z success=false
+                if body.get('success') is False:
+                    ok = False
+                    error = body.get('message', 'success=false')
+            elif not ok:
+                error = f"HTTP {response.status_code}"
+        except (requests.RequestException, ValueError) as e:
+            elapsed = time.perf_counter() - started
+            ok, queries, error = False, None, type(e).__name__
+        self.recorder.add(route, elapsed, ok, queries, error)
+        return body if ok else None
+
+    def setup(self):
+        """Rejestracja, logowanie i zakup pakietu miesięcznego (raz na użytkownika)"""
+        self.call('POST /auth/register', 'POST', '/auth/register', expect_json=False, data={
+            'username': self.username,
+            'email': f"{self.username}@example.com",
+            'first_name': 'Load',
+            'last_name': f"Tester{self.index}",
+            'password': self.password,
+            'password2': self.password
+        })
+        self.call('POST /auth/login', 'POST', '/auth/login', expect_json=False, data={
+            'username_or_email': self.username,
+            'password': self.password
+        })
+        if self.args.skip_payment:
+            return True
+
+        checkout = self.call('POST /create-checkout-session', 'POST',
+                             '/create-checkout-session',
+                             json={'payment_type': 'monthly_package'})
+        if not checkout or 'checkout_url' not in checkout:
+            return False
+        session_id = checkout['checkout_url'].rstrip('/').rsplit('/', 1)[-1]
+        self.call('GET /payment-success', 'GET',
+                  f"/payment-success?session_id={session_id}", expect_json=False)
+        return True
+
+    def wait_for_job(self, route, accepted, started):
+        """Odpytuje /jobs/<id> aż do zakończenia i zapisuje czas całego zadania"""
+        deadline = started + self.args.job_timeout
+        status_url = accepted.get('status_url') or f"/jobs/{accepted['job_id']}"
+        while time.perf_counter() < deadline:
+            time.sleep(self.args.poll_interval)
+            job = self.call('GET /jobs/<id>', 'GET', status_url)
+            if job and job.get('status') in JOB_TERMINAL_STATUSES:
+                ok = job['status'] == 'completed'
+                error = None if ok else (job.get('result') or {}).get('message', 'failed')
+                self.recorder.add(f"{route} [zadanie]", time.perf_counter() - started, ok, None, error)
+                return ok
+        self.recorder.add(f"{route} [zadanie]", time.perf_counter() - started, False, None, 'timeout')
+        return False
+
+    def run_task(self, route, path, payload):
+        started = time.perf_counter()
+        accepted = self.call(f"POST {route}", 'POST', path, json=payload)
+        if accepted and accepted.get('job_id'):
+            self.wait_for_job(f"POST {route}", accepted, started)
+
+    def journey(self, iteration):
+        job_title, lines = random.choice(SAMPLE_CVS)
+        pdf = build_sample_pdf(lines)
+        uploaded = self.call('POST /upload-cv', 'POST', '/upload-cv', data={
+            'job_title': job_title,
+            'job_description': JOB_DESCRIPTION
+        }, files={'cv_file': (f"cv_{self.index}_{iteration}.pdf", pdf, 'application/pdf')})
+        if not uploaded:
+            return
+
+        session_id = uploaded['session_id']
+        generator_payload = {'session_id': session_id, 'job_title': job_title,
+                             'job_description': JOB_DESCRIPTION, 'company_name': 'ACME'}
+        tasks = [
+            ('/optimize-cv', {'session_id': session_id}),
+            ('/analyze-cv', {'session_id': session_id}),
+        ]
+        if not self.args.skip_payment:
+            tasks += [
+                ('/generate-cover-letter', generator_payload),
+                ('/generate-interview-questions', generator_payload),
+                ('/analyze-skills-gap', generator_payload),
+            ]
+        for path, payload in tasks:
+            self.run_task(path, path, payload)
+        self.call('GET /result/<id>', 'GET', f"/result/{session_id}", expect_json=False)
+
+    def run(self):
+        if not self.setup():
+            return
+        for iteration in range(self.args.iterations):
+            self.journey(iteration)
+
+
+def start_mocks(args):
+    """Uruchamia mock OpenRouter i Stripe w wątkach tego procesu"""
+    llm_args = mock_openrouter.parse_args(['--profile', args.llm_profile])
+    llm_server = mock_openrouter.create_server(config=mock_openrouter.build_config(llm_args))
+    stripe_server = mock_stripe.create_server()
+    for server in (llm_server, stripe_server):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return llm_server, stripe_server
+
+
+def spawn_app(args, llm_server, stripe_server, workdir):
+    """Uruchamia aplikację (gunicorn) na tymczasowej bazie z mockami"""
+    port = args.port
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        'CV_OPTIMIZER_STATE_DIR': os.path.join(workdir, 'state'),
+        'OPENROUTER_BASE_URL': f"http://127.0.0.1:{llm_server.server_address[1]}/api/v1/chat/completions",
+        'OPENROUTER_API_KEY': 'sk-or-v1-mock-key-for-load-tests',
+        'STRIPE_API_BASE': f"http://127.0.0.1:{stripe_server.server_address[1]}",
+        'STRIPE_SECRET_KEY': 'sk_test_mock',
+        'SQL_QUERY_COUNT_HEADER': '1',
+        'LLM_CACHE_ENABLED': '1' if args.llm_cache else '0',
+        'PYTHONUNBUFFERED': '1',
+    })
+    if not args.rate_limit:
+        env['OPENROUTER_REQUESTS_PER_MINUTE'] = '0'
+        env['OPENROUTER_TOKENS_PER_MINUTE'] = '0'
+
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}",
+               '--workers', str(args.app_workers), '--threads', str(args.app_threads),
+               '--timeout', '120', 'main:app']
+    if shutil.which('gunicorn') is None:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            print("⚠️ Brak gunicorn - uruchamiam serwer deweloperski Flask (python main.py)")
+            env['PORT'] = str(port)
+            command = [sys.executable, 'main.py']
+
+    log = open(os.path.join(workdir, 'app.log'), 'w')
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Aplikacja zakończyła się (kod {process.returncode}) - zobacz {log.name}")
+        try:
+            if requests.get(base_url + '/health', timeout=1).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Aplikacja nie odpowiada na /health - zobacz {log.name}")
+
+
+def build_report(recorder, duration, args):
+    routes = {}
+    total_requests = 0
+    for route, samples in sorted(recorder.samples.items()):
+        latencies = [s[0] for s in samples]
+        errors = [s for s in samples if not s[1]]
+        queries = [s[2] for s in samples if s[2] is not None]
+        error_messages = {}
+        for sample in errors:
+            error_messages[sample[3]] = error_messages.get(sample[3], 0) + 1
+        if not route.endswith('[zadanie]'):
+            total_requests += len(samples)
+        routes[route] = {
+            'count': len(samples),
+            'errors': len(errors),
+            'error_rate': len(errors) / len(samples),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'mean_queries': sum(queries) / len(queries) if queries else None,
+            'top_errors': sorted(error_messages.items(), key=lambda item: -item[1])[:3],
+        }
+    journeys = routes.get('POST /upload-cv', {}).get('count', 0)
+    return {
+        'config': {'users': args.users, 'iterations': args.iterations,
+                   'llm_profile': args.llm_profile, 'app_workers': args.app_workers,
+                   'app_threads': args.app_threads},
+        'duration': duration,
+        'requests': total_requests,
+        'throughput_rps': total_requests / duration if duration else 0,
+        'journeys_per_minute': journeys / duration * 60 if duration else 0,
+        'routes': routes,
+    }
+
+
+def _fmt(value, scale=1000, digits=0):
+    return '-' if value is None else f"{value * scale:.{digits}f}"
+
+
+def print_report(report, baseline=None):
+    print()
+    print(f"Czas: {report['duration']:.1f} s | zapytania: {report['requests']} | "
+          f"{report['throughput_rps']:.2f} req/s | {report['journeys_per_minute']:.1f} ścieżek/min")
+    header = f"{'trasa':<44} {'n':>5} {'błędy':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL':>6}"
+    if baseline:
+        header += f" {'Δp95':>8}"
+    print(header)
+    print('-' * len(header))
+    for route, stats in report['routes'].items():
+        line = (f"{route:<44} {stats['count']:>5} {stats['error_rate'] * 100:>6.1f}% "
+                f"{_fmt(stats['p50']):>8} {_fmt(stats['p95']):>8} {_fmt(stats['p99']):>8} "
+                f"{_fmt(stats['mean_queries'], 1, 1):>6}")
+        if baseline:
+            previous = baseline.get('routes', {}).get(route, {}).get('p95')
+            if previous and stats['p95'] is not None:
+                line += f" {(stats['p95'] - previous) / previous * 100:>+7.1f}%"
+            else:
+                line += f" {'-':>8}"
+        print(line)
+        for message, count in stats['top_errors']:
+            print(f"    ! {count}x {message}")
+    if baseline:
+        previous = baseline.get('throughput_rps')
+        if previous:
+            change = (report['throughput_rps'] - previous) / previous * 100
+            print(f"\nPrzepustowość względem bazowej: {change:+.1f}%")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążeniowy ścieżki upload -> optymalizacja -> artefakty")
+    parser.add_argument('--target', help="Adres działającej aplikacji (bez --spawn)")
+    parser.add_argument('--spawn', action='store_true', help="Uruchom aplikację i mocki lokalnie")
+    parser.add_argument('--users', type=int, default=5, help="Liczba równoległych użytkowników")
+    parser.add_argument('--iterations', type=int, default=2, help="Ścieżek na użytkownika")
+    parser.add_argument('--llm-profile', default='fast', choices=sorted(mock_openrouter.PROFILES))
+    parser.add_argument('--llm-cache', action='store_true', help="Nie wyłączaj cache odpowiedzi LLM")
+    parser.add_argument('--rate-limit', action='store_true', help="Nie wyłączaj limitera zapytań OpenRouter")
+    parser.add_argument('--skip-payment', action='store_true', help="Bez zakupu pakietu (tylko darmowe trasy)")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--app-workers', type=int, default=2)
+    parser.add_argument('--app-threads', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=60, help="Timeout pojedynczego zapytania HTTP (s)")
+    parser.add_argument('--job-timeout', type=float, default=180, help="Maksymalny czas zadania LLM (s)")
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="Zapisz raport do pliku JSON")
+    parser.add_argument('--baseline', help="Porównaj z raportem JSON z poprzedniego przebiegu")
+    parser.add_argument('--keep', action='store_true', help="Nie usuwaj katalogu roboczego (baza, logi)")
+    args = parser.parse_args(argv)
+    if not args.spawn and not args.target:
+        parser.error("podaj --target albo --spawn")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+
+    process = None
+    workdir = tempfile.mkdtemp(prefix='cv-loadtest-')
+    try:
+        if args.spawn:
+            llm_server, stripe_server = start_mocks(args)
+            process, base_url = spawn_app(args, llm_server, stripe_server, workdir)
+            print(f"🚀 Aplikacja: {base_url} (katalog roboczy: {workdir})")
+        else:
+            base_url = args.target
+
+        recorder = Recorder()
+        run_id = uuid.uuid4().hex[:8]
+        users = [VirtualUser(base_url, i, run_id, recorder, args) for i in range(args.users)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            for future in [executor.submit(user.run) for user in users]:
+                future.result()
+        duration = time.perf_counter() - started
+
+        report = build_report(recorder, duration, args)
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        print_report(report, baseline)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"\n📄 Raport zapisany: {args.json}")
+        failed = any(stats['errors'] for stats in report['routes'].values())
+        return 1 if failed else 0
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"Katalog roboczy: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
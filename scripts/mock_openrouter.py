@@ -0,0 +1,328 @@
+"""
+Lokalny zamiennik OpenRouter do testów obciążeniowych
+
+Obsługuje protokół /chat/completions (zwykły i strumieniowy SSE) z
+konfigurowalnym rozkładem opóźnień, tempem generowania tokenów,
+wstrzykiwaniem błędów 429/5xx i gotowymi odpowiedziami po polsku.
+
+Uruchomienie:
+    python scripts/mock_openrouter.py --profile realistic --port 8089
+    OPENROUTER_BASE_URL=http://127.0.0.1:8089/api/v1/chat/completions \\
+        OPENROUTER_API_KEY=sk-or-v1-mock-key-for-load-tests python main.py
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("mock_openrouter")
+
+# Profile: mediana i p95 czasu do pierwszego tokenu (s), tokeny/s,
+# odsetek odpowiedzi 429 i 5xx
+PROFILES = {
+    'fast': dict(ttfb_median=0.05, ttfb_p95=0.2, tokens_per_second=2000,
+                 rate_429=0.0, rate_5xx=0.0),
+    'realistic': dict(ttfb_median=1.5, ttfb_p95=6.0, tokens_per_second=40,
+                      rate_429=0.02, rate_5xx=0.01),
+    'degraded': dict(ttfb_median=4.0, ttfb_p95=20.0, tokens_per_second=15,
+                     rate_429=0.05, rate_5xx=0.05),
+    'overloaded': dict(ttfb_median=8.0, ttfb_p95=40.0, tokens_per_second=8,
+                       rate_429=0.3, rate_5xx=0.1),
+}
+
+# Gotowe odpowiedzi - dobierane po słowach kluczowych z promptu
+CANNED_RESPONSES = [
+    ('Zoptymalizuj', """JAN KOWALSKI
+Senior Python Developer | jan.kowalski@example.com | +48 600 000 000
+
+PODSUMOWANIE ZAWODOWE
+Doświadczony programista Python z 8-letnim stażem w budowie skalowalnych
+aplikacji webowych (Flask, Django, PostgreSQL). Specjalizacja: optymalizacja
+wydajności, architektura mikroserwisów, automatyzacja CI/CD.
+
+DOŚWIADCZENIE ZAWODOWE
+Senior Python Developer - TechCorp Sp. z o.o., Warszawa (2020 - obecnie)
+- Skrócenie czasu odpowiedzi API o 45% dzięki cache i profilowaniu zapytań SQL
+- Prowadzenie zespołu 4 programistów, code review i mentoring
+- Migracja monolitu do mikroserwisów w Kubernetes
+
+UMIEJĘTNOŚCI
+Python, Flask, Django, PostgreSQL, Redis, Docker, Kubernetes, AWS, Git
+
+WYKSZTAŁCENIE
+Politechnika Warszawska - Informatyka, magister inżynier (2016)"""),
+    ('Przeanalizuj', """OCENA: 72/100
+
+MOCNE STRONY:
+- Konkretne osiągnięcia poparte liczbami
+- Czytelna struktura i chronologia doświadczenia
+- Umiejętności techniczne dopasowane do stanowiska
+
+OBSZARY DO POPRAWY:
+- Brak podsumowania zawodowego na początku CV
+- Zbyt ogólne opisy obowiązków w starszych stanowiskach
+- Brak słów kluczowych z ogłoszenia (np. "mikroserwisy", "CI/CD")
+
+REKOMENDACJE:
+- Dodaj 3-4 zdaniowe podsumowanie dopasowane do oferty
+- Zamień opisy obowiązków na mierzalne rezultaty
+- Uzupełnij sekcję umiejętności o technologie z opisu stanowiska"""),
+    ('list motywacyjny', """Szanowni Państwo,
+
+z dużym zainteresowaniem odpowiadam na ogłoszenie dotyczące stanowiska
+Senior Python Developer. Od ośmiu lat tworzę skalowalne aplikacje webowe,
+a w obecnej firmie skróciłem czas odpowiedzi kluczowego API o 45%.
+
+Cenię Państwa podejście do jakości kodu i rozwoju zespołu - chętnie wniosę
+doświadczenie w architekturze mikroserwisów i mentoringu programistów.
+
+Będę wdzięczny za możliwość rozmowy.
+
+Z wyrazami szacunku,
+Jan Kowalski"""),
+    ('pytania', """PYTANIA TECHNICZNE:
+1. Jak zoptymalizowałbyś wolne zapytanie SQL w aplikacji Flask?
+2. Opisz różnice między wątkami a procesami w Pythonie w kontekście GIL.
+3. Jak projektujesz API odporne na błędy usług zewnętrznych?
+
+PYTANIA BEHAWIORALNE:
+1. Opowiedz o sytuacji, w której musiałeś szybko naprawić awarię produkcyjną.
+2. Jak radzisz sobie z odmiennym zdaniem w code review?
+
+PYTANIA O MOTYWACJĘ:
+1. Dlaczego chcesz dołączyć do naszego zespołu?"""),
+    ('luk kompetencyjnych', """ANALIZA LUK KOMPETENCYJNYCH
+
+POSIADANE KOMPETENCJE:
+- Python, Flask, PostgreSQL - poziom zaawansowany
+- Docker - poziom średniozaawansowany
+
+BRAKUJĄCE KOMPETENCJE:
+- Kubernetes (wymagany w ofercie) - priorytet wysoki
+- Terraform / Infrastructure as Code - priorytet średni
+
+PLAN ROZWOJU:
+1. Certyfikat CKAD w ciągu 3 miesięcy
+2. Projekt własny z Terraform na AWS
+3. Kurs z monitoringu (Prometheus, Grafana)"""),
+]
+DEFAULT_RESPONSE = "To jest przykładowa odpowiedź lokalnego serwera testowego OpenRouter."
+
+CHARS_PER_TOKEN = 3
+
+
+class MockConfig:
+
+    def __init__(self, ttfb_median, ttfb_p95, tokens_per_second, rate_429,
+                 rate_5xx, retry_after=2, max_tokens_cap=None):
+        self.ttfb_median = ttfb_median
+        self.ttfb_p95 = ttfb_p95
+        self.tokens_per_second = tokens_per_second
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.max_tokens_cap = max_tokens_cap
+        self.stats = {'requests': 0, '429': 0, '5xx': 0, 'ok': 0}
+        self.lock = threading.Lock()
+
+    def sample_ttfb(self):
+        """Czas do pierwszego tokenu z rozkładu log-normalnego (mediana, p95)"""
+        if self.ttfb_median <= 0:
+            return 0.0
+        sigma = max(math.log(max(self.ttfb_p95, self.ttfb_median) / self.ttfb_median) / 1.645, 1e-6)
+        return random.lognormvariate(math.log(self.ttfb_median), sigma)
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
+def pick_response(prompt):
+    for keyword, response in CANNED_RESPONSES:
+        if keyword.lower() in prompt.lower():
+            return response
+    return DEFAULT_RESPONSE
+
+
+def estimate_tokens(text):
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def make_handler(config):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _send_json(self, status, body, headers=None):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path.rstrip('/') in ('/health', '/stats'):
+                with config.lock:
+                    stats = dict(config.stats)
+                return self._send_json(200, {'status': 'ok', 'stats': stats})
+            self._send_json(404, {'error': {'message': 'Not found', 'code': 404}})
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                return self._send_json(404, {'error': {'message': 'Not found', 'code': 404}})
+
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError:
+                return self._send_json(400, {'error': {'message': 'Invalid JSON', 'code': 400}})
+
+            config.count('requests')
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self._send_json(401, {'error': {'message': 'No auth credentials found', 'code': 401}})
+
+            roll = random.random()
+            if roll < config.rate_429:
+                config.count('429')
+                return self._send_json(
+                    429, {'error': {'message': 'Rate limit exceeded: free-models-per-min', 'code': 429}},
+                    headers={'Retry-After': str(config.retry_after)})
+            if roll < config.rate_429 + config.rate_5xx:
+                config.count('5xx')
+                time.sleep(config.sample_ttfb())
+                return self._send_json(random.choice([500, 502, 503]),
+                                       {'error': {'message': 'Provider returned error', 'code': 502}})
+
+            messages = body.get('messages') or []
+            prompt = '\n'.join(str(m.get('content', '')) for m in messages)
+            content = pick_response(prompt)
+            max_tokens = body.get('max_tokens') or config.max_tokens_cap
+            if max_tokens:
+                content = content[:int(max_tokens) * CHARS_PER_TOKEN]
+            usage = {
+                'prompt_tokens': estimate_tokens(prompt),
+                'completion_tokens': estimate_tokens(content)
+            }
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+            model = body.get('model', 'mock/model')
+
+            time.sleep(config.sample_ttfb())
+            config.count('ok')
+            if body.get('stream'):
+                return self._stream(content, model, usage)
+
+            if config.tokens_per_second > 0:
+                time.sleep(usage['completion_tokens'] / config.tokens_per_second)
+            self._send_json(200, {
+                'id': f"gen-mock-{random.getrandbits(48):x}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            })
+
+        def _stream(self, content, model, usage):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+
+            def event(data):
+                self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            try:
+                # OpenRouter wysyła komentarze keep-alive przed pierwszym tokenem
+                self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+                words = content.split(' ')
+                for index, word in enumerate(words):
+                    piece = word if index == 0 else ' ' + word
+                    event({'model': model, 'choices': [{'index': 0, 'delta': {'content': piece}}]})
+                    if config.tokens_per_second > 0:
+                        time.sleep(estimate_tokens(piece) / config.tokens_per_second)
+                event({'model': model,
+                       'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+                       'usage': usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug("Klient zamknął strumień")
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalny serwer testowy OpenRouter /chat/completions")
+    parser.add_argument('--host', default=os.environ.get('MOCK_OPENROUTER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('MOCK_OPENROUTER_PORT', 8089)))
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=os.environ.get('MOCK_OPENROUTER_PROFILE', 'realistic'))
+    parser.add_argument('--ttfb-median', type=float, help="Mediana czasu do pierwszego tokenu (s)")
+    parser.add_argument('--ttfb-p95', type=float, help="p95 czasu do pierwszego tokenu (s)")
+    parser.add_argument('--tokens-per-second', type=float, help="Tempo generowania (0 = natychmiast)")
+    parser.add_argument('--rate-429', type=float, help="Odsetek odpowiedzi 429 (0-1)")
+    parser.add_argument('--rate-5xx', type=float, help="Odsetek odpowiedzi 5xx (0-1)")
+    parser.add_argument('--retry-after', type=float, default=2, help="Nagłówek Retry-After przy 429 (s)")
+    parser.add_argument('--seed', type=int, help="Ziarno losowania (powtarzalne przebiegi)")
+    return parser.parse_args(argv)
+
+
+def build_config(args):
+    settings = dict(PROFILES[args.profile])
+    for name in ('ttfb_median', 'ttfb_p95', 'tokens_per_second', 'rate_429', 'rate_5xx'):
+        value = getattr(args, name)
+        if value is not None:
+            settings[name] = value
+    return MockConfig(retry_after=args.retry_after, **settings)
+
+
+def create_server(host='127.0.0.1', port=0, config=None):
+    """Tworzy serwer (port 0 = losowy wolny port) - przydatne w skryptach testowych"""
+    config = config or MockConfig(**PROFILES['fast'])
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    return server
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    config = build_config(args)
+    server = create_server(args.host, args.port, config)
+    host, port = server.server_address[:2]
+    logger.info(f"🧪 Mock OpenRouter ({args.profile}) na http://{host}:{port}/api/v1/chat/completions")
+    logger.info(f"   OPENROUTER_BASE_URL=http://{host}:{port}/api/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Statystyki: {config.stats}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
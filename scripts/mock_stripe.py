@@ -0,0 +1,192 @@
+"""
+Lokalny zamiennik API Stripe do testów obciążeniowych
+
+Obsługuje tylko wywołania używane przez app.py: tworzenie klienta, sesji
+checkout (od razu opłaconej) i odczyt sesji oraz subskrypcji.
+
+Uruchomienie:
+    python scripts/mock_stripe.py --port 12111
+    STRIPE_API_BASE=http://127.0.0.1:12111 STRIPE_SECRET_KEY=sk_test_mock python main.py
+"""
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+from urllib.parse import parse_qsl, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("mock_stripe")
+
+SUBSCRIPTION_PERIOD = 30 * 24 * 3600
+
+
+def _new_id(prefix):
+    return f"{prefix}_mock_{uuid.uuid4().hex[:16]}"
+
+
+def parse_form(body):
+    """Zamienia form-encoding Stripe (metadata[user_id]=1) na zagnieżdżony słownik"""
+    result = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = key.replace(']', '').split('[')
+        target = result
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return result
+
+
+class StripeState:
+
+    def __init__(self):
+        self.customers = {}
+        self.sessions = {}
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def create_customer(self, params):
+        customer = {
+            'id': _new_id('cus'),
+            'object': 'customer',
+            'email': params.get('email'),
+            'name': params.get('name'),
+            'metadata': params.get('metadata', {})
+        }
+        with self.lock:
+            self.customers[customer['id']] = customer
+        return customer
+
+    def create_checkout_session(self, params, base_url):
+        line_item = params.get('line_items', {}).get('0', {})
+        price_data = line_item.get('price_data', {})
+        amount = int(price_data.get('unit_amount', 0)) * int(line_item.get('quantity', 1))
+        currency = price_data.get('currency', 'pln')
+        session_id = _new_id('cs_test')
+        session = {
+            'id': session_id,
+            'object': 'checkout.session',
+            'mode': params.get('mode', 'payment'),
+            'customer': params.get('customer'),
+            'metadata': params.get('metadata', {}),
+            'amount_total': amount,
+            'currency': currency,
+            # Sesja jest od razu opłacona - test nie przechodzi przez formularz płatności
+            'payment_status': 'paid',
+            'status': 'complete',
+            'payment_intent': _new_id('pi'),
+            'subscription': None,
+            'url': f"{base_url}/checkout/{session_id}",
+            'success_url': params.get('success_url'),
+        }
+        if session['mode'] == 'subscription':
+            now = int(time.time())
+            subscription = {
+                'id': _new_id('sub'),
+                'object': 'subscription',
+                'customer': params.get('customer'),
+                'status': 'active',
+                'current_period_start': now,
+                'current_period_end': now + SUBSCRIPTION_PERIOD,
+                'items': {
+                    'object': 'list',
+                    'data': [{
+                        'object': 'subscription_item',
+                        'price': {'object': 'price', 'unit_amount': int(price_data.get('unit_amount', 0)),
+                                  'currency': currency}
+                    }]
+                }
+            }
+            session['subscription'] = subscription['id']
+            session['payment_intent'] = None
+            with self.lock:
+                self.subscriptions[subscription['id']] = subscription
+        with self.lock:
+            self.sessions[session_id] = session
+        return session
+
+
+def make_handler(state):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Request-Id', _new_id('req'))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _not_found(self):
+            self._send_json(404, {'error': {'type': 'invalid_request_error',
+                                            'message': f"No such resource: {self.path}"}})
+
+        def _base_url(self):
+            host, port = self.server.server_address[:2]
+            return f"http://{host}:{port}"
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            params = parse_form(self.rfile.read(length).decode('utf-8'))
+            path = urlparse(self.path).path.rstrip('/')
+            if path == '/v1/customers':
+                return self._send_json(200, state.create_customer(params))
+            if path == '/v1/checkout/sessions':
+                return self._send_json(200, state.create_checkout_session(params, self._base_url()))
+            self._not_found()
+
+        def do_GET(self):
+            path = urlparse(self.path).path.rstrip('/')
+            collections = {
+                '/v1/checkout/sessions/': state.sessions,
+                '/v1/subscriptions/': state.subscriptions,
+                '/v1/customers/': state.customers,
+            }
+            for prefix, items in collections.items():
+                if path.startswith(prefix):
+                    with state.lock:
+                        item = items.get(path[len(prefix):])
+                    return self._send_json(200, item) if item else self._not_found()
+            if path == '/health':
+                return self._send_json(200, {'status': 'ok'})
+            self._not_found()
+
+    return Handler
+
+
+def create_server(host='127.0.0.1', port=0):
+    """Tworzy serwer (port 0 = losowy wolny port)"""
+    server = ThreadingHTTPServer((host, port), make_handler(StripeState()))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    parser = argparse.ArgumentParser(description="Lokalny serwer testowy API Stripe")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port)
+    host, port = server.server_address[:2]
+    logger.info(f"🧪 Mock Stripe na http://{host}:{port} (STRIPE_API_BASE=http://{host}:{port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
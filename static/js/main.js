@@ -79,10 +79,79 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Zadania AI są wykonywane w tle - odpytuj /jobs/<id> aż do zakończenia
+function waitForJob(data, onProgress = null, interval = 1500, timeout = 5 * 60 * 1000) {
+    if (!data || !data.job_id) {
+        return Promise.resolve(data);
+    }
+
+    const startedAt = Date.now();
+    return new Promise((resolve, reject) => {
+        function poll() {
+            fetch(`/jobs/${data.job_id}`)
+                .then(response => response.json())
+                .then(job => {
+                    if (onProgress) {
+                        onProgress(job);
+                    }
+                    if (job.status === 'completed' || job.status === 'failed') {
+                        resolve(job.result || {success: false, message: job.message});
+                    } else if (!job.success) {
+                        resolve(job);
+                    } else if (Date.now() - startedAt > timeout) {
+                        resolve({success: false, message: 'Zapytanie trwa zbyt długo - spróbuj ponownie.'});
+                    } else {
+                        setTimeout(poll, interval);
+                    }
+                })
+                .catch(reject);
+        }
+        setTimeout(poll, interval);
+    });
+}
+
+// Strumieniowanie odpowiedzi AI (Server-Sent Events) - onDelta dostaje kolejne fragmenty tekstu.
+// POST rezerwuje strumień (i kredyt), EventSource tylko odbiera go jednorazowym adresem
+function streamTask(url, payload, onDelta) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(payload)
+    })
+    .then(response => response.json())
+    .then(data => data.success ? receiveStream(data.stream_url, onDelta) : data);
+}
+
+function receiveStream(url, onDelta) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(url);
+
+        source.addEventListener('delta', event => {
+            onDelta(JSON.parse(event.data).text);
+        });
+        source.addEventListener('done', event => {
+            source.close();
+            resolve(JSON.parse(event.data));
+        });
+        source.addEventListener('error', event => {
+            source.close();
+            if (event.data) {
+                resolve(JSON.parse(event.data));
+            } else {
+                reject(new Error('Przerwano połączenie z serwerem'));
+            }
+        });
+    });
+}
+
 // Global CVOptimizer object for compatibility
 window.CVOptimizer = {
     showToast: showToast,
-    validateForm: validateForm
+    validateForm: validateForm,
+    waitForJob: waitForJob,
+    streamTask: streamTask
 };
 
 // Funkcja obsługi przekierowań do cennika
@@ -107,6 +176,7 @@ function optimizeCV(sessionId) {
             })
         })
         .then(response => response.json())
+        .then(data => waitForJob(data))
         .then(data => {
             if (data.success) {
                 showAlert(data.message, 'success');
@@ -142,6 +212,7 @@ function analyzeCV(sessionId) {
             })
         })
         .then(response => response.json())
+        .then(data => waitForJob(data))
         .then(data => {
             if (data.success) {
                 showAlert(data.message, 'success');
@@ -0,0 +1,83 @@
+"""Kolejka zadań LLM: zadanie odłożone przez limit zapytań czeka na retry_after"""
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Osobna baza i katalog stanu - ustawione przed importem app.py
+_state_dir = tempfile.mkdtemp(prefix='cv-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_state_dir, 'test.db')}"
+os.environ['CV_OPTIMIZER_STATE_DIR'] = _state_dir
+os.environ['LLM_JOB_EMBEDDED_WORKERS'] = '0'
+os.environ['DB_AUTO_MIGRATE'] = '1'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as cv_app  # noqa: E402
+from app import CVUpload, LLMJob, User, app, claim_llm_job, db, run_llm_job  # noqa: E402
+from utils.rate_limiter import RateLimitExceeded  # noqa: E402
+
+
+def rate_limited(job, cv_upload, user, params):
+    raise RateLimitExceeded(60)
+
+
+class RateLimitedJobTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = app.app_context()
+        self.context.push()
+        user = User(username='queue', email='queue@example.com', first_name='Kolejka',
+                    last_name='Test', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        cv_upload = CVUpload(user_id=user.id, session_id='queue', filename='cv.pdf',
+                             original_text='tekst', job_title='stanowisko')
+        db.session.add(cv_upload)
+        db.session.flush()
+        self.job = LLMJob(id='rate-limited', user_id=user.id, cv_upload_id=cv_upload.id,
+                          task_type='analyze_cv', status='queued', params='{}')
+        db.session.add(self.job)
+        db.session.commit()
+        handler = cv_app.LLM_JOB_HANDLERS['analyze_cv']
+        self.handlers = mock.patch.dict(cv_app.LLM_JOB_HANDLERS,
+                                        {'analyze_cv': (rate_limited, ) + handler[1:]})
+        self.handlers.start()
+
+    def tearDown(self):
+        self.handlers.stop()
+        db.session.rollback()
+        for model in (LLMJob, CVUpload, User):
+            model.query.delete()
+        db.session.commit()
+        self.context.pop()
+
+    def test_not_reclaimed_before_retry_after(self):
+        self.assertEqual(claim_llm_job('test'), 'rate-limited')
+        self.assertEqual(run_llm_job('rate-limited'), 60)
+
+        job = db.session.get(LLMJob, 'rate-limited')
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.attempts, 0)
+        self.assertGreater(job.available_at, datetime.utcnow() + timedelta(seconds=55))
+        self.assertIsNone(claim_llm_job('test'))
+
+        # Po upływie retry_after zadanie wraca do workerów
+        job.available_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        self.assertEqual(claim_llm_job('test'), 'rate-limited')
+
+    def test_fails_after_retry_budget(self):
+        self.job.created_at = datetime.utcnow() - timedelta(seconds=cv_app.LLM_JOB_RETRY_BUDGET)
+        db.session.commit()
+
+        self.assertEqual(claim_llm_job('test'), 'rate-limited')
+        self.assertIsNone(run_llm_job('rate-limited'))
+        job = db.session.get(LLMJob, 'rate-limited')
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Limit zapytań', job.get_result()['message'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import re
+import logging
+import unicodedata
+
+from utils.prompt_budget import is_heading
+
+logger = logging.getLogger(__name__)
+
+# Kolejność sekcji w CV złożonym z wybranych części
+SECTION_KEYS = ('contact', 'summary', 'experience', 'education', 'skills',
+                'languages', 'certificates', 'other')
+
+SECTION_LABELS = {
+    'contact': 'Dane kontaktowe',
+    'summary': 'Podsumowanie',
+    'experience': 'Doświadczenie zawodowe',
+    'education': 'Wykształcenie',
+    'skills': 'Umiejętności',
+    'languages': 'Języki',
+    'certificates': 'Certyfikaty i szkolenia',
+    'other': 'Inne',
+}
+
+# Nagłówki sekcji w polskich i angielskich CV (po normalizacji: małe litery, bez dwukropka)
+SECTION_HEADINGS = {
+    'contact': ('dane kontaktowe', 'kontakt', 'dane osobowe', 'informacje osobiste',
+                'contact', 'contact information', 'contact details', 'personal information',
+                'personal details', 'personal data'),
+    'summary': ('podsumowanie', 'podsumowanie zawodowe', 'profil', 'profil zawodowy', 'o mnie',
+                'cel zawodowy', 'summary', 'professional summary', 'profile',
+                'professional profile', 'about me', 'objective', 'career objective'),
+    'experience': ('doświadczenie', 'doświadczenie zawodowe', 'historia zatrudnienia',
+                   'przebieg pracy zawodowej', 'przebieg kariery', 'experience',
+                   'work experience', 'professional experience', 'employment history',
+                   'employment', 'career history'),
+    'education': ('wykształcenie', 'edukacja', 'wykształcenie i kursy', 'education',
+                  'academic background', 'education and training'),
+    'skills': ('umiejętności', 'umiejętności techniczne', 'umiejętności twarde',
+               'umiejętności miękkie', 'kompetencje', 'kompetencje kluczowe', 'technologie',
+               'skills', 'technical skills', 'key skills', 'hard skills', 'soft skills',
+               'core competencies', 'competencies', 'tech stack'),
+    'languages': ('języki', 'języki obce', 'znajomość języków', 'znajomość języków obcych',
+                  'languages', 'language skills', 'foreign languages'),
+    'certificates': ('certyfikaty', 'certyfikaty i szkolenia', 'szkolenia', 'kursy',
+                     'kursy i szkolenia', 'szkolenia i kursy', 'uprawnienia', 'certyfikaty i kursy',
+                     'certifications', 'certificates', 'licenses', 'licenses and certifications',
+                     'courses', 'training', 'trainings'),
+    # Sekcje bez osobnego klucza - rozpoznawane, żeby nie doklejały się do poprzedniej
+    'other': ('projekty', 'zainteresowania', 'hobby', 'pasje', 'referencje', 'osiągnięcia',
+              'publikacje', 'wolontariat', 'informacje dodatkowe', 'projects', 'interests',
+              'hobbies', 'references', 'achievements', 'publications', 'volunteering',
+              'additional information'),
+}
+
+
+def _fold(text):
+    # Bez polskich znaków - ekstrakcja PDF często je gubi ("DOSWIADCZENIE")
+    text = text.replace('ł', 'l').replace('Ł', 'L')
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+_HEADING_LOOKUP = {_fold(heading): key for key, headings in SECTION_HEADINGS.items() for heading in headings}
+
+# Sekcje potrzebne poszczególnym zadaniom (None = całe CV, np. przy przepisywaniu)
+TASK_SECTIONS = {
+    'optimize_cv': None,
+    'analyze_cv': None,
+    'cover_letter': ('contact', 'summary', 'experience', 'skills', 'languages'),
+    'interview_questions': ('summary', 'experience', 'skills', 'certificates'),
+    'skills_gap': ('summary', 'experience', 'education', 'skills', 'languages', 'certificates'),
+}
+
+# Ile rozpoznanych nagłówków musi mieć CV, żeby ufać podziałowi
+MIN_RECOGNIZED_SECTIONS = 2
+
+
+def _normalize_heading(line):
+    line = re.sub(r"^[\s\-•*▪■●·\d.)]+", "", line.strip())
+    line = _fold(line.rstrip(':').strip().lower())
+    return re.sub(r"\s+", " ", line)
+
+
+def classify_heading(line):
+    """
+    Rozpoznaje nagłówek sekcji CV
+
+    Args:
+        line (str): Linia tekstu CV
+
+    Returns:
+        str: Klucz sekcji (także 'other') albo None, jeśli linia nie jest
+            znanym nagłówkiem
+    """
+    normalized = _normalize_heading(line)
+    if not normalized or len(normalized) > 45:
+        return None
+    if normalized in _HEADING_LOOKUP:
+        return _HEADING_LOOKUP[normalized]
+    if not is_heading(line):
+        return None
+    # "DOŚWIADCZENIE ZAWODOWE I PROJEKTY", "Skills & tools:" - początek znanego nagłówka
+    for heading, key in sorted(_HEADING_LOOKUP.items(), key=lambda item: -len(item[0])):
+        if normalized.startswith(heading + ' '):
+            return key
+    return None
+
+
+def segment_cv(text):
+    """
+    Dzieli oczyszczony tekst CV na sekcje
+
+    Tekst przed pierwszym nagłówkiem (imię, stanowisko, e-mail, telefon)
+    trafia do 'contact'. Sekcje bez osobnego klucza (projekty,
+    zainteresowania...) trafiają razem z nagłówkiem do 'other'.
+
+    Args:
+        text (str): Tekst CV
+
+    Returns:
+        dict: Klucz sekcji -> treść bez linii nagłówka; pusty słownik, jeśli
+            w CV nie rozpoznano co najmniej MIN_RECOGNIZED_SECTIONS nagłówków
+    """
+    if not text:
+        return {}
+
+    parts = {}
+    recognized = set()
+    current = 'contact'
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        key = classify_heading(line)
+        if key:
+            current = key
+            if key == 'other':
+                # Nagłówek zostaje w treści, żeby było wiadomo, czego dotyczy
+                parts.setdefault(key, []).append(line)
+            else:
+                recognized.add(key)
+            continue
+        parts.setdefault(current, []).append(line)
+
+    if len(recognized) < MIN_RECOGNIZED_SECTIONS:
+        return {}
+    return {key: '\n'.join(parts[key]) for key in SECTION_KEYS if parts.get(key)}
+
+
+def text_for_task(task_type, sections, full_text):
+    """
+    Składa tekst CV tylko z sekcji potrzebnych zadaniu
+
+    Args:
+        task_type (str): Typ zadania (klucz TASK_SECTIONS)
+        sections (dict): Wynik segment_cv()
+        full_text (str): Pełny tekst CV (gdy zadanie potrzebuje całości
+            albo podział się nie udał)
+
+    Returns:
+        str: Tekst CV dla promptu
+    """
+    wanted = TASK_SECTIONS.get(task_type)
+    if not wanted or not sections:
+        return full_text
+
+    selected = [(key, sections[key]) for key in SECTION_KEYS if key in wanted and sections.get(key)]
+    if not any(key in ('experience', 'skills') for key, _ in selected):
+        # Bez doświadczenia i umiejętności wynik byłby bezwartościowy - wysyłamy całe CV
+        return full_text
+
+    text = '\n\n'.join(f"{SECTION_LABELS[key].upper()}:\n{body}" for key, body in selected)
+    if len(text) >= len(full_text):
+        # Krótkie CV - etykiety sekcji nic nie oszczędzają
+        return full_text
+    logger.debug(f"Sekcje CV dla {task_type}: {', '.join(key for key, _ in selected)} "
+                 f"({len(text)}/{len(full_text)} znaków)")
+    return text
@@ -0,0 +1,137 @@
+import os
+import time
+import sqlite3
+import logging
+
+from utils.sqlite_store import get_connection, state_path
+
+logger = logging.getLogger(__name__)
+
+# Konfiguracja cache uprawnień użytkowników (subskrypcja, kredyty jednorazowe)
+ENTITLEMENT_CACHE_ENABLED = os.environ.get("ENTITLEMENT_CACHE_ENABLED", "1") != "0"
+# Krótki TTL - zabezpieczenie na zmiany z pominięciem invalidate() (np. ręczna edycja bazy)
+ENTITLEMENT_CACHE_TTL = int(os.environ.get("ENTITLEMENT_CACHE_TTL", 60))  # sekundy
+ENTITLEMENT_CACHE_PATH = os.environ.get("ENTITLEMENT_CACHE_PATH")
+# Wiersze po unieważnieniu trzymamy tak długo, żeby spóźniony odczyt nie nadpisał ich starym stanem
+ENTITLEMENT_CACHE_RETENTION = 3600
+
+
+class EntitlementCache:
+    """
+    Cache uprawnień współdzielony przez wszystkie workery (plik SQLite)
+
+    Bez poziomu w pamięci procesu - unieważnienie z webhooka Stripe musi być
+    widoczne od razu w każdym workerze. Każdy wiersz ma numer generacji:
+    invalidate() go zwiększa, a set() zapisuje tylko, jeśli generacja się nie
+    zmieniła od odczytu - stan wczytany z bazy przed webhookiem nie trafi do
+    cache po nim.
+    """
+
+    def __init__(self, path=None, ttl=ENTITLEMENT_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._schema_ready = False
+
+    def _connection(self):
+        if self.path is None:
+            self.path = ENTITLEMENT_CACHE_PATH or state_path("entitlement_cache.db")
+        conn = get_connection(self.path)
+        if not self._schema_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entitlement_cache (
+                    user_id INTEGER PRIMARY KEY,
+                    value TEXT,
+                    expires_at REAL NOT NULL,
+                    generation INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entitlement_cache_expires_at "
+                         "ON entitlement_cache (expires_at)")
+            self._schema_ready = True
+        return conn
+
+    def get(self, user_id):
+        """
+        Zwraca zapisany stan uprawnień użytkownika
+
+        Args:
+            user_id (int): ID użytkownika
+
+        Returns:
+            tuple: (wartość albo None, jeśli brak lub wygasła; generacja do
+                przekazania do set())
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at, generation FROM entitlement_cache WHERE user_id = ?",
+                (user_id, )).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd odczytu cache uprawnień: {str(e)}")
+            return None, None
+        if row is None:
+            return None, 0
+        value, expires_at, generation = row
+        if value is None or expires_at <= time.time():
+            return None, generation
+        return value, generation
+
+    def set(self, user_id, value, generation):
+        """Zapisuje stan, jeśli od odczytu (get) nikt go nie unieważnił"""
+        if generation is None:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            if generation == 0:
+                conn.execute(
+                    "INSERT OR IGNORE INTO entitlement_cache (user_id, value, expires_at, generation) "
+                    "VALUES (?, ?, ?, 0)", (user_id, value, now + self.ttl))
+            else:
+                conn.execute(
+                    "UPDATE entitlement_cache SET value = ?, expires_at = ? "
+                    "WHERE user_id = ? AND generation = ?",
+                    (value, now + self.ttl, user_id, generation))
+            conn.execute("DELETE FROM entitlement_cache WHERE expires_at <= ?",
+                         (now - ENTITLEMENT_CACHE_RETENTION, ))
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd zapisu cache uprawnień: {str(e)}")
+
+    def invalidate(self, user_id):
+        """Usuwa stan użytkownika ze wszystkich workerów (po zmianie płatności)"""
+        try:
+            self._connection().execute(
+                "INSERT INTO entitlement_cache (user_id, value, expires_at, generation) "
+                "VALUES (?, NULL, ?, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET value = NULL, expires_at = excluded.expires_at, "
+                "generation = generation + 1", (user_id, time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd unieważnienia cache uprawnień: {str(e)}")
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM entitlement_cache")
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd czyszczenia cache uprawnień: {str(e)}")
+
+
+entitlement_cache = EntitlementCache()
+
+
+def get_cached_entitlements(user_id):
+    """Zwraca (wartość albo None, generacja) z cache uprawnień"""
+    if not ENTITLEMENT_CACHE_ENABLED:
+        return None, None
+    return entitlement_cache.get(user_id)
+
+
+def store_entitlements(user_id, value, generation):
+    if not ENTITLEMENT_CACHE_ENABLED:
+        return
+    entitlement_cache.set(user_id, value, generation)
+
+
+def invalidate_entitlements(user_id):
+    """Unieważnia uprawnienia użytkownika we wszystkich workerach"""
+    if not ENTITLEMENT_CACHE_ENABLED:
+        return
+    entitlement_cache.invalidate(user_id)
@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from utils.sqlite_store import get_connection, state_path
+
+logger = logging.getLogger(__name__)
+
+# Konfiguracja cache odpowiedzi LLM
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 3600))  # sekundy
+LLM_CACHE_MEMORY_SIZE = int(os.environ.get("LLM_CACHE_MEMORY_SIZE", 256))
+LLM_CACHE_DISK_SIZE = int(os.environ.get("LLM_CACHE_DISK_SIZE", 5000))
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH")
+# Jak często trafienie w pamięci odświeża accessed_at na dysku (sekundy na klucz)
+LLM_CACHE_TOUCH_INTERVAL = float(os.environ.get("LLM_CACHE_TOUCH_INTERVAL", 60))
+
+
+def make_cache_key(payload):
+    """
+    Buduje klucz cache na podstawie pełnego payloadu zapytania
+
+    Args:
+        payload (dict): Treść zapytania do OpenRouter (model, wiadomości, parametry)
+
+    Returns:
+        str: Skrót SHA-256 kanonicznej postaci JSON
+    """
+    canonical = json.dumps(payload,
+                           sort_keys=True,
+                           ensure_ascii=False,
+                           separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Dwupoziomowy cache odpowiedzi LLM z TTL i wypieraniem LRU
+
+    Poziom 1: słownik w pamięci procesu (najszybszy, per worker).
+    Poziom 2: plik SQLite współdzielony przez wszystkie workery gunicorna.
+
+    Trafienia w pamięci odświeżają accessed_at na dysku najwyżej raz na
+    touch_interval sekund na klucz - inaczej najczęściej czytane klucze,
+    obsługiwane wyłącznie z pamięci, wypadałyby z dysku jako pierwsze.
+    """
+
+    def __init__(self,
+                 path=None,
+                 ttl=LLM_CACHE_TTL,
+                 memory_size=LLM_CACHE_MEMORY_SIZE,
+                 disk_size=LLM_CACHE_DISK_SIZE,
+                 touch_interval=LLM_CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.touch_interval = touch_interval
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self):
+        if self.path is None:
+            self.path = LLM_CACHE_PATH or state_path("llm_cache.db")
+        conn = get_connection(self.path)
+        if not self._schema_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at "
+                         "ON llm_cache (accessed_at)")
+            self._schema_ready = True
+        return conn
+
+    def _memory_get(self, key, now):
+        """Zwraca (wartość, czy odświeżyć accessed_at na dysku)"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None, False
+            value, expires_at, touched_at = entry
+            if expires_at <= now:
+                del self._memory[key]
+                return None, False
+            self._memory.move_to_end(key)
+            touch = now - touched_at >= self.touch_interval
+            if touch:
+                self._memory[key] = (value, expires_at, now)
+            return value, touch
+
+    def _memory_set(self, key, value, expires_at, touched_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at, touched_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Zwraca zapisaną odpowiedź albo None jeśli brak lub wygasła"""
+        now = time.time()
+        value, touch = self._memory_get(key, now)
+        if value is not None:
+            if touch:
+                try:
+                    self._connection().execute(
+                        "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                        (now, key))
+                except sqlite3.Error as e:
+                    logger.warning(f"Błąd odczytu cache LLM: {str(e)}")
+            return value
+
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?",
+                (key, )).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= now:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key, ))
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                         (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd odczytu cache LLM: {str(e)}")
+            return None
+
+        self._memory_set(key, value, expires_at, now)
+        return value
+
+    def set(self, key, value):
+        """Zapisuje odpowiedź w obu poziomach cache"""
+        now = time.time()
+        expires_at = now + self.ttl
+        self._memory_set(key, value, expires_at, now)
+
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)", (key, value, expires_at, now))
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now, ))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)", (self.disk_size, ))
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd zapisu cache LLM: {str(e)}")
+
+    def clear(self):
+        """Czyści oba poziomy cache"""
+        with self._lock:
+            self._memory.clear()
+        try:
+            self._connection().execute("DELETE FROM llm_cache")
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd czyszczenia cache LLM: {str(e)}")
+
+
+response_cache = LLMResponseCache()
+
+
+def get_cached_response(payload):
+    """Zwraca odpowiedź z cache dla payloadu albo None"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    return response_cache.get(make_cache_key(payload))
+
+
+def store_response(payload, content):
+    """Zapisuje odpowiedź dla payloadu w cache"""
+    if not LLM_CACHE_ENABLED or not content:
+        return
+    response_cache.set(make_cache_key(payload), content)
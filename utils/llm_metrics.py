@@ -0,0 +1,196 @@
+import os
+import time
+import sqlite3
+import logging
+
+from utils.sqlite_store import get_connection, state_path
+
+logger = logging.getLogger(__name__)
+
+# Telemetria wywołań LLM (wspólna dla wszystkich workerów)
+LLM_METRICS_ENABLED = os.environ.get("LLM_METRICS_ENABLED", "1") != "0"
+LLM_METRICS_RETENTION = int(os.environ.get("LLM_METRICS_RETENTION", 7 * 24 * 3600))
+LLM_METRICS_PATH = os.environ.get("LLM_METRICS_PATH")
+
+# Progi histogramów (sekundy)
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+
+# metryka -> (typ, opis)
+METRICS = {
+    'llm_requests_total': ('counter', 'Upstream LLM calls by outcome'),
+    'llm_attempts_total': ('counter', 'HTTP attempts sent to the LLM API (including retries)'),
+    'llm_tokens_total': ('counter', 'Tokens reported by the LLM API'),
+    'llm_request_duration_seconds': ('histogram', 'Total latency of an LLM call including retries'),
+    'llm_time_to_first_byte_seconds': ('histogram', 'Time until the first response byte of the successful attempt'),
+    'llm_queue_wait_seconds': ('histogram', 'Time spent waiting for the rate limiter'),
+}
+
+_schema_ready = False
+
+
+def _connection():
+    global _schema_ready
+    conn = get_connection(LLM_METRICS_PATH or state_path("llm_metrics.db"))
+    if not _schema_ready:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                task_type TEXT,
+                model TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                streamed INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                queue_wait REAL,
+                ttfb REAL,
+                latency REAL,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_calls_created_at "
+                     "ON llm_calls (created_at)")
+        # Narastające liczniki (surowe rekordy są czyszczone, liczniki nie)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_metric_values (
+                metric TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (metric, labels)
+            )
+        """)
+        _schema_ready = True
+    return conn
+
+
+def _labels(**labels):
+    """Formatuje etykiety w składni Prometheus (posortowane, z escapowaniem)"""
+    parts = []
+    for name, value in sorted(labels.items()):
+        value = str(value if value is not None else '').replace('\\', '\\\\').replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return ','.join(parts)
+
+
+def _histogram_updates(metric, buckets, value, labels):
+    updates = [(f"{metric}_count", labels, 1), (f"{metric}_sum", labels, value)]
+    for bound in buckets:
+        if value <= bound:
+            updates.append((f"{metric}_bucket", f'{labels},le="{bound}"', 1))
+    updates.append((f"{metric}_bucket", f'{labels},le="+Inf"', 1))
+    return updates
+
+
+def record_llm_call(model,
+                    outcome,
+                    task_type=None,
+                    streamed=False,
+                    attempts=0,
+                    queue_wait=None,
+                    ttfb=None,
+                    latency=None,
+                    prompt_tokens=None,
+                    completion_tokens=None):
+    """
+    Zapisuje pomiar jednego wywołania LLM
+
+    Args:
+        model (str): Model, do którego wysłano zapytanie
+        outcome (str): 'success', kategoria błędu z retry_policy, 'cancelled',
+            'circuit_open' albo 'rate_limited'
+        task_type (str): Typ zadania (np. 'optimize_cv')
+        streamed (bool): Czy odpowiedź była strumieniowana
+        attempts (int): Liczba wysłanych prób HTTP
+        queue_wait (float): Czas oczekiwania na limiter (s)
+        ttfb (float): Czas do pierwszego bajtu udanej próby (s)
+        latency (float): Całkowity czas wywołania (s)
+        prompt_tokens (int): Tokeny promptu z bloku `usage`
+        completion_tokens (int): Tokeny odpowiedzi z bloku `usage`
+    """
+    if not LLM_METRICS_ENABLED:
+        return
+
+    now = time.time()
+    base = _labels(task_type=task_type, model=model)
+    updates = [
+        ('llm_requests_total', _labels(task_type=task_type, model=model, outcome=outcome), 1),
+        ('llm_attempts_total', base, attempts),
+    ]
+    if prompt_tokens:
+        updates.append(('llm_tokens_total', _labels(task_type=task_type, model=model, kind='prompt'), prompt_tokens))
+    if completion_tokens:
+        updates.append(('llm_tokens_total', _labels(task_type=task_type, model=model, kind='completion'), completion_tokens))
+    if latency is not None:
+        updates += _histogram_updates('llm_request_duration_seconds', LATENCY_BUCKETS, latency, base)
+    if ttfb is not None:
+        updates += _histogram_updates('llm_time_to_first_byte_seconds', LATENCY_BUCKETS, ttfb, base)
+    if queue_wait is not None:
+        updates += _histogram_updates('llm_queue_wait_seconds', WAIT_BUCKETS, queue_wait, base)
+
+    try:
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO llm_calls (created_at, task_type, model, outcome, streamed, "
+                "attempts, queue_wait, ttfb, latency, prompt_tokens, completion_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, task_type, model, outcome, int(streamed), attempts, queue_wait,
+                 ttfb, latency, prompt_tokens, completion_tokens))
+            conn.executemany(
+                "INSERT INTO llm_metric_values (metric, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(metric, labels) DO UPDATE SET value = value + excluded.value",
+                updates)
+            conn.execute("DELETE FROM llm_calls WHERE created_at < ?",
+                         (now - LLM_METRICS_RETENTION, ))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        logger.warning(f"Błąd zapisu metryk LLM: {str(e)}")
+
+
+def _base_metric(name):
+    for suffix in ('_bucket', '_count', '_sum'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def render_prometheus():
+    """
+    Zwraca wszystkie metryki LLM w formacie tekstowym Prometheus
+
+    Returns:
+        str: Treść dla endpointu /metrics
+    """
+    try:
+        rows = _connection().execute(
+            "SELECT metric, labels, value FROM llm_metric_values").fetchall()
+    except sqlite3.Error as e:
+        logger.warning(f"Błąd odczytu metryk LLM: {str(e)}")
+        rows = []
+
+    grouped = {}
+    for metric, labels, value in rows:
+        grouped.setdefault(_base_metric(metric), []).append((metric, labels, value))
+
+    def sort_key(row):
+        metric, labels, _ = row
+        # Kubełki histogramu w kolejności rosnących progów, +Inf na końcu
+        if 'le="' in labels:
+            series, bound = labels.rsplit('le="', 1)
+            bound = bound.rstrip('"')
+            return (metric, series, float('inf') if bound == '+Inf' else float(bound))
+        return (metric, labels, 0)
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for metric, labels, value in sorted(grouped.get(name, []), key=sort_key):
+            value = int(value) if float(value).is_integer() else value
+            lines.append(f"{metric}{{{labels}}} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.rate_limiter import RateLimitExceeded, openrouter_limiter
+
+logger = logging.getLogger(__name__)
+
+# Modele zapasowe (po przecinku) dla wszystkich zadań; OPENROUTER_MODELS_<ZADANIE>
+# nadpisuje całą listę dla jednego zadania
+OPENROUTER_FALLBACK_MODELS = os.environ.get(
+    "OPENROUTER_FALLBACK_MODELS", "meta-llama/llama-3.3-70b-instruct:free")
+
+# Próg hedgingu: p95 ostatnich czasów odpowiedzi modelu, w tych granicach
+HEDGE_ENABLED = os.environ.get("OPENROUTER_HEDGE_ENABLED", "1") != "0"
+# Próg przed zebraniem HEDGE_MIN_SAMPLES próbek; domyślnie brak - bez p95 nie hedgujemy
+# (odpowiedzi trwają 10-30 s, stały próg dublowałby większość zapytań)
+HEDGE_DEFAULT_DELAY = float(os.environ["OPENROUTER_HEDGE_DEFAULT_DELAY"]) if os.environ.get(
+    "OPENROUTER_HEDGE_DEFAULT_DELAY") else None
+HEDGE_MIN_DELAY = float(os.environ.get("OPENROUTER_HEDGE_MIN_DELAY", 3.0))
+HEDGE_MAX_DELAY = float(os.environ.get("OPENROUTER_HEDGE_MAX_DELAY", 25.0))
+# Ile próbek potrzeba, zanim zaufamy wyliczonemu p95
+HEDGE_MIN_SAMPLES = 10
+# Zapytanie zapasowe tylko, gdy we wspólnym limicie zostaje tyle wolnych zapytań
+# (zapasowe zużywa jedno, reszta zostaje dla innych użytkowników)
+HEDGE_MIN_SPARE_REQUESTS = float(os.environ.get("OPENROUTER_HEDGE_MIN_SPARE_REQUESTS", 3))
+LATENCY_WINDOW = 100
+
+
+class RequestCancelled(Exception):
+    """Inny model odpowiedział pierwszy - zapytanie nie jest już potrzebne"""
+
+
+def _split_models(value):
+    return [model.strip() for model in value.split(',') if model.strip()]
+
+
+def models_for_task(task_type, primary_model):
+    """
+    Zwraca uporządkowaną listę modeli dla zadania (bez duplikatów)
+
+    Args:
+        task_type (str): Typ zadania, np. 'optimize_cv'
+        primary_model (str): Model podstawowy (FREE_MODEL/PREMIUM_MODEL)
+
+    Returns:
+        list: Model podstawowy, potem modele zapasowe
+    """
+    override = os.environ.get(f"OPENROUTER_MODELS_{task_type.upper()}") if task_type else None
+    models = _split_models(override) if override else (
+        [primary_model] + _split_models(OPENROUTER_FALLBACK_MODELS))
+    return list(dict.fromkeys(models))
+
+
+class LatencyTracker:
+    """Ostatnie czasy udanych odpowiedzi per model (w obrębie procesu)"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model, pct):
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def hedge_delay(self, model):
+        """Po ilu sekundach bez odpowiedzi wysłać zapytanie zapasowe (None = nie wysyłać)"""
+        p95 = self.percentile(model, 95)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p95))
+
+
+latency_tracker = LatencyTracker()
+
+
+def _timed_call(call, model, cancel_event):
+    started = time.monotonic()
+    result = call(model, cancel_event)
+    if result:
+        latency_tracker.record(model, time.monotonic() - started)
+    return result
+
+
+def route_request(models, call, hedge=HEDGE_ENABLED):
+    """
+    Wysyła zapytanie do pierwszego modelu z listy z hedgingiem i fallbackiem
+
+    Jeśli model podstawowy nie odpowie w czasie p95 jego ostatnich odpowiedzi,
+    a we wspólnym limicie zapytań jest zapas, równolegle startuje zapytanie
+    do kolejnego modelu; wygrywa pierwsza poprawna odpowiedź, a pozostałe
+    zapytania dostają sygnał anulowania (przed kolejną próbą - wysłane
+    zapytanie HTTP kończy się normalnie). Błąd lub pusta odpowiedź modelu od
+    razu uruchamia następny.
+
+    Args:
+        models (list): Uporządkowana lista modeli
+        call (callable): call(model, cancel_event) -> treść odpowiedzi albo None
+        hedge (bool): Czy wysyłać zapytania zapasowe przy wolnej odpowiedzi
+
+    Returns:
+        str: Pierwsza poprawna odpowiedź albo None
+    """
+    if len(models) == 1:
+        return call(models[0], threading.Event())
+
+    cancel_events = {}
+    pending = {}
+    next_index = 0
+    executor = ThreadPoolExecutor(max_workers=len(models),
+                                  thread_name_prefix='llm-hedge')
+
+    def launch():
+        nonlocal next_index
+        model = models[next_index]
+        next_index += 1
+        cancel_events[model] = threading.Event()
+        future = executor.submit(_timed_call, call, model, cancel_events[model])
+        pending[future] = model
+        return model
+
+    try:
+        launch()
+        while pending:
+            timeout = None
+            if hedge and next_index < len(models):
+                timeout = latency_tracker.hedge_delay(models[next_index - 1])
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                slow_model = models[next_index - 1]
+                if not openrouter_limiter.has_capacity(HEDGE_MIN_SPARE_REQUESTS):
+                    # Zapasowe zapytanie zabrałoby miejsce innym i skończyło się RateLimitExceeded
+                    logger.info(f"⏱️ {slow_model} odpowiada wolno, ale limit zapytań nie ma zapasu - bez hedgingu")
+                    hedge = False
+                    continue
+                hedge_model = launch()
+                logger.warning(f"⏱️ {slow_model} nie odpowiedział w {timeout:.1f} s - zapytanie zapasowe do {hedge_model}")
+                continue
+
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    result = future.result()
+                except RateLimitExceeded:
+                    # Limit jest wspólny dla wszystkich modeli - kolejny też by czekał
+                    if not pending:
+                        raise
+                    result = None
+                except Exception as e:
+                    logger.error(f"❌ Błąd modelu {model}: {str(e)}")
+                    result = None
+                if result:
+                    if model != models[0]:
+                        logger.info(f"✅ Odpowiedź z modelu zapasowego {model}")
+                    return result
+
+            # Wszystkie trwające zapytania zawiodły - od razu kolejny model
+            if not pending and next_index < len(models):
+                logger.warning(f"Model {models[next_index - 1]} zawiódł - przełączam na {models[next_index]}")
+                launch()
+        return None
+    finally:
+        for event in cancel_events.values():
+            event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
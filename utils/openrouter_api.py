@@ -1,11 +1,23 @@
 import os
 import json
+import time
 import logging
 import requests
 import urllib.parse
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
+from utils.llm_cache import (LLM_CACHE_ENABLED, get_cached_response,
+                             make_cache_key, store_response)
+from utils.single_flight import SingleFlight
+from utils.retry_policy import (INVALID_RESPONSE, CircuitOpenError, RetryPolicy,
+                                call_with_retry, classify_error, get_breaker)
+from utils.prompt_budget import RESPONSE_MAX_TOKENS, pack_prompt_inputs
+from utils.rate_limiter import (RateLimitExceeded, check_rate_limited,
+                                estimate_tokens, openrouter_limiter)
+from utils.model_router import RequestCancelled, models_for_task, route_request
+from utils.llm_metrics import record_llm_call
+
 # Create persistent session for connection reuse
 session = requests.Session()
 session.headers.update({
@@ -13,6 +25,9 @@ session.headers.update({
     'Connection': 'keep-alive'
 })
 
+# Coalesces identical concurrent requests into one upstream call
+request_flight = SingleFlight()
+
 # Load environment variables from .env file with override
 load_dotenv(override=True)
 
@@ -50,7 +65,9 @@ def validate_api_key():
 # Validate on module import
 API_KEY_VALID = validate_api_key()
 
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Adres endpointu /chat/completions (np. lokalny scripts/mock_openrouter.py)
+OPENROUTER_BASE_URL = os.environ.get(
+    "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
 MODEL = "qwen/qwen-2.5-72b-instruct:free"
 
 # ZAAWANSOWANA KONFIGURACJA QWEN - MAKSYMALNA JAKOŚĆ
@@ -63,23 +80,21 @@ FREE_MODEL = "qwen/qwen-2.5-72b-instruct:free"
 DEEP_REASONING_PROMPT = """Jesteś światowej klasy ekspertem w rekrutacji i optymalizacji CV z 15-letnim doświadczeniem w branży HR. Posiadasz głęboką wiedzę o polskim rynku pracy, trendach rekrutacyjnych i najlepszych praktykach w tworzeniu CV."""
 
 
-def make_openrouter_request(prompt, model=None, is_premium=False, max_retries=2):
-    """Make a request to OpenRouter API with retry mechanism"""
-    if not API_KEY_VALID:
-        logger.error("API key is not valid")
-        return None
-
-    if model is None:
-        model = PREMIUM_MODEL if is_premium else FREE_MODEL
-
-    headers = {
+def _request_headers():
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "https://cv-optimizer-pro.replit.app",
         "X-Title": "CV Optimizer Pro"
     }
 
-    data = {
+
+def build_request_payload(prompt, model=None, is_premium=False):
+    """Build the chat completion payload (model, messages, sampling parameters)"""
+    if model is None:
+        model = PREMIUM_MODEL if is_premium else FREE_MODEL
+
+    return {
         "model": model,
         "messages": [{
             "role": "system",
@@ -89,68 +104,266 @@ def make_openrouter_request(prompt, model=None, is_premium=False, max_retries=2)
             "content": prompt
         }],
         "temperature": 0.3,
-        "max_tokens": 1500,  # Jeszcze bardziej zmniejszone
+        "max_tokens": RESPONSE_MAX_TOKENS,
         "top_p": 0.9,
         "frequency_penalty": 0.1,
         "presence_penalty": 0.1
     }
 
-    for attempt in range(max_retries + 1):
-        try:
-            logger.info(f"Sending request to OpenRouter API (attempt {attempt + 1}/{max_retries + 1}) with model: {model}")
-
-            # Jeszcze krótszy timeout dla stabilności
-            response = session.post(
-                OPENROUTER_BASE_URL,
-                headers=headers,
-                json=data,
-                timeout=(3, 30),  # (connection timeout, read timeout)
-                stream=False
-            )
-            response.raise_for_status()
 
-            result = response.json()
-            logger.debug(f"Raw API response: {result}")
-
-            if 'choices' in result and len(result['choices']) > 0:
-                content = result['choices'][0]['message']['content']
-                logger.info(f"✅ OpenRouter API zwróciło odpowiedź (długość: {len(content)} znaków)")
-                return content
-            else:
-                logger.error(f"❌ Nieoczekiwany format odpowiedzi API: {result}")
-                if attempt == max_retries:
-                    raise ValueError("Nieoczekiwany format odpowiedzi API")
-
-        except requests.exceptions.Timeout as e:
-            logger.warning(f"Timeout na próbie {attempt + 1}: {str(e)}")
-            if attempt == max_retries:
-                logger.error("Przekroczono maksymalną liczbę prób - timeout")
-                return None
-        except requests.exceptions.ConnectionError as e:
-            logger.warning(f"Błąd połączenia na próbie {attempt + 1}: {str(e)}")
-            if attempt == max_retries:
-                logger.error("Przekroczono maksymalną liczbę prób - błąd połączenia")
-                return None
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Błąd zapytania API: {str(e)}")
-            if attempt == max_retries:
-                return None
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
-            logger.error(f"Błąd parsowania odpowiedzi API: {str(e)}")
-            if attempt == max_retries:
-                return None
-
-        # Krótkie opóźnienie przed ponowną próbą
-        if attempt < max_retries:
-            import time
-            time.sleep(1)
-
-    return None
+def make_openrouter_request(prompt, model=None, is_premium=False, max_retries=2,
+                            task_type=None):
+    """
+    Make a request to OpenRouter API with retry mechanism and response cache
 
+    Without an explicit `model` the request is routed over the task's model
+    list: a slow primary gets a hedge request to the next model and a failed
+    one falls back to it.
+    """
+    if not API_KEY_VALID:
+        logger.error("API key is not valid")
+        return None
 
-def optimize_cv(cv_text, job_title, job_description="", is_premium=False):
-    """Optimize CV for a specific job"""
-    prompt = f"""
+    if model is None:
+        primary = PREMIUM_MODEL if is_premium else FREE_MODEL
+        models = models_for_task(task_type, primary)
+        # Odpowiedź z dowolnego modelu z listy jest równie dobra
+        for candidate in models:
+            cached = get_cached_response(build_request_payload(prompt, model=candidate))
+            if cached is not None:
+                logger.info(f"✅ Odpowiedź z cache LLM (długość: {len(cached)} znaków)")
+                return cached
+        return route_request(
+            models, lambda candidate, cancel_event: _request_model(
+                prompt, candidate, max_retries, cancel_event, task_type))
+
+    return _request_model(prompt, model, max_retries, task_type=task_type)
+
+
+def _request_model(prompt, model, max_retries, cancel_event=None, task_type=None):
+    """Request a completion from one model (cache, single-flight, retries)"""
+    data = build_request_payload(prompt, model=model)
+
+    # Identyczne zapytanie (model, prompty, parametry) - zwróć z cache
+    cached = get_cached_response(data)
+    if cached is not None:
+        logger.info(f"✅ Odpowiedź z cache LLM (długość: {len(cached)} znaków)")
+        return cached
+
+    # Identyczne równoległe zapytania (podwójne kliknięcie, dwie karty)
+    # czekają na jedno wywołanie API. Między workerami wynik jest odbierany
+    # przez współdzielony cache, więc bez cache koordynacja jest tylko lokalna.
+    return request_flight.do(make_cache_key(data),
+                             lambda: _post_with_retries(data, max_retries, cancel_event,
+                                                        task_type),
+                             recheck=lambda: get_cached_response(data),
+                             share_across_processes=LLM_CACHE_ENABLED)
+
+
+def _post_with_retries(data, max_retries, cancel_event=None, task_type=None):
+    """POST the payload to OpenRouter using the shared retry policy and circuit breaker"""
+    headers = _request_headers()
+    model = data["model"]
+    stats = {'attempts': 0, 'queue_wait': 0.0, 'ttfb': None, 'usage': {}}
+    started = time.monotonic()
+
+    def send():
+        if cancel_event is not None and cancel_event.is_set():
+            raise RequestCancelled()
+        stats['attempts'] += 1
+        # Każda próba (także ponowienie) zużywa limit wspólny dla workerów
+        wait_started = time.monotonic()
+        openrouter_limiter.acquire(estimate_tokens(data))
+        stats['queue_wait'] += time.monotonic() - wait_started
+        logger.info(f"Sending request to OpenRouter API (attempt {stats['attempts']}/{max_retries + 1}) with model: {model}")
+
+        # Jeszcze krótszy timeout dla stabilności
+        response = session.post(
+            OPENROUTER_BASE_URL,
+            headers=headers,
+            json=data,
+            timeout=(3, 30),  # (connection timeout, read timeout)
+            stream=False
+        )
+        # elapsed = czas do odebrania nagłówków odpowiedzi
+        stats['ttfb'] = response.elapsed.total_seconds()
+        check_rate_limited(response)
+        response.raise_for_status()
+
+        result = response.json()
+        logger.debug(f"Raw API response: {result}")
+
+        if 'choices' not in result or len(result['choices']) == 0:
+            logger.error(f"❌ Nieoczekiwany format odpowiedzi API: {result}")
+            raise ValueError("Nieoczekiwany format odpowiedzi API")
+        stats['usage'] = result.get('usage') or {}
+        return result['choices'][0]['message']['content']
+
+    def record(outcome):
+        record_llm_call(model,
+                        outcome,
+                        task_type=task_type,
+                        attempts=stats['attempts'],
+                        queue_wait=stats['queue_wait'],
+                        ttfb=stats['ttfb'] if outcome == 'success' else None,
+                        latency=time.monotonic() - started,
+                        prompt_tokens=stats['usage'].get('prompt_tokens'),
+                        completion_tokens=stats['usage'].get('completion_tokens'))
+
+    try:
+        # Osobny bezpiecznik dla każdego modelu - awaria jednego nie blokuje zapasowych
+        content = call_with_retry(send,
+                                  RetryPolicy(max_attempts=max_retries + 1),
+                                  breaker=get_breaker(f"OpenRouter {model}"))
+    except RequestCancelled:
+        record('cancelled')
+        logger.info(f"Zapytanie do {model} anulowane - inny model odpowiedział pierwszy")
+        return None
+    except RateLimitExceeded:
+        record('rate_limited')
+        raise
+    except CircuitOpenError as e:
+        record('circuit_open')
+        logger.error(f"❌ {str(e)}")
+        return None
+    except requests.exceptions.RequestException as e:
+        record(classify_error(e)[0])
+        logger.error(f"Błąd zapytania API: {str(e)}")
+        return None
+    except (KeyError, IndexError, ValueError) as e:
+        record(INVALID_RESPONSE)
+        logger.error(f"Błąd parsowania odpowiedzi API: {str(e)}")
+        return None
+
+    record('success')
+    logger.info(f"✅ OpenRouter API zwróciło odpowiedź (długość: {len(content)} znaków, {time.monotonic() - started:.1f} s)")
+    store_response(data, content)
+    return content
+
+
+def stream_openrouter_request(prompt, model=None, is_premium=False, task_type=None):
+    """
+    Stream a completion from OpenRouter (Server-Sent Events)
+
+    Yields text fragments as soon as OpenRouter sends them. The full text is
+    stored in the response cache once the stream finishes, and a cached
+    answer is yielded in one piece without contacting the API. Without an
+    explicit `model`, a model that fails before the first token falls back
+    to the next one from the task's model list.
+    """
+    if not API_KEY_VALID:
+        logger.error("API key is not valid")
+        return
+
+    if model is None:
+        models = models_for_task(task_type, PREMIUM_MODEL if is_premium else FREE_MODEL)
+    else:
+        models = [model]
+
+    for candidate in models:
+        cached = get_cached_response(build_request_payload(prompt, model=candidate))
+        if cached is not None:
+            logger.info(f"✅ Odpowiedź z cache LLM (długość: {len(cached)} znaków)")
+            yield cached
+            return
+
+    stats = {}
+
+    def connect(data):
+        stats['attempts'] += 1
+        wait_started = time.monotonic()
+        openrouter_limiter.acquire(estimate_tokens(data))
+        stats['queue_wait'] += time.monotonic() - wait_started
+        response = session.post(OPENROUTER_BASE_URL,
+                                headers=_request_headers(),
+                                json=dict(data, stream=True),
+                                timeout=(3, 30),
+                                stream=True)
+        check_rate_limited(response)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def record(outcome):
+        usage = stats.get('usage') or {}
+        record_llm_call(data['model'],
+                        outcome,
+                        task_type=task_type,
+                        streamed=True,
+                        attempts=stats['attempts'],
+                        queue_wait=stats['queue_wait'],
+                        ttfb=stats.get('ttfb'),
+                        latency=time.monotonic() - stats['started'],
+                        prompt_tokens=usage.get('prompt_tokens'),
+                        completion_tokens=usage.get('completion_tokens'))
+
+    # Ponowienia i fallback tylko przy nawiązywaniu połączenia - przed pierwszym tokenem
+    for index, candidate in enumerate(models):
+        data = build_request_payload(prompt, model=candidate)
+        stats.update(attempts=0, queue_wait=0.0, started=time.monotonic())
+        logger.info(f"Streaming request to OpenRouter API with model: {candidate}")
+        try:
+            response = call_with_retry(lambda: connect(data),
+                                       breaker=get_breaker(f"OpenRouter {candidate}"))
+            break
+        except RateLimitExceeded:
+            record('rate_limited')
+            raise
+        except (CircuitOpenError, requests.exceptions.RequestException) as e:
+            record('circuit_open' if isinstance(e, CircuitOpenError) else classify_error(e)[0])
+            if index == len(models) - 1:
+                raise
+            logger.warning(f"Model {candidate} zawiódł ({str(e)}) - przełączam na {models[index + 1]}")
+
+    outcome = 'cancelled'  # klient zamknął strumień przed końcem
+    try:
+        response.encoding = 'utf-8'
+
+        parts = []
+        for line in response.iter_lines(decode_unicode=True):
+            # Puste linie rozdzielają eventy, linie z ":" to komentarze keep-alive
+            if not line or not line.startswith('data:'):
+                continue
+            chunk = line[len('data:'):].strip()
+            if chunk == '[DONE]':
+                break
+
+            event = json.loads(chunk)
+            if 'error' in event:
+                raise ValueError(f"Błąd strumienia OpenRouter: {event['error']}")
+            # Blok usage przychodzi w ostatnim evencie strumienia
+            if event.get('usage'):
+                stats['usage'] = event['usage']
+
+            choices = event.get('choices') or []
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if delta:
+                if 'ttfb' not in stats:
+                    stats['ttfb'] = time.monotonic() - stats['started']
+                parts.append(delta)
+                yield delta
+        outcome = 'success'
+    except (KeyError, IndexError, ValueError):
+        outcome = INVALID_RESPONSE
+        raise
+    except requests.exceptions.RequestException as e:
+        outcome = classify_error(e)[0]
+        raise
+    finally:
+        response.close()
+        record(outcome)
+
+    content = ''.join(parts)
+    logger.info(f"✅ Strumień OpenRouter zakończony (długość: {len(content)} znaków)")
+    store_response(data, content)
+
+
+def build_optimize_cv_prompt(cv_text, job_title, job_description=""):
+    cv_text, job_description = pack_prompt_inputs("optimize_cv", cv_text, job_description)
+    return f"""
     ZADANIE: Zoptymalizuj poniższe CV pod stanowisko "{job_title}"
 
     OPIS STANOWISKA:
@@ -170,15 +383,10 @@ def optimize_cv(cv_text, job_title, job_description="", is_premium=False):
     Zwróć TYLKO zoptymalizowane CV bez dodatkowych komentarzy.
     """
 
-    return make_openrouter_request(prompt, is_premium=is_premium)
 
-
-def analyze_cv_with_score(cv_text,
-                          job_title,
-                          job_description="",
-                          is_premium=False):
-    """Analyze CV and provide detailed feedback with score"""
-    prompt = f"""
+def build_analyze_cv_prompt(cv_text, job_title, job_description=""):
+    cv_text, job_description = pack_prompt_inputs("analyze_cv", cv_text, job_description)
+    return f"""
     ZADANIE: Przeanalizuj poniższe CV pod kątem stanowiska "{job_title}" i oceń je
 
     OPIS STANOWISKA:
@@ -211,28 +419,19 @@ def analyze_cv_with_score(cv_text,
     - [rekomendacja 2]
     """
 
-    return make_openrouter_request(prompt, is_premium=is_premium)
 
+def build_cover_letter_prompt(cv_text, job_title, job_description="", company_name=""):
+    cv_text, job_description = pack_prompt_inputs("cover_letter", cv_text, job_description)
+    # Przygotowanie danych firmy
+    company_info = f" w firmie {company_name}" if company_name else ""
+    job_desc_info = f"\n\nOpis stanowiska:\n{job_description}" if job_description else ""
 
-def generate_cover_letter(cv_text,
-                          job_title,
-                          job_description="",
-                          company_name="",
-                          is_premium=False):
-    """
-    Generuje profesjonalny list motywacyjny na podstawie CV i opisu stanowiska używając AI
-    """
-    try:
-        # Przygotowanie danych firmy
-        company_info = f" w firmie {company_name}" if company_name else ""
-        job_desc_info = f"\n\nOpis stanowiska:\n{job_description}" if job_description else ""
-
-        prompt = f"""
+    return f"""
 🎯 ZADANIE: Wygeneruj profesjonalny list motywacyjny w języku polskim
 
 📋 DANE WEJŚCIOWE:
 • Stanowisko: {job_title}{company_info}
-• CV kandydata: {cv_text[:3000]}...{job_desc_info}
+• CV kandydata: {cv_text}{job_desc_info}
 
 ✅ WYMAGANIA LISTU MOTYWACYJNEGO:
 1. Format profesjonalny (nagłówek, zwroty grzecznościowe, podpis)
@@ -259,46 +458,17 @@ def generate_cover_letter(cv_text,
 Wygeneruj teraz kompletny list motywacyjny:
         """
 
-        logger.info(
-            f"📧 Generowanie listu motywacyjnego dla stanowiska: {job_title}")
-
-        cover_letter = make_openrouter_request(prompt, is_premium=is_premium)
-
-        if cover_letter:
-            logger.info(
-                f"✅ List motywacyjny wygenerowany pomyślnie (długość: {len(cover_letter)} znaków)"
-            )
-
-            return {
-                'success': True,
-                'cover_letter': cover_letter,
-                'job_title': job_title,
-                'company_name': company_name,
-                'model_used': PREMIUM_MODEL if is_premium else FREE_MODEL
-            }
-        else:
-            logger.error("❌ Brak odpowiedzi z API lub nieprawidłowa struktura")
-            return None
-
-    except Exception as e:
-        logger.error(
-            f"❌ Błąd podczas generowania listu motywacyjnego: {str(e)}")
-        return None
-
 
-def generate_interview_questions(cv_text, job_title, job_description="", is_premium=False):
-    """
-    Generuje personalizowane pytania na rozmowę kwalifikacyjną na podstawie CV i opisu stanowiska
-    """
-    try:
-        job_desc_info = f"\n\nOpis stanowiska:\n{job_description}" if job_description else ""
-        
-        prompt = f"""
+def build_interview_questions_prompt(cv_text, job_title, job_description=""):
+    cv_text, job_description = pack_prompt_inputs("interview_questions", cv_text, job_description)
+    job_desc_info = f"\n\nOpis stanowiska:\n{job_description}" if job_description else ""
+    
+    return f"""
 🎯 ZADANIE: Wygeneruj personalizowane pytania na rozmowę kwalifikacyjną w języku polskim
 
 📋 DANE WEJŚCIOWE:
 • Stanowisko: {job_title}
-• CV kandydata: {cv_text[:3000]}...{job_desc_info}
+• CV kandydata: {cv_text}{job_desc_info}
 
 ✅ WYMAGANIA PYTAŃ:
 1. 10-15 pytań dostosowanych do profilu kandydata
@@ -344,41 +514,17 @@ PYTANIA O FIRMĘ I STANOWISKO:
 Wygeneruj teraz personalizowane pytania na rozmowę kwalifikacyjną:
         """
 
-        logger.info(f"🤔 Generowanie pytań na rozmowę dla stanowiska: {job_title}")
-
-        questions = make_openrouter_request(prompt, is_premium=is_premium)
 
-        if questions:
-            logger.info(f"✅ Pytania na rozmowę wygenerowane pomyślnie (długość: {len(questions)} znaków)")
-            
-            return {
-                'success': True,
-                'questions': questions,
-                'job_title': job_title,
-                'model_used': PREMIUM_MODEL if is_premium else FREE_MODEL
-            }
-        else:
-            logger.error("❌ Brak odpowiedzi z API lub nieprawidłowa struktura")
-            return None
-
-    except Exception as e:
-        logger.error(f"❌ Błąd podczas generowania pytań na rozmowę: {str(e)}")
-        return None
-
-
-def analyze_skills_gap(cv_text, job_title, job_description="", is_premium=False):
-    """
-    Analizuje luki kompetencyjne między CV a wymaganiami stanowiska
-    """
-    try:
-        job_desc_info = f"\n\nOpis stanowiska:\n{job_description}" if job_description else ""
-        
-        prompt = f"""
+def build_skills_gap_prompt(cv_text, job_title, job_description=""):
+    cv_text, job_description = pack_prompt_inputs("skills_gap", cv_text, job_description)
+    job_desc_info = f"\n\nOpis stanowiska:\n{job_description}" if job_description else ""
+    
+    return f"""
 🎯 ZADANIE: Przeprowadź szczegółową analizę luk kompetencyjnych w języku polskim
 
 📋 DANE WEJŚCIOWE:
 • Stanowisko: {job_title}
-• CV kandydata: {cv_text[:3000]}...{job_desc_info}
+• CV kandydata: {cv_text}{job_desc_info}
 
 ✅ CELE ANALIZY:
 1. Porównaj umiejętności z CV z wymaganiami stanowiska
@@ -425,9 +571,128 @@ PLAN DZIAŁANIA (3-6 miesięcy):
 Przeprowadź teraz szczegółową analizę luk kompetencyjnych:
         """
 
+
+def build_task_prompt(task_type, cv_text, job_title, job_description="", company_name=""):
+    """Build the user prompt for a task type used by the job queue and streaming routes"""
+    if task_type == 'optimize_cv':
+        return build_optimize_cv_prompt(cv_text, job_title, job_description)
+    if task_type == 'analyze_cv':
+        return build_analyze_cv_prompt(cv_text, job_title, job_description)
+    if task_type == 'cover_letter':
+        return build_cover_letter_prompt(cv_text, job_title, job_description, company_name)
+    if task_type == 'interview_questions':
+        return build_interview_questions_prompt(cv_text, job_title, job_description)
+    if task_type == 'skills_gap':
+        return build_skills_gap_prompt(cv_text, job_title, job_description)
+    raise ValueError(f"Nieznany typ zadania: {task_type}")
+
+
+def optimize_cv(cv_text, job_title, job_description="", is_premium=False):
+    """Optimize CV for a specific job"""
+    prompt = build_optimize_cv_prompt(cv_text, job_title, job_description)
+
+    return make_openrouter_request(prompt, is_premium=is_premium,
+                                   task_type='optimize_cv')
+
+
+def analyze_cv_with_score(cv_text,
+                          job_title,
+                          job_description="",
+                          is_premium=False):
+    """Analyze CV and provide detailed feedback with score"""
+    prompt = build_analyze_cv_prompt(cv_text, job_title, job_description)
+
+    return make_openrouter_request(prompt, is_premium=is_premium,
+                                   task_type='analyze_cv')
+
+
+def generate_cover_letter(cv_text,
+                          job_title,
+                          job_description="",
+                          company_name="",
+                          is_premium=False):
+    """
+    Generuje profesjonalny list motywacyjny na podstawie CV i opisu stanowiska używając AI
+    """
+    try:
+        prompt = build_cover_letter_prompt(cv_text, job_title,
+                                           job_description, company_name)
+
+        logger.info(
+            f"📧 Generowanie listu motywacyjnego dla stanowiska: {job_title}")
+
+        cover_letter = make_openrouter_request(prompt, is_premium=is_premium,
+                                               task_type='cover_letter')
+
+        if cover_letter:
+            logger.info(
+                f"✅ List motywacyjny wygenerowany pomyślnie (długość: {len(cover_letter)} znaków)"
+            )
+
+            return {
+                'success': True,
+                'cover_letter': cover_letter,
+                'job_title': job_title,
+                'company_name': company_name,
+                'model_used': PREMIUM_MODEL if is_premium else FREE_MODEL
+            }
+        else:
+            logger.error("❌ Brak odpowiedzi z API lub nieprawidłowa struktura")
+            return None
+
+    except RateLimitExceeded:
+        # Trasa zwraca użytkownikowi komunikat "zajęte" zamiast ogólnego błędu
+        raise
+    except Exception as e:
+        logger.error(
+            f"❌ Błąd podczas generowania listu motywacyjnego: {str(e)}")
+        return None
+
+
+def generate_interview_questions(cv_text, job_title, job_description="", is_premium=False):
+    """
+    Generuje personalizowane pytania na rozmowę kwalifikacyjną na podstawie CV i opisu stanowiska
+    """
+    try:
+        prompt = build_interview_questions_prompt(cv_text, job_title,
+                                                  job_description)
+
+        logger.info(f"🤔 Generowanie pytań na rozmowę dla stanowiska: {job_title}")
+
+        questions = make_openrouter_request(prompt, is_premium=is_premium,
+                                            task_type='interview_questions')
+
+        if questions:
+            logger.info(f"✅ Pytania na rozmowę wygenerowane pomyślnie (długość: {len(questions)} znaków)")
+            
+            return {
+                'success': True,
+                'questions': questions,
+                'job_title': job_title,
+                'model_used': PREMIUM_MODEL if is_premium else FREE_MODEL
+            }
+        else:
+            logger.error("❌ Brak odpowiedzi z API lub nieprawidłowa struktura")
+            return None
+
+    except RateLimitExceeded:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Błąd podczas generowania pytań na rozmowę: {str(e)}")
+        return None
+
+
+def analyze_skills_gap(cv_text, job_title, job_description="", is_premium=False):
+    """
+    Analizuje luki kompetencyjne między CV a wymaganiami stanowiska
+    """
+    try:
+        prompt = build_skills_gap_prompt(cv_text, job_title, job_description)
+
         logger.info(f"🔍 Analiza luk kompetencyjnych dla stanowiska: {job_title}")
 
-        analysis = make_openrouter_request(prompt, is_premium=is_premium)
+        analysis = make_openrouter_request(prompt, is_premium=is_premium,
+                                           task_type='skills_gap')
 
         if analysis:
             logger.info(f"✅ Analiza luk kompetencyjnych ukończona pomyślnie (długość: {len(analysis)} znaków)")
@@ -442,6 +707,8 @@ Przeprowadź teraz szczegółową analizę luk kompetencyjnych:
             logger.error("❌ Brak odpowiedzi z API lub nieprawidłowa struktura")
             return None
 
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         logger.error(f"❌ Błąd podczas analizy luk kompetencyjnych: {str(e)}")
         return None
\ No newline at end of file
@@ -4,6 +4,9 @@ import logging
 import requests
 from dotenv import load_dotenv
 
+from utils.retry_policy import CircuitOpenError, call_with_retry
+from utils.rate_limiter import check_rate_limited, estimate_tokens, openrouter_limiter
+
 # Load environment variables with override
 load_dotenv(override=True)
 
@@ -38,7 +41,9 @@ def validate_api_key():
 # Validate on module import
 API_KEY_VALID = validate_api_key()
 
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Adres endpointu /chat/completions (np. lokalny scripts/mock_openrouter.py)
+OPENROUTER_BASE_URL = os.environ.get(
+    "OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 # ZAAWANSOWANA KONFIGURACJA MODELI
 DEFAULT_MODEL = "qwen/qwen-2.5-72b-instruct:free"
@@ -147,12 +152,14 @@ def send_api_request(prompt,
         }
     }
 
-    try:
+    def send():
+        openrouter_limiter.acquire(estimate_tokens(payload))
         logger.debug(f"Sending request to OpenRouter API")
         response = requests.post(OPENROUTER_BASE_URL,
                                  headers=headers,
                                  json=payload,
                                  timeout=90)
+        check_rate_limited(response)
         response.raise_for_status()
 
         result = response.json()
@@ -163,11 +170,18 @@ def send_api_request(prompt,
         else:
             raise ValueError("Unexpected API response format")
 
+    try:
+        return call_with_retry(send)
+
+    except CircuitOpenError as e:
+        logger.error(f"API request rejected: {str(e)}")
+        raise Exception(f"Failed to communicate with OpenRouter API: {str(e)}")
+
     except requests.exceptions.RequestException as e:
         logger.error(f"API request failed: {str(e)}")
         raise Exception(f"Failed to communicate with OpenRouter API: {str(e)}")
 
-    except (KeyError, IndexError, json.JSONDecodeError) as e:
+    except (KeyError, IndexError, ValueError) as e:
         logger.error(f"Error parsing API response: {str(e)}")
         raise Exception(f"Failed to parse OpenRouter API response: {str(e)}")
 
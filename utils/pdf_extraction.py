@@ -1,69 +1,493 @@
+import os
+import re
+import shutil
 import logging
+import tempfile
+import subprocess
+import unicodedata
+import importlib.util
 import PyPDF2
 from io import BytesIO
+from contextlib import contextmanager
+
+from utils.prompt_budget import CONSENT_CLAUSE, is_heading
 
 logger = logging.getLogger(__name__)
 
+# Backend order - fastest first; later ones are tried only when the output is empty or garbled.
+# Tune with scripts/benchmark_pdf_extraction.py --mode backends
+PDF_EXTRACTION_BACKENDS = os.environ.get("PDF_EXTRACTION_BACKENDS", "pdftotext,pypdf2,pypdf,pdfminer")
+# Minimal text_quality() score accepted without escalating to the next backend
+PDF_MIN_TEXT_QUALITY = float(os.environ.get("PDF_MIN_TEXT_QUALITY", 0.8))
+PDFTOTEXT_TIMEOUT = float(os.environ.get("PDFTOTEXT_TIMEOUT", 30))
+# Linia powtórzona na takiej części stron (min. 2) jest nagłówkiem/stopką
+PDF_REPEATED_LINE_SHARE = float(os.environ.get("PDF_REPEATED_LINE_SHARE", 0.5))
+REPEATED_LINE_MAX_LENGTH = 120
+# Nagłówki/stopki szukamy tylko w tylu pierwszych i ostatnich liniach strony
+PAGE_EDGE_LINES = 4
+# Pre-parse validation (validate_pdf_file): a CV longer than this is not a CV
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", 30))
+# The header may follow some garbage, the trailer may be followed by some (spec: 1024 bytes)
+PDF_HEADER_SEARCH_BYTES = 1024
+PDF_TRAILER_SEARCH_BYTES = 2048
+
+# Reasons returned by validate_pdf_file and messages shown to the user
+PDF_REJECTION_MESSAGES = {
+    'not_pdf': 'Plik nie jest dokumentem PDF. Zapisz CV jako PDF i spróbuj ponownie.',
+    'truncated': 'Plik PDF jest uszkodzony albo niekompletny. Spróbuj wyeksportować go ponownie.',
+    'encrypted': 'Plik PDF jest zabezpieczony hasłem. Zapisz go bez hasła i spróbuj ponownie.',
+    'no_pages': 'Plik PDF nie zawiera żadnych stron.',
+    'too_many_pages': f'Plik PDF ma zbyt wiele stron (maks. {PDF_MAX_PAGES}).',
+    'no_text': 'Plik PDF zawiera tylko obrazy (np. skan), więc nie da się odczytać z niego tekstu. '
+               'Wyeksportuj CV do PDF bezpośrednio z edytora tekstu.',
+}
+
+# Numeracja stron: "1", "- 2 -", "Strona 2 z 3", "Page 2 of 3", "2/3"
+PAGE_NUMBER = re.compile(r"^(strona|str\.|page)?\s*-?\s*\d{1,3}\s*-?\s*((/|z|of|ze)\s*\d{1,3})?$", re.IGNORECASE)
+
+
+@contextmanager
+def open_pdf_source(source):
+    """
+    Open a PDF source as a seekable binary stream
+
+    Args:
+        source: Path (str/PathLike), bytes or a seekable file-like object
+            (e.g. the upload stream of werkzeug FileStorage)
+
+    Yields:
+        Binary stream positioned at the beginning; file-like objects are
+        not closed - the caller owns them
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as file:
+            yield file
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield BytesIO(source)
+    else:
+        source.seek(0)
+        yield source
+
+
+class ExtractionBackend:
+    """
+    PDF text extraction backend
+
+    Subclasses implement page_count() and extract_pages(); both receive a
+    seekable binary stream. Pages that cannot be read become empty strings.
+    """
+
+    name = None
+
+    def is_available(self):
+        return True
+
+    def page_count(self, file):
+        raise NotImplementedError
+
+    def extract_pages(self, file, start=0, stop=None):
+        """Return the text of pages [start, stop) (stop=None - until the last page)"""
+        raise NotImplementedError
+
+
+class PyPDF2Backend(ExtractionBackend):
+    """PyPDF2 (the original parser of this app)"""
+
+    name = 'pypdf2'
+    module = 'PyPDF2'
+
+    def is_available(self):
+        return importlib.util.find_spec(self.module) is not None
+
+    def _open_reader(self, file):
+        """Open PdfReader, decrypting with an empty password if needed (None on failure)"""
+        pdf_reader = importlib.import_module(self.module).PdfReader(file)
+
+        # Check if PDF is encrypted
+        if pdf_reader.is_encrypted:
+            logger.warning(
+                "PDF jest zaszyfrowany - próba otworzenia bez hasła")
+            try:
+                pdf_reader.decrypt('')
+            except:
+                logger.error("Nie udało się otworzyć zaszyfrowanego PDF")
+                return None
+
+        return pdf_reader
+
+    def page_count(self, file):
+        pdf_reader = self._open_reader(file)
+        return len(pdf_reader.pages) if pdf_reader is not None else None
+
+    def extract_pages(self, file, start=0, stop=None):
+        pdf_reader = self._open_reader(file)
+        if pdf_reader is None:
+            return None
+
+        page_texts = []
+        stop = len(pdf_reader.pages) if stop is None else min(stop, len(pdf_reader.pages))
+        for page_num in range(start, stop):
+            try:
+                page = pdf_reader.pages[page_num]
+                page_texts.append(page.extract_text() or "")
+                logger.debug(
+                    f"Wyodrębniono tekst ze strony {page_num + 1}")
+
+            except MemoryError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Błąd odczytywania strony {page_num + 1}: {str(e)}")
+                page_texts.append("")
+
+        return page_texts
+
+
+class PypdfBackend(PyPDF2Backend):
+    """pypdf - maintained successor of PyPDF2 with the same API"""
+
+    name = 'pypdf'
+    module = 'pypdf'
+
+
+class PdfminerBackend(ExtractionBackend):
+    """pdfminer.six - slowest, but the most tolerant of unusual fonts and layouts"""
+
+    name = 'pdfminer'
+
+    def is_available(self):
+        return importlib.util.find_spec('pdfminer') is not None
+
+    def page_count(self, file):
+        from pdfminer.pdfpage import PDFPage
+        return sum(1 for _ in PDFPage.get_pages(file))
+
+    def extract_pages(self, file, start=0, stop=None):
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+
+        page_numbers = range(start, stop) if stop is not None else None
+        page_texts = []
+        for page_num, layout in enumerate(extract_pages(file, page_numbers=page_numbers)):
+            if stop is None and page_num < start:
+                continue
+            page_texts.append(''.join(element.get_text() for element in layout
+                                      if isinstance(element, LTTextContainer)))
+        return page_texts
+
 
-def extract_text_from_pdf(file_path):
+class PdftotextBackend(ExtractionBackend):
+    """pdftotext/pdfinfo from poppler-utils (C, fastest) - used when installed"""
+
+    name = 'pdftotext'
+
+    def is_available(self):
+        return shutil.which('pdftotext') is not None and shutil.which('pdfinfo') is not None
+
+    def _run(self, file, args, trailing_args=()):
+        # Poppler czyta z pliku - zapisujemy strumień do pliku tymczasowego
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as pdf_file:
+            shutil.copyfileobj(file, pdf_file)
+            pdf_file.flush()
+            result = subprocess.run(args + [pdf_file.name, *trailing_args],
+                                    capture_output=True, timeout=PDFTOTEXT_TIMEOUT, check=True)
+        return result.stdout.decode('utf-8', errors='replace')
+
+    def page_count(self, file):
+        for line in self._run(file, ['pdfinfo']).splitlines():
+            if line.startswith('Pages:'):
+                return int(line.split(':', 1)[1])
+        return None
+
+    def extract_pages(self, file, start=0, stop=None):
+        args = ['pdftotext', '-enc', 'UTF-8', '-f', str(start + 1)]
+        if stop is not None:
+            if stop <= start:
+                return []
+            args += ['-l', str(stop)]
+        # Strony są rozdzielone znakiem form feed (także po ostatniej)
+        page_texts = self._run(file, args, trailing_args=('-', )).split('\f')
+        return page_texts[:-1] if page_texts and not page_texts[-1].strip() else page_texts
+
+
+BACKENDS = {backend.name: backend for backend in (
+    PdftotextBackend(), PypdfBackend(), PyPDF2Backend(), PdfminerBackend())}
+
+
+def get_backends(names=None):
+    """
+    Return installed backends in the configured order
+
+    Args:
+        names (str/list): Backend names (default PDF_EXTRACTION_BACKENDS)
+
+    Returns:
+        list: ExtractionBackend instances that are available here
+    """
+    if names is None:
+        names = PDF_EXTRACTION_BACKENDS
+    if isinstance(names, str):
+        names = [name.strip().lower() for name in names.split(',') if name.strip()]
+    return [BACKENDS[name] for name in names if name in BACKENDS and BACKENDS[name].is_available()]
+
+
+def text_quality(text):
+    """
+    Heuristic quality of extracted text (no reference text needed)
+
+    Penalises replacement/control characters, pdfminer "(cid:N)" glyphs,
+    text made mostly of symbols and words glued together without spaces.
+
+    Args:
+        text (str): Extracted text
+
+    Returns:
+        float: Score from 0 (empty or garbage) to 1
+    """
+    if not text or not text.strip():
+        return 0.0
+    total = len(text)
+    bad = text.count('\ufffd') + text.count('(cid:') * 6
+    bad += sum(1 for ch in text if ch not in '\n\r\t\f'
+               and unicodedata.category(ch) in ('Cc', 'Co', 'Cs', 'Cn'))
+    letters = sum(1 for ch in text if ch.isalpha())
+    spaces = sum(1 for ch in text if ch.isspace())
+
+    score = max(0.0, 1 - bad / total)
+    if letters / total < 0.4:
+        score *= letters / total / 0.4
+    if spaces / total < 0.05:
+        score *= 0.5
+    return round(score, 3)
+
+
+def _extract_with_fallback(file, start=0, stop=None, backends=None):
+    """Try backends in order; escalate on failure, empty or garbled output"""
+    best_pages, best_quality = None, -1.0
+    for backend in get_backends(backends):
+        file.seek(0)
+        try:
+            page_texts = backend.extract_pages(file, start, stop)
+        except MemoryError:
+            raise
+        except Exception as e:
+            logger.warning(f"Backend PDF {backend.name} zawiódł: {str(e)}")
+            continue
+        if page_texts is None:
+            continue
+
+        quality = text_quality('\n'.join(page_texts))
+        if quality >= PDF_MIN_TEXT_QUALITY:
+            return page_texts
+        logger.warning(f"Backend PDF {backend.name}: słaba jakość tekstu ({quality:.2f}) - próbuję kolejnego")
+        if quality > best_quality:
+            best_pages, best_quality = page_texts, quality
+    return best_pages
+
+
+def join_page_texts(page_texts):
+    """
+    Join per-page texts (in page order) into the final cleaned CV text
+
+    Args:
+        page_texts (list): Text of each page
+
+    Returns:
+        str: Cleaned text or None if no page contained text
+    """
+    text = "\n".join(page_text for page_text in page_texts if page_text).strip()
+
+    if not text:
+        logger.error("Nie udało się wyodrębnić tekstu z PDF")
+        return None
+
+    # Basic text cleanup
+    text = clean_extracted_text(text)
+
+    logger.info(
+        f"Pomyślnie wyodrębniono tekst z PDF (długość: {len(text)} znaków)"
+    )
+    return text
+
+
+def _line_key(line):
+    # Ten sam nagłówek/stopka z innym numerem strony ma ten sam klucz
+    return re.sub(r"\d+", "#", re.sub(r"\s+", " ", line.strip().lower()))
+
+
+def strip_page_boilerplate(page_texts):
+    """
+    Remove per-page boilerplate before the text goes into prompts
+
+    Drops page numbers, the RODO/GDPR consent clause (from its first line to
+    the end of the page or the next heading) and headers/footers: lines in
+    the first/last PAGE_EDGE_LINES lines of at least PDF_REPEATED_LINE_SHARE
+    of the pages. The first occurrence of a repeated line is kept, so e.g.
+    the name stays once.
+
+    Args:
+        page_texts (list): Text of each page
+
+    Returns:
+        tuple: (list of page texts without boilerplate, list of removed lines)
+    """
+    pages = [[line.strip() for line in (page_text or "").split('\n') if line.strip()]
+             for page_text in page_texts]
+
+    def is_edge(lines, index):
+        return index < PAGE_EDGE_LINES or index >= len(lines) - PAGE_EDGE_LINES
+
+    repeated = set()
+    if len(pages) >= 2:
+        page_counts = {}
+        for lines in pages:
+            edge_keys = {_line_key(line) for index, line in enumerate(lines)
+                         if is_edge(lines, index) and len(line) <= REPEATED_LINE_MAX_LENGTH}
+            for key in edge_keys:
+                page_counts[key] = page_counts.get(key, 0) + 1
+        min_pages = max(2, PDF_REPEATED_LINE_SHARE * len(pages))
+        repeated = {key for key, count in page_counts.items() if count >= min_pages}
+
+    removed, seen, cleaned_pages = [], set(), []
+    for lines in pages:
+        kept, in_consent = [], False
+        for index, line in enumerate(lines):
+            key = _line_key(line)
+            if in_consent and is_heading(line):
+                in_consent = False
+            if in_consent or CONSENT_CLAUSE.search(line):
+                in_consent = True
+                removed.append(line)
+            elif PAGE_NUMBER.match(line):
+                removed.append(line)
+            elif key in repeated and key in seen and is_edge(lines, index):
+                removed.append(line)
+            else:
+                kept.append(line)
+                seen.add(key)
+        cleaned_pages.append('\n'.join(kept))
+    return cleaned_pages, removed
+
+
+def build_document(page_texts):
+    """
+    Build the display text and the prompt text of a CV from its pages
+
+    Args:
+        page_texts (list): Text of each page
+
+    Returns:
+        dict: 'text' (full cleaned text for display), 'prompt_text' (without
+            headers, footers, page numbers and consent clauses) and
+            'boilerplate' (removed lines); None if the PDF has no text
+    """
+    text = join_page_texts(page_texts)
+    if not text:
+        return None
+
+    prompt_pages, boilerplate = strip_page_boilerplate(page_texts)
+    prompt_text = "\n".join(page for page in prompt_pages if page).strip()
+    prompt_text = clean_extracted_text(prompt_text) if prompt_text else text
+    if boilerplate:
+        saved = 1 - len(prompt_text) / len(text)
+        logger.info(f"🧹 Usunięto {len(boilerplate)} linii nagłówków/stopek/klauzul ({saved:.0%} tekstu)")
+    return {'text': text, 'prompt_text': prompt_text, 'boilerplate': boilerplate}
+
+
+def extract_document(source, backends=None):
+    """
+    Extract a PDF as display text plus prompt text (see build_document)
+
+    Args:
+        source: Path to the PDF file, its bytes or a file-like object
+        backends (str/list): Backend order (default PDF_EXTRACTION_BACKENDS)
+
+    Returns:
+        dict: Result of build_document or None if extraction fails
+    """
+    try:
+        with open_pdf_source(source) as file:
+            page_texts = _extract_with_fallback(file, backends=backends)
+
+        return build_document(page_texts) if page_texts else None
+
+    except MemoryError:
+        raise
+    except Exception as e:
+        logger.error(f"Błąd podczas ekstrakcji tekstu z PDF: {str(e)}")
+        return None
+
+
+def extract_text_from_pdf(source, backends=None):
     """
     Extract text from PDF file
     
     Args:
-        file_path (str): Path to the PDF file
+        source: Path to the PDF file, its bytes or a file-like object
+        backends (str/list): Backend order (default PDF_EXTRACTION_BACKENDS)
     
     Returns:
         str: Extracted text from PDF or None if extraction fails
     """
     try:
-        text = ""
+        with open_pdf_source(source) as file:
+            page_texts = _extract_with_fallback(file, backends=backends)
 
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
+        return join_page_texts(page_texts) if page_texts else None
 
-            # Check if PDF is encrypted
-            if pdf_reader.is_encrypted:
-                logger.warning(
-                    "PDF jest zaszyfrowany - próba otworzenia bez hasła")
-                try:
-                    pdf_reader.decrypt('')
-                except:
-                    logger.error("Nie udało się otworzyć zaszyfrowanego PDF")
-                    return None
+    except MemoryError:
+        # Limit pamięci piaskownicy (utils/pdf_sandbox.py) - nie maskujemy go jako "brak tekstu"
+        raise
+    except Exception as e:
+        logger.error(f"Błąd podczas ekstrakcji tekstu z PDF: {str(e)}")
+        return None
 
-            # Extract text from all pages
-            for page_num in range(len(pdf_reader.pages)):
-                try:
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
 
-                    if page_text:
-                        text += page_text + "\n"
-                        logger.debug(
-                            f"Wyodrębniono tekst ze strony {page_num + 1}")
+def count_pdf_pages(source):
+    """
+    Count pages of a PDF without extracting any text
 
-                except Exception as e:
-                    logger.warning(
-                        f"Błąd odczytywania strony {page_num + 1}: {str(e)}")
-                    continue
+    Args:
+        source: Path to the PDF file, its bytes or a file-like object
 
-        # Clean up the text
-        text = text.strip()
+    Returns:
+        int: Number of pages or None if the file cannot be opened
+    """
+    with open_pdf_source(source) as file:
+        for backend in get_backends():
+            file.seek(0)
+            try:
+                page_count = backend.page_count(file)
+            except MemoryError:
+                raise
+            except Exception as e:
+                logger.warning(f"Backend PDF {backend.name} nie odczytał liczby stron: {str(e)}")
+                continue
+            if page_count is not None:
+                return page_count
+    logger.error("Błąd odczytu liczby stron PDF")
+    return None
 
-        if not text:
-            logger.error("Nie udało się wyodrębnić tekstu z PDF")
-            return None
 
-        # Basic text cleanup
-        text = clean_extracted_text(text)
+def extract_page_range(source, start, stop):
+    """
+    Extract raw text of pages [start, stop) - one chunk of a parallel extraction
 
-        logger.info(
-            f"Pomyślnie wyodrębniono tekst z PDF (długość: {len(text)} znaków)"
-        )
-        return text
+    Args:
+        source: Path to the PDF file, its bytes or a file-like object
+        start (int): First page (0-based)
+        stop (int): Page after the last one
 
+    Returns:
+        list: Text of each page (join with join_page_texts) or None on failure
+    """
+    try:
+        with open_pdf_source(source) as file:
+            return _extract_with_fallback(file, start, stop)
+    except MemoryError:
+        raise
     except Exception as e:
-        logger.error(f"Błąd podczas ekstrakcji tekstu z PDF: {str(e)}")
+        logger.error(f"Błąd ekstrakcji stron {start + 1}-{stop} z PDF: {str(e)}")
         return None
 
 
@@ -108,34 +532,99 @@ def clean_extracted_text(text):
     return cleaned_text
 
 
-def validate_pdf_file(file_path):
+def sniff_pdf_bytes(data):
     """
-    Validate if file is a proper PDF
-    
+    Byte-level pre-check of an upload - no parsing, safe in the web process
+
+    Looks only at the first and last bytes of the file: the %PDF- header
+    and the startxref/%%EOF trailer that every complete PDF ends with.
+
     Args:
-        file_path (str): Path to the file
-    
+        data (bytes): File content
+
     Returns:
-        bool: True if valid PDF, False otherwise
+        str: Rejection reason (key of PDF_REJECTION_MESSAGES) or None if the
+            file looks like a complete PDF
+    """
+    if not data or b'%PDF-' not in data[:PDF_HEADER_SEARCH_BYTES]:
+        return 'not_pdf'
+    tail = data[-PDF_TRAILER_SEARCH_BYTES:]
+    if b'%%EOF' not in tail or b'startxref' not in tail:
+        return 'truncated'
+    return None
+
+
+def _has_text_resources(page):
+    # Fonts on the page or in a form XObject (which may draw text) mean there is text to extract
+    resources = page.get('/Resources')
+    resources = resources.get_object() if resources is not None else {}
+    if resources.get('/Font'):
+        return True
+    xobjects = resources.get('/XObject')
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+    return any(xobject.get_object().get('/Subtype') == '/Form' for xobject in xobjects.values())
+
+
+def inspect_pdf_structure(source):
+    """
+    Structural pre-check from the trailer and the page tree - no content streams
+
+    Opens the document with PyPDF2 (xref and trailer only), tries an empty
+    password on encrypted files, counts pages and checks page resources for
+    fonts. A file whose pages carry no fonts is an image-only scan and will
+    never yield text.
+
+    Args:
+        source: Path to the PDF file, its bytes or a file-like object
+
+    Returns:
+        tuple: (rejection reason or None, page count or None if PyPDF2 could
+            not read the structure - other backends may still manage)
     """
     try:
-        with open(file_path, 'rb') as file:
-            # Check if file starts with PDF header
-            header = file.read(4)
-            if header != b'%PDF':
-                logger.error("Plik nie ma poprawnego nagłówka PDF")
-                return False
-
-            # Try to read with PyPDF2
-            file.seek(0)
-            pdf_reader = PyPDF2.PdfReader(file)
+        with open_pdf_source(source) as file:
+            pdf_reader = PyPDF2.PdfReader(file, strict=False)
+            if pdf_reader.is_encrypted:
+                try:
+                    if not pdf_reader.decrypt(''):
+                        return 'encrypted', None
+                except Exception:
+                    # E.g. AES without the crypto dependency - unreadable either way
+                    return 'encrypted', None
 
-            # Check if we can get number of pages
             page_count = len(pdf_reader.pages)
-            logger.debug(f"Plik PDF zawiera {page_count} stron")
-
-            return page_count > 0
+            if page_count == 0:
+                return 'no_pages', 0
+            if page_count > PDF_MAX_PAGES:
+                return 'too_many_pages', page_count
+            if not any(_has_text_resources(page) for page in pdf_reader.pages):
+                return 'no_text', page_count
+            return None, page_count
 
+    except MemoryError:
+        raise
     except Exception as e:
-        logger.error(f"Błąd walidacji pliku PDF: {str(e)}")
-        return False
+        logger.warning(f"PyPDF2 nie odczytał struktury PDF: {str(e)}")
+        return None, None
+
+
+def validate_pdf_file(source):
+    """
+    Validate that a file can yield text before running a full extraction
+
+    Args:
+        source: Path to the file, its bytes or a file-like object
+
+    Returns:
+        tuple: (True, None) if the file passes, otherwise (False, reason)
+            with reason a key of PDF_REJECTION_MESSAGES
+    """
+    with open_pdf_source(source) as file:
+        data = file.read()
+
+    reason = sniff_pdf_bytes(data)
+    if reason is None:
+        reason, _ = inspect_pdf_structure(data)
+    if reason:
+        logger.info(f"Odrzucono plik PDF przed ekstrakcją: {reason}")
+    return reason is None, reason
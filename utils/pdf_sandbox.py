@@ -0,0 +1,407 @@
+import os
+import sys
+import signal
+import atexit
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+
+try:
+    import resource
+except ImportError:  # Windows - brak rlimitów, ekstrakcja w procesie web
+    resource = None
+
+from utils.pdf_extraction import (PDF_REJECTION_MESSAGES, build_document, extract_document,
+                                  extract_page_range, extract_text_from_pdf, inspect_pdf_structure,
+                                  open_pdf_source, sniff_pdf_bytes, validate_pdf_file)
+
+logger = logging.getLogger(__name__)
+
+# Ekstrakcja PDF w osobnych procesach z limitami zasobów (0 = w wątku zapytania)
+PDF_SANDBOX_ENABLED = os.environ.get("PDF_SANDBOX_ENABLED", "1") != "0"
+PDF_SANDBOX_WORKERS = int(os.environ.get("PDF_SANDBOX_WORKERS", 2))
+# Limit czasu rzeczywistego na jedno zadanie - po nim proces jest zabijany
+PDF_SANDBOX_TIMEOUT = float(os.environ.get("PDF_SANDBOX_TIMEOUT", 20))
+# Limit czasu procesora na jedno zadanie (RLIMIT_CPU, sekundy)
+PDF_SANDBOX_CPU_SECONDS = int(os.environ.get("PDF_SANDBOX_CPU_SECONDS", 10))
+# Limit pamięci procesu (RLIMIT_AS, MB; 0 = bez limitu)
+PDF_SANDBOX_MEMORY_MB = int(os.environ.get("PDF_SANDBOX_MEMORY_MB", 512))
+# Po ilu zadaniach proces jest wymieniany na nowy
+PDF_SANDBOX_MAX_TASKS = int(os.environ.get("PDF_SANDBOX_MAX_TASKS", 50))
+# Jak długo zapytanie czeka na wolny proces, zanim dostanie odpowiedź "zajęte"
+PDF_SANDBOX_QUEUE_TIMEOUT = float(os.environ.get("PDF_SANDBOX_QUEUE_TIMEOUT", 10))
+# Od ilu stron strony są dzielone między procesy puli (próg z scripts/benchmark_pdf_extraction.py)
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 8))
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PDFExtractionError(Exception):
+    """Ekstrakcja PDF przerwana przez piaskownicę"""
+
+    reason = 'error'
+    message = 'Nie udało się przetworzyć pliku PDF'
+
+    def __init__(self, reason=None, message=None):
+        self.reason = reason or self.reason
+        super().__init__(message or self.message)
+
+
+class PDFExtractionTimeout(PDFExtractionError):
+    """Przekroczony czas przetwarzania albo brak wolnego procesu"""
+
+    reason = 'timeout'
+    message = 'Przetwarzanie pliku PDF trwało zbyt długo. Spróbuj mniejszego pliku.'
+
+
+class PDFResourceLimitExceeded(PDFExtractionError):
+    """Plik przekroczył limit czasu procesora albo pamięci"""
+
+    reason = 'memory'
+    message = 'Plik PDF jest zbyt złożony do przetworzenia. Spróbuj wyeksportować go ponownie.'
+
+
+class PDFRejected(PDFExtractionError):
+    """Plik odrzucony przed ekstrakcją - nie da się z niego uzyskać tekstu"""
+
+    reason = 'not_pdf'
+
+    def __init__(self, reason=None, message=None):
+        reason = reason or self.reason
+        super().__init__(reason, message or PDF_REJECTION_MESSAGES.get(reason))
+
+
+class _CPUTimeExceeded(BaseException):
+    # BaseException, żeby nie złapały go ogólne `except Exception` w ekstrakcji
+    pass
+
+
+def _validate_and_extract(payload):
+    # Najpierw tania kontrola struktury (szyfrowanie, drzewo stron, fonty), potem:
+    # krótki dokument od razu w całości, dla długiego tylko liczba stron do podziału
+    data, min_pages = payload
+    reason, page_count = inspect_pdf_structure(data)
+    if reason:
+        return ('rejected', reason)
+    if page_count is None or min_pages is None or page_count < min_pages:
+        # page_count None - PyPDF2 nie odczytał struktury, próbują kolejne backendy
+        return ('document', extract_document(data))
+    return ('pages', page_count)
+
+
+def _extract_pages(payload):
+    data, start, stop = payload
+    return extract_page_range(data, start, stop)
+
+
+# Zadania dostępne w procesie piaskownicy: nazwa -> funkcja(payload)
+TASKS = {
+    'extract_text': extract_text_from_pdf,
+    'extract_document': extract_document,
+    'validate_and_extract': _validate_and_extract,
+    'extract_pages': _extract_pages,
+}
+
+
+# --- Proces piaskownicy ---
+
+
+def _on_cpu_limit(signum, frame):
+    raise _CPUTimeExceeded()
+
+
+def _apply_memory_limit():
+    if resource is None or PDF_SANDBOX_MEMORY_MB <= 0:
+        return
+    limit = PDF_SANDBOX_MEMORY_MB * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _set_cpu_budget(seconds):
+    """Ustawia miękki RLIMIT_CPU na `seconds` od teraz (None = bez limitu)"""
+    if resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds is None:
+        soft = hard
+    else:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _run_task(task, payload):
+    _set_cpu_budget(PDF_SANDBOX_CPU_SECONDS)
+    try:
+        return ('ok', TASKS[task](payload))
+    except _CPUTimeExceeded:
+        return ('cpu', None)
+    except MemoryError:
+        return ('memory', None)
+    except Exception as e:
+        return ('error', str(e))
+    finally:
+        _set_cpu_budget(None)
+
+
+def worker_main(read_fd, write_fd):
+    """Pętla procesu piaskownicy: odbiera (zadanie, bajty PDF), odsyła wynik"""
+    logging.basicConfig(level=logging.WARNING)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    _apply_memory_limit()
+
+    requests_conn = Connection(read_fd, writable=False)
+    results_conn = Connection(write_fd, readable=False)
+    while True:
+        try:
+            task, payload = requests_conn.recv()
+        except EOFError:
+            # Proces web zamknął potok - koniec pracy
+            break
+        results_conn.send(_run_task(task, payload))
+
+
+# --- Strona procesu web ---
+
+
+class _SandboxWorker:
+
+    def __init__(self):
+        requests_read, requests_write = os.pipe()
+        results_read, results_write = os.pipe()
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, env.get('PYTHONPATH')]))
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, '-m', 'utils.pdf_sandbox',
+                 str(requests_read), str(results_write)],
+                pass_fds=(requests_read, results_write),
+                cwd=ROOT_DIR,
+                env=env,
+                stdin=subprocess.DEVNULL)
+        finally:
+            os.close(requests_read)
+            os.close(results_write)
+        self.requests = Connection(requests_write, readable=False)
+        self.results = Connection(results_read, writable=False)
+        self.tasks_done = 0
+
+    def call(self, task, payload, timeout):
+        self.requests.send((task, payload))
+        if not self.results.poll(timeout):
+            raise PDFExtractionTimeout()
+        self.tasks_done += 1
+        return self.results.recv()
+
+    def close(self):
+        # Zamknięcie potoku kończy pętlę procesu; zawieszony proces zabijamy
+        for conn in (self.requests, self.results):
+            conn.close()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+        for conn in (self.requests, self.results):
+            if not conn.closed:
+                conn.close()
+
+
+class PDFSandboxPool:
+    """
+    Pula procesów do parsowania PDF
+
+    Każde zadanie dostaje limit czasu rzeczywistego (po nim proces jest
+    zabijany), limit czasu procesora (RLIMIT_CPU) i pamięci (RLIMIT_AS).
+    Procesy są uruchamiane leniwie i wymieniane po `max_tasks` zadaniach
+    albo po przekroczeniu limitu.
+    """
+
+    def __init__(self, workers=PDF_SANDBOX_WORKERS, max_tasks=PDF_SANDBOX_MAX_TASKS):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers)
+
+    def _take_worker(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return _SandboxWorker()
+
+    def _release_worker(self, worker):
+        if worker.tasks_done >= self.max_tasks:
+            worker.close()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def run(self, task, payload, timeout=PDF_SANDBOX_TIMEOUT):
+        """
+        Wykonuje zadanie w procesie piaskownicy
+
+        Args:
+            task (str): Nazwa zadania z TASKS
+            payload (bytes): Zawartość pliku PDF
+            timeout (float): Limit czasu rzeczywistego (s)
+
+        Returns:
+            Wynik funkcji zadania
+
+        Raises:
+            PDFExtractionTimeout: Przekroczony czas albo brak wolnego procesu
+            PDFResourceLimitExceeded: Przekroczony limit procesora/pamięci
+            PDFExtractionError: Proces piaskownicy zakończył się błędem
+        """
+        if os.getpid() != self._pid:
+            # Proces po fork() (np. gunicorn --preload) - nie dzielimy potoków z rodzicem
+            self._reset()
+
+        if not self._slots.acquire(timeout=PDF_SANDBOX_QUEUE_TIMEOUT):
+            raise PDFExtractionTimeout(
+                'busy', 'Serwer przetwarza teraz zbyt wiele plików. Spróbuj ponownie za chwilę.')
+        try:
+            worker = self._take_worker()
+            try:
+                status, value = worker.call(task, payload, timeout)
+            except PDFExtractionTimeout:
+                logger.warning(f"⏱️ Ekstrakcja PDF przekroczyła {timeout:.0f} s - zabijam proces {worker.process.pid}")
+                worker.kill()
+                raise
+            except (EOFError, OSError) as e:
+                logger.error(f"💥 Proces piaskownicy PDF {worker.process.pid} zakończył się: {str(e)}")
+                worker.kill()
+                raise PDFExtractionError('crashed')
+
+            if status == 'ok':
+                self._release_worker(worker)
+                return value
+
+            # Po przekroczeniu limitu stan procesu jest niepewny - wymieniamy go
+            worker.close()
+            if status == 'cpu':
+                logger.warning(f"⛔ Ekstrakcja PDF przekroczyła limit CPU ({PDF_SANDBOX_CPU_SECONDS} s)")
+                raise PDFResourceLimitExceeded('cpu')
+            if status == 'memory':
+                logger.warning(f"⛔ Ekstrakcja PDF przekroczyła limit pamięci ({PDF_SANDBOX_MEMORY_MB} MB)")
+                raise PDFResourceLimitExceeded('memory')
+            logger.error(f"❌ Błąd ekstrakcji PDF w piaskownicy: {value}")
+            raise PDFExtractionError()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+pdf_sandbox = PDFSandboxPool()
+atexit.register(pdf_sandbox.shutdown)
+
+
+def _extract_parallel(pool, data, page_count):
+    chunks = min(pool.workers, page_count)
+    bounds = [(page_count * i // chunks, page_count * (i + 1) // chunks) for i in range(chunks)]
+    with ThreadPoolExecutor(max_workers=chunks, thread_name_prefix='pdf-pages') as executor:
+        futures = [executor.submit(pool.run, 'extract_pages', (data, start, stop))
+                   for start, stop in bounds]
+        results = [future.result() for future in futures]
+    if any(page_texts is None for page_texts in results):
+        return None
+    return build_document([page_text for page_texts in results for page_text in page_texts])
+
+
+def extract_document_sandboxed(source, pool=None, parallel_min_pages=None):
+    """
+    Wyodrębnia tekst z PDF w procesie piaskownicy (wynik build_document)
+
+    Plik przechodzi najpierw szybkie odrzucenie: nagłówek i trailer są
+    sprawdzane na bajtach w procesie web, a szyfrowanie, liczba stron i
+    fonty na stronach - w piaskownicy przed ekstrakcją treści.
+
+    Dokumenty od `parallel_min_pages` stron są dzielone na zakresy stron
+    przetwarzane równolegle przez procesy puli i łączone w kolejności;
+    krótsze są parsowane w jednym procesie.
+
+    Args:
+        source: Ścieżka, bajty albo obiekt plikowy z PDF
+        pool (PDFSandboxPool): Pula procesów (domyślnie wspólna pdf_sandbox)
+        parallel_min_pages (int): Próg równoległej ekstrakcji (domyślnie PDF_PARALLEL_MIN_PAGES)
+
+    Returns:
+        dict: 'text', 'prompt_text' i 'boilerplate' albo None, jeśli nie
+            udało się wyodrębnić tekstu
+
+    Raises:
+        PDFRejected: Plik nie jest PDF, jest uszkodzony, zaszyfrowany albo
+            nie zawiera tekstu
+        PDFExtractionError: Plik przekroczył limity albo piaskownica zawiodła
+    """
+    with open_pdf_source(source) as file:
+        data = file.read()
+
+    if not PDF_SANDBOX_ENABLED or resource is None:
+        is_valid, reason = validate_pdf_file(data)
+        if not is_valid:
+            raise PDFRejected(reason)
+        return extract_document(data)
+
+    # Bez parsowania - odrzuca pliki o innym formacie i ucięte w milisekundach
+    reason = sniff_pdf_bytes(data)
+    if reason:
+        raise PDFRejected(reason)
+
+    pool = pool or pdf_sandbox
+    min_pages = parallel_min_pages or PDF_PARALLEL_MIN_PAGES
+    # Na jednym rdzeniu podział stron tylko dokłada narzut - zawsze szeregowo
+    if pool.workers < 2 or (os.cpu_count() or 1) < 2:
+        min_pages = None
+    kind, value = pool.run('validate_and_extract', (data, min_pages))
+    if kind == 'rejected':
+        raise PDFRejected(value)
+    if kind == 'document':
+        return value
+    logger.info(f"📄 Równoległa ekstrakcja PDF: {value} stron, {min(pool.workers, value)} procesy")
+    return _extract_parallel(pool, data, value)
+
+
+def extract_text_sandboxed(source, pool=None, parallel_min_pages=None):
+    """
+    Wyodrębnia tekst z PDF w procesie piaskownicy
+
+    Args:
+        source: Ścieżka, bajty albo obiekt plikowy z PDF
+        pool (PDFSandboxPool): Pula procesów (domyślnie wspólna pdf_sandbox)
+        parallel_min_pages (int): Próg równoległej ekstrakcji
+
+    Returns:
+        str: Tekst z PDF albo None, jeśli nie udało się go wyodrębnić
+
+    Raises:
+        PDFExtractionError: Plik przekroczył limity albo piaskownica zawiodła
+    """
+    document = extract_document_sandboxed(source, pool, parallel_min_pages)
+    return document['text'] if document else None
+
+
+if __name__ == '__main__':
+    worker_main(int(sys.argv[1]), int(sys.argv[2]))
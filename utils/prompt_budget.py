@@ -0,0 +1,223 @@
+import os
+import re
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Okno kontekstu modelu (qwen-2.5-72b-instruct) i limit odpowiedzi
+MODEL_CONTEXT_TOKENS = int(os.environ.get("MODEL_CONTEXT_TOKENS", 32768))
+RESPONSE_MAX_TOKENS = int(os.environ.get("RESPONSE_MAX_TOKENS", 1500))
+# Prompt systemowy i instrukcje szablonu (bez CV i opisu stanowiska)
+PROMPT_TEMPLATE_RESERVE = int(os.environ.get("PROMPT_TEMPLATE_RESERVE", 1200))
+
+# Budżet tokenów na treść (CV + opis stanowiska) dla każdego zadania
+PROMPT_BUDGETS = {
+    'optimize_cv': int(os.environ.get("PROMPT_BUDGET_OPTIMIZE_CV", 4000)),
+    'analyze_cv': int(os.environ.get("PROMPT_BUDGET_ANALYZE_CV", 4000)),
+    'cover_letter': int(os.environ.get("PROMPT_BUDGET_COVER_LETTER", 2000)),
+    'interview_questions': int(
+        os.environ.get("PROMPT_BUDGET_INTERVIEW_QUESTIONS", 2000)),
+    'skills_gap': int(os.environ.get("PROMPT_BUDGET_SKILLS_GAP", 2000)),
+}
+DEFAULT_PROMPT_BUDGET = 2000
+
+# Maksymalna część budżetu dla opisu stanowiska (resztę dostaje CV)
+JOB_DESCRIPTION_SHARE = 0.3
+
+# Przybliżona liczba znaków na token dla tekstu polskiego (tokenizer Qwen)
+CHARS_PER_TOKEN = 3
+
+TRUNCATION_MARKER = "[...]"
+
+# Klauzula zgody na przetwarzanie danych - bez wartości dla modelu
+CONSENT_CLAUSE = re.compile(
+    r"(wyrażam zgodę na przetwarzanie|zgodnie z rozporządzeniem|\bRODO\b|"
+    r"i hereby (give )?consent|consent to the processing)", re.IGNORECASE)
+
+# Sekcje CV o najmniejszej wartości - usuwane w tej kolejności
+LOW_VALUE_SECTIONS = [
+    re.compile(r"^(referencje|references)\b", re.IGNORECASE),
+    re.compile(r"^(zainteresowania|hobby|pasje|interests|hobbies)\b",
+               re.IGNORECASE),
+]
+
+# Linia nagłówka sekcji: krótka, bez kropki na końcu, WIELKIMI literami
+# albo zakończona dwukropkiem
+_HEADING = re.compile(r"^[^\W\d_][^.!?]{1,40}:?$")
+
+
+def estimate_tokens(text):
+    """
+    Szacuje liczbę tokenów tekstu bez wywoływania tokenizera
+
+    Args:
+        text (str): Tekst promptu
+
+    Returns:
+        int: Przybliżona liczba tokenów (zaokrąglona w górę)
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def normalize_whitespace(text):
+    """Usuwa nadmiarowe spacje i puste linie (często ponad 10% tekstu z PDF)"""
+    if not text:
+        return ""
+    text = re.sub(r"[ \t\u00a0]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def is_heading(line):
+    """Czy linia wygląda na nagłówek sekcji CV (krótka, WIELKIMI literami albo z dwukropkiem)"""
+    line = line.strip()
+    if not line or not _HEADING.match(line):
+        return False
+    return line.isupper() or line.endswith(':')
+
+
+def split_sections(text):
+    """
+    Dzieli tekst CV na sekcje według linii nagłówków
+
+    Returns:
+        list: Lista sekcji (tekst sekcji zaczyna się od nagłówka)
+    """
+    sections = []
+    current = []
+    for line in text.split('\n'):
+        if is_heading(line) and current:
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return sections
+
+
+def _low_value_rank(section):
+    """Zwraca pozycję sekcji na liście do usunięcia albo None"""
+    first_line = section.strip().split('\n', 1)[0]
+    for rank, pattern in enumerate(LOW_VALUE_SECTIONS):
+        if pattern.search(first_line):
+            return rank
+    return None
+
+
+def strip_consent_clause(text):
+    """
+    Usuwa klauzulę zgody na przetwarzanie danych osobowych
+
+    Klauzula rzadko ma własny nagłówek, więc usuwany jest akapit od linii
+    z jej początkiem do pustej linii, nagłówka albo końca tekstu.
+    """
+    lines = text.split('\n')
+    for start, line in enumerate(lines):
+        if CONSENT_CLAUSE.search(line):
+            break
+    else:
+        return text
+
+    end = start + 1
+    while end < len(lines) and lines[end].strip() and not is_heading(lines[end]):
+        end += 1
+    return '\n'.join(lines[:start] + lines[end:]).strip()
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Przycina tekst do budżetu na granicy linii (lub słowa)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER) - 1)
+    cut = text[:limit]
+    boundary = cut.rfind('\n')
+    if boundary < limit // 2:
+        boundary = cut.rfind(' ')
+    if boundary > 0:
+        cut = cut[:boundary]
+    return f"{cut.rstrip()}\n{TRUNCATION_MARKER}"
+
+
+def fit_text(text, max_tokens):
+    """
+    Dopasowuje tekst do budżetu tokenów
+
+    Kolejno: normalizacja białych znaków, usunięcie sekcji o niskiej wartości
+    (klauzula RODO, referencje, zainteresowania), a na końcu przycięcie.
+
+    Args:
+        text (str): Tekst CV lub opisu stanowiska
+        max_tokens (int): Budżet tokenów
+
+    Returns:
+        str: Tekst mieszczący się w budżecie
+    """
+    text = normalize_whitespace(text)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    text = strip_consent_clause(text)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sections = split_sections(text)
+    ranked = sorted(
+        ((rank, index) for index, rank in enumerate(map(_low_value_rank, sections))
+         if rank is not None))
+    dropped = set()
+    for _, index in ranked:
+        dropped.add(index)
+        remaining = '\n'.join(s for i, s in enumerate(sections) if i not in dropped)
+        if estimate_tokens(remaining) <= max_tokens:
+            return remaining
+
+    remaining = '\n'.join(s for i, s in enumerate(sections) if i not in dropped)
+    return truncate_to_tokens(remaining, max_tokens)
+
+
+def prompt_budget(task_type, max_tokens=RESPONSE_MAX_TOKENS):
+    """
+    Zwraca budżet tokenów na treść promptu dla zadania
+
+    Budżet zadania jest ograniczany tak, żeby prompt razem z odpowiedzią
+    (`max_tokens`) zmieścił się w oknie kontekstu modelu.
+    """
+    budget = PROMPT_BUDGETS.get(task_type, DEFAULT_PROMPT_BUDGET)
+    available = MODEL_CONTEXT_TOKENS - max_tokens - PROMPT_TEMPLATE_RESERVE
+    return max(0, min(budget, available))
+
+
+def pack_prompt_inputs(task_type, cv_text, job_description="",
+                       max_tokens=RESPONSE_MAX_TOKENS):
+    """
+    Pakuje CV i opis stanowiska w budżet tokenów zadania
+
+    Opis stanowiska dostaje co najwyżej JOB_DESCRIPTION_SHARE budżetu,
+    niewykorzystana część przechodzi na CV.
+
+    Args:
+        task_type (str): Typ zadania (klucz PROMPT_BUDGETS)
+        cv_text (str): Tekst CV
+        job_description (str): Opis stanowiska
+        max_tokens (int): Limit tokenów odpowiedzi
+
+    Returns:
+        tuple: (cv_text, job_description) po dopasowaniu
+    """
+    budget = prompt_budget(task_type, max_tokens)
+
+    job_description = fit_text(job_description or "",
+                               int(budget * JOB_DESCRIPTION_SHARE))
+    cv_budget = budget - estimate_tokens(job_description)
+    packed_cv = fit_text(cv_text or "", cv_budget)
+
+    original = estimate_tokens(cv_text or "")
+    packed = estimate_tokens(packed_cv)
+    if packed < original:
+        logger.info(f"✂️ CV dopasowane do budżetu {task_type}: ~{original} -> ~{packed} tokenów")
+    return packed_cv, job_description
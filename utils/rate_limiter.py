@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+
+from utils.sqlite_store import get_connection, state_path
+from utils.retry_policy import parse_retry_after
+from utils.prompt_budget import estimate_tokens as estimate_text_tokens
+
+logger = logging.getLogger(__name__)
+
+# Limity klienta OpenRouter wspólne dla wszystkich workerów (0 = bez limitu)
+OPENROUTER_REQUESTS_PER_MINUTE = float(
+    os.environ.get("OPENROUTER_REQUESTS_PER_MINUTE", 20))
+OPENROUTER_TOKENS_PER_MINUTE = float(
+    os.environ.get("OPENROUTER_TOKENS_PER_MINUTE", 60000))
+# Jak długo zapytanie może czekać w kolejce na wolny limit, zanim dostanie
+# odpowiedź "zajęte"
+OPENROUTER_RATE_LIMIT_MAX_WAIT = float(
+    os.environ.get("OPENROUTER_RATE_LIMIT_MAX_WAIT", 30))
+# Przerwa po 429 bez nagłówka Retry-After
+OPENROUTER_RATE_LIMIT_PENALTY = float(
+    os.environ.get("OPENROUTER_RATE_LIMIT_PENALTY", 10))
+RATE_LIMIT_PATH = os.environ.get("OPENROUTER_RATE_LIMIT_PATH")
+
+
+class RateLimitExceeded(Exception):
+    """Limit zapytań wyczerpany - zapytanie nie zostało wysłane"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(
+            f"Limit zapytań do AI wyczerpany - spróbuj ponownie za {retry_after:.0f} s")
+
+
+def estimate_tokens(payload):
+    """
+    Szacuje koszt zapytania w tokenach
+
+    Args:
+        payload (dict): Treść zapytania do OpenRouter
+
+    Returns:
+        int: Tokeny promptu (z długości wiadomości) plus limit odpowiedzi
+    """
+    messages = json.dumps(payload.get('messages', []), ensure_ascii=False)
+    return estimate_text_tokens(messages) + int(payload.get('max_tokens') or 0)
+
+
+class TokenBucketLimiter:
+    """
+    Limiter typu token bucket współdzielony przez procesy (SQLite)
+
+    Dwa kubełki: zapytania na minutę i tokeny na minutę. Zapytanie zostaje
+    wysłane dopiero, gdy w obu jest miejsce; w przeciwnym razie czeka
+    (maksymalnie `max_wait`) albo dostaje RateLimitExceeded. Po 429 z
+    upstream limiter blokuje wszystkie workery do czasu z Retry-After.
+    """
+
+    def __init__(self,
+                 name,
+                 requests_per_minute=OPENROUTER_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=OPENROUTER_TOKENS_PER_MINUTE,
+                 max_wait=OPENROUTER_RATE_LIMIT_MAX_WAIT,
+                 path=None):
+        self.name = name
+        self.path = path
+        self.max_wait = max_wait
+        # kubełek -> pojemność (= limit na minutę)
+        self.buckets = {
+            f"{name}:requests": requests_per_minute,
+            f"{name}:tokens": tokens_per_minute
+        }
+        self._schema_ready = False
+
+    @property
+    def enabled(self):
+        return any(capacity > 0 for capacity in self.buckets.values())
+
+    def _connection(self):
+        if self.path is None:
+            self.path = RATE_LIMIT_PATH or state_path("rate_limits.db")
+        conn = get_connection(self.path)
+        if not self._schema_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    bucket TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._schema_ready = True
+        return conn
+
+    def _try_acquire(self, costs):
+        """
+        Pobiera `costs` z kubełków, jeśli to możliwe
+
+        Returns:
+            float: 0 gdy pobrano, inaczej liczba sekund do wolnego miejsca
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = {}
+            wait = 0.0
+            for bucket, capacity in self.buckets.items():
+                if capacity <= 0:
+                    continue
+                row = conn.execute(
+                    "SELECT level, updated_at, blocked_until FROM rate_limits "
+                    "WHERE bucket = ?", (bucket, )).fetchone()
+                level, updated_at, blocked_until = row or (capacity, now, 0.0)
+                rate = capacity / 60.0
+                level = min(capacity, level + max(0.0, now - updated_at) * rate)
+                # Koszt większy niż pojemność nigdy by się nie zmieścił
+                cost = min(costs[bucket], capacity)
+                levels[bucket] = (level - cost, blocked_until)
+                wait = max(wait, blocked_until - now)
+                if level < cost:
+                    wait = max(wait, (cost - level) / rate)
+
+            if wait > 0:
+                conn.execute("ROLLBACK")
+                return wait
+
+            for bucket, (level, blocked_until) in levels.items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits "
+                    "(bucket, level, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                    (bucket, level, now, blocked_until))
+            conn.execute("COMMIT")
+            return 0.0
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, tokens, max_wait=None, sleep=time.sleep):
+        """
+        Czeka na miejsce w limicie dla jednego zapytania
+
+        Args:
+            tokens (int): Szacowany koszt zapytania w tokenach
+            max_wait (float): Maksymalny czas oczekiwania (domyślnie `self.max_wait`)
+
+        Raises:
+            RateLimitExceeded: Miejsce nie zwolni się w `max_wait`
+        """
+        if not self.enabled:
+            return
+
+        max_wait = self.max_wait if max_wait is None else max_wait
+        costs = {f"{self.name}:requests": 1, f"{self.name}:tokens": tokens}
+        deadline = time.time() + max_wait
+        logged = False
+        while True:
+            try:
+                wait = self._try_acquire(costs)
+            except sqlite3.Error as e:
+                # Bez współdzielonej tabeli nie blokujemy ruchu
+                logger.warning(f"Błąd limitera zapytań: {str(e)}")
+                return
+            if wait <= 0:
+                return
+
+            if time.time() + wait > deadline:
+                logger.warning(f"⏳ Limit zapytań {self.name} wyczerpany - wolne miejsce za {wait:.1f} s")
+                raise RateLimitExceeded(wait)
+            if not logged:
+                logger.info(f"⏳ Zapytanie czeka {wait:.1f} s na limit {self.name}")
+                logged = True
+            # Jitter, żeby czekające workery nie wracały jednocześnie
+            sleep(wait + random.uniform(0, 0.2))
+
+    def has_capacity(self, requests=1):
+        """
+        Sprawdza bez pobierania, czy w limicie zapytań jest `requests` wolnych miejsc
+
+        Returns:
+            bool: False, gdy kubełek zapytań ma mniej miejsca albo upstream jest wstrzymany
+        """
+        bucket = f"{self.name}:requests"
+        capacity = self.buckets[bucket]
+        if capacity <= 0:
+            return True
+        now = time.time()
+        try:
+            row = self._connection().execute(
+                "SELECT level, updated_at, blocked_until FROM rate_limits "
+                "WHERE bucket = ?", (bucket, )).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd limitera zapytań: {str(e)}")
+            return True
+        level, updated_at, blocked_until = row or (capacity, now, 0.0)
+        level = min(capacity, level + max(0.0, now - updated_at) * capacity / 60.0)
+        return blocked_until <= now and level >= min(requests, capacity)
+
+    def block(self, seconds):
+        """Wstrzymuje zapytania wszystkich workerów na `seconds` (po 429 z upstream)"""
+        if not self.enabled:
+            return
+        until = time.time() + seconds
+        try:
+            conn = self._connection()
+            for bucket, capacity in self.buckets.items():
+                if capacity <= 0:
+                    continue
+                conn.execute(
+                    "INSERT INTO rate_limits (bucket, level, updated_at, blocked_until) "
+                    "VALUES (?, 0, ?, ?) ON CONFLICT(bucket) DO UPDATE SET "
+                    "blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                    (bucket, time.time(), until))
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd limitera zapytań: {str(e)}")
+            return
+        logger.warning(f"⏳ Upstream {self.name} zwrócił 429 - wstrzymuję zapytania na {seconds:.0f} s")
+
+
+openrouter_limiter = TokenBucketLimiter('openrouter')
+
+
+def check_rate_limited(response, limiter=openrouter_limiter):
+    """Przekazuje 429 z upstream do współdzielonego limitera"""
+    if response.status_code == 429:
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        limiter.block(retry_after if retry_after is not None else OPENROUTER_RATE_LIMIT_PENALTY)
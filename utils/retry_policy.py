@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Konfiguracja ponowień zapytań do OpenRouter
+OPENROUTER_MAX_ATTEMPTS = int(os.environ.get("OPENROUTER_MAX_ATTEMPTS", 3))
+OPENROUTER_RETRY_BASE_DELAY = float(os.environ.get("OPENROUTER_RETRY_BASE_DELAY", 1.0))
+OPENROUTER_RETRY_MAX_DELAY = float(os.environ.get("OPENROUTER_RETRY_MAX_DELAY", 20.0))
+OPENROUTER_MAX_RETRY_AFTER = float(os.environ.get("OPENROUTER_MAX_RETRY_AFTER", 30.0))
+OPENROUTER_RETRY_BUDGET = float(os.environ.get("OPENROUTER_RETRY_BUDGET", 90.0))
+
+# Bezpiecznik: po N kolejnych awariach upstream przez cool-down odrzucamy od razu
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("OPENROUTER_CIRCUIT_FAILURES", 5))
+CIRCUIT_COOL_DOWN = float(os.environ.get("OPENROUTER_CIRCUIT_COOL_DOWN", 60.0))
+
+# Kategorie błędów
+RATE_LIMITED = 'rate_limited'  # 429
+SERVER_ERROR = 'server_error'  # 5xx, 408
+TIMEOUT = 'timeout'
+CONNECTION = 'connection'
+INVALID_RESPONSE = 'invalid_response'  # odpowiedź 200 w nieoczekiwanym formacie
+CLIENT_ERROR = 'client_error'  # pozostałe 4xx - ponowienie nic nie da
+
+RETRYABLE_ERRORS = {RATE_LIMITED, SERVER_ERROR, TIMEOUT, CONNECTION, INVALID_RESPONSE}
+# Błędy świadczące o problemach upstream (liczone przez bezpiecznik)
+UPSTREAM_FAILURES = {RATE_LIMITED, SERVER_ERROR, TIMEOUT, CONNECTION}
+
+
+class CircuitOpenError(Exception):
+    """Bezpiecznik jest otwarty - zapytanie odrzucone bez kontaktu z API"""
+
+
+def parse_retry_after(value):
+    """
+    Parsuje nagłówek Retry-After
+
+    Args:
+        value (str): Liczba sekund albo data HTTP
+
+    Returns:
+        float: Liczba sekund do odczekania albo None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_error(error):
+    """
+    Przypisuje wyjątek do kategorii błędu
+
+    Returns:
+        tuple: (kategoria, retry_after) albo (None, None) dla nieznanych wyjątków
+    """
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        retry_after = parse_retry_after(error.response.headers.get('Retry-After'))
+        if status == 429:
+            return RATE_LIMITED, retry_after
+        if status >= 500 or status == 408:
+            return SERVER_ERROR, retry_after
+        return CLIENT_ERROR, None
+    if isinstance(error, requests.exceptions.Timeout):
+        return TIMEOUT, None
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return CONNECTION, None
+    if isinstance(error, (KeyError, IndexError, ValueError, json.JSONDecodeError)):
+        return INVALID_RESPONSE, None
+    if isinstance(error, requests.exceptions.RequestException):
+        return CLIENT_ERROR, None
+    return None, None
+
+
+class RetryPolicy:
+    """Wykładnicze opóźnienia z pełnym jitterem, z poszanowaniem Retry-After"""
+
+    def __init__(self,
+                 max_attempts=OPENROUTER_MAX_ATTEMPTS,
+                 base_delay=OPENROUTER_RETRY_BASE_DELAY,
+                 max_delay=OPENROUTER_RETRY_MAX_DELAY,
+                 max_retry_after=OPENROUTER_MAX_RETRY_AFTER,
+                 budget=OPENROUTER_RETRY_BUDGET):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.budget = budget
+
+    def compute_delay(self, attempt, retry_after=None):
+        """
+        Zwraca opóźnienie przed kolejną próbą
+
+        Args:
+            attempt (int): Numer nieudanej próby (od 1)
+            retry_after (float): Wartość z nagłówka Retry-After
+
+        Returns:
+            float: Liczba sekund albo None, gdy serwer każe czekać zbyt długo
+        """
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return retry_after + random.uniform(0, self.base_delay)
+        ceiling = min(self.max_delay, self.base_delay * (2**(attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik dla upstream (per proces)
+
+    closed -> open po `failure_threshold` kolejnych awariach; po `cool_down`
+    przepuszcza jedno zapytanie próbne (half-open), które zamyka albo
+    ponownie otwiera obwód.
+    """
+
+    def __init__(self,
+                 name,
+                 failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 cool_down=CIRCUIT_COOL_DOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_down = cool_down
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cool_down:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        """Rzuca CircuitOpenError, jeśli zapytanie nie może zostać wysłane"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            remaining = self.cool_down - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(
+                f"{self.name} chwilowo niedostępne - ponów za {max(remaining, 1):.0f} s")
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Bezpiecznik {self.name} zamknięty - upstream odpowiada")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Zwalnia zapytanie próbne zakończone błędem niezwiązanym z upstream"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_in_flight:
+                    logger.error(
+                        f"Bezpiecznik {self.name} otwarty na {self.cool_down:.0f} s "
+                        f"po {self.failures} kolejnych awariach")
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+# Wspólny bezpiecznik dla wszystkich klientów OpenRouter w procesie
+openrouter_breaker = CircuitBreaker('OpenRouter')
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Zwraca bezpiecznik o danej nazwie (np. osobny dla każdego modelu)"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def call_with_retry(fn, policy=None, breaker=openrouter_breaker, sleep=time.sleep):
+    """
+    Wywołuje `fn` z ponowieniami zgodnie z polityką
+
+    `fn` powinno rzucać wyjątki requests (w tym HTTPError z raise_for_status)
+    lub ValueError/KeyError przy nieoczekiwanym formacie odpowiedzi.
+
+    Returns:
+        Wynik `fn`
+
+    Raises:
+        CircuitOpenError: Bezpiecznik jest otwarty
+        Exception: Ostatni błąd, gdy ponowienia się wyczerpały lub błąd nie
+            kwalifikuje się do ponowienia
+    """
+    policy = policy or RetryPolicy()
+    started = time.monotonic()
+
+    for attempt in range(1, policy.max_attempts + 1):
+        if breaker is not None:
+            breaker.before_call()
+
+        try:
+            result = fn()
+        except Exception as e:
+            category, retry_after = classify_error(e)
+            if breaker is not None:
+                if category in UPSTREAM_FAILURES:
+                    breaker.record_failure()
+                elif category is not None:
+                    # Upstream odpowiedział - obwód jest sprawny
+                    breaker.record_success()
+                else:
+                    breaker.release_trial()
+
+            if category not in RETRYABLE_ERRORS or attempt == policy.max_attempts:
+                raise
+
+            delay = policy.compute_delay(attempt, retry_after)
+            if delay is None or time.monotonic() - started + delay > policy.budget:
+                logger.warning(f"Rezygnacja z ponowień ({category}) - przekroczony budżet czasu")
+                raise
+
+            logger.warning(
+                f"Próba {attempt}/{policy.max_attempts} nieudana ({category}: {str(e)}) "
+                f"- ponowienie za {delay:.1f} s")
+            sleep(delay)
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
@@ -0,0 +1,157 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+from utils.sqlite_store import get_connection, state_path
+
+logger = logging.getLogger(__name__)
+
+# Maksymalny czas trzymania blokady przez lidera (musi być dłuższy niż
+# najdłuższe zapytanie z ponowieniami), po nim blokada uznawana jest za porzuconą
+SINGLE_FLIGHT_LEASE = float(os.environ.get("LLM_SINGLE_FLIGHT_LEASE", 120))
+SINGLE_FLIGHT_POLL_INTERVAL = float(
+    os.environ.get("LLM_SINGLE_FLIGHT_POLL_INTERVAL", 0.25))
+SINGLE_FLIGHT_PATH = os.environ.get("LLM_SINGLE_FLIGHT_PATH")
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Łączy równoległe wywołania o tym samym kluczu w jedno
+
+    W obrębie procesu wątki z tym samym kluczem czekają na wynik pierwszego
+    (lidera). Między procesami lider zakłada dzierżawę w tabeli blokad SQLite,
+    a pozostałe procesy czekają, aż wynik pojawi się we współdzielonym
+    cache (funkcja `recheck`), zamiast same wysyłać zapytanie.
+    """
+
+    def __init__(self,
+                 path=None,
+                 lease_seconds=SINGLE_FLIGHT_LEASE,
+                 poll_interval=SINGLE_FLIGHT_POLL_INTERVAL):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def do(self, key, fn, recheck=None, share_across_processes=True):
+        """
+        Wykonuje `fn` raz dla wszystkich równoległych wywołań z kluczem `key`
+
+        Args:
+            key (str): Odcisk zapytania
+            fn (callable): Właściwe wywołanie (wykonywane tylko przez lidera)
+            recheck (callable): Zwraca gotowy wynik ze współdzielonego cache
+                albo None - używane do odebrania wyniku od lidera z innego procesu
+            share_across_processes (bool): Czy koordynować także między procesami
+
+        Returns:
+            Wynik `fn` (lub wynik lidera)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            logger.info("Identyczne zapytanie LLM już trwa - czekam na jego wynik")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if share_across_processes and recheck is not None:
+                call.result = self._do_across_processes(key, fn, recheck)
+            else:
+                call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _do_across_processes(self, key, fn, recheck):
+        deadline = time.time() + self.lease_seconds
+        while not self._acquire_lease(key):
+            time.sleep(self.poll_interval)
+            result = recheck()
+            if result is not None:
+                logger.info("✅ Wynik identycznego zapytania z innego workera")
+                return result
+            if time.time() > deadline:
+                logger.warning("Przekroczono czas oczekiwania na lidera - wysyłam zapytanie")
+                return fn()
+
+        try:
+            # Lider z innego procesu mógł skończyć tuż przed przejęciem blokady
+            result = recheck()
+            if result is not None:
+                return result
+            return fn()
+        finally:
+            self._release_lease(key)
+
+    def _connection(self):
+        if self.path is None:
+            self.path = SINGLE_FLIGHT_PATH or state_path("single_flight.db")
+        conn = get_connection(self.path)
+        if not self._schema_ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS inflight_requests (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._schema_ready = True
+        return conn
+
+    def _acquire_lease(self, key):
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT expires_at FROM inflight_requests WHERE key = ?",
+                    (key, )).fetchone()
+                if row is not None and row[0] > now:
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO inflight_requests (key, owner, expires_at) "
+                    "VALUES (?, ?, ?)", (key, str(os.getpid()), now + self.lease_seconds))
+                conn.execute("COMMIT")
+                return True
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # Bez tabeli blokad nadal działa koordynacja w obrębie procesu
+            logger.warning(f"Błąd tabeli blokad single-flight: {str(e)}")
+            return True
+
+    def _release_lease(self, key):
+        try:
+            self._connection().execute(
+                "DELETE FROM inflight_requests WHERE key = ? AND owner = ?",
+                (key, str(os.getpid())))
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd zwalniania blokady single-flight: {str(e)}")
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Katalog na współdzielone pliki SQLite (cache, blokady itp.) - wspólny dla
+# wszystkich workerów gunicorna na tej samej maszynie
+STATE_DIR = os.environ.get("CV_OPTIMIZER_STATE_DIR", "instance")
+
+_local = threading.local()
+
+
+def state_path(filename):
+    """Zwraca ścieżkę pliku w katalogu stanu współdzielonego"""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, filename)
+
+
+def get_connection(path):
+    """
+    Zwraca połączenie SQLite dla bieżącego wątku
+
+    Połączenia są trzymane per wątek i per proces (sqlite3 nie pozwala
+    współdzielić połączenia między wątkami, a po forku trzeba otworzyć nowe).
+
+    Args:
+        path (str): Ścieżka do pliku bazy
+
+    Returns:
+        sqlite3.Connection: Połączenie w trybie autocommit z WAL
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or getattr(_local, 'pid', None) != os.getpid():
+        connections = {}
+        _local.connections = connections
+        _local.pid = os.getpid()
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError as e:
+            logger.warning(f"Nie udało się włączyć WAL dla {path}: {str(e)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        connections[path] = conn
+    return conn
@@ -0,0 +1,23 @@
+# Osobny proces wykonujący zadania LLM z kolejki w bazie danych.
+# Uruchom z LLM_JOB_EMBEDDED_WORKERS=0 w procesie web, aby gunicorn
+# obsługiwał wyłącznie szybkie zapytania.
+import os
+import signal
+import threading
+
+from app import logger, start_llm_job_workers
+
+if __name__ == '__main__':
+    concurrency = int(os.environ.get('LLM_JOB_WORKER_CONCURRENCY', 4))
+    stop_event = threading.Event()
+
+    def shutdown(signum, frame):
+        logger.info("Zatrzymywanie workera zadań LLM...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    threads = start_llm_job_workers(concurrency, stop_event)
+    for thread in threads:
+        thread.join()